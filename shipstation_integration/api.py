@@ -0,0 +1,381 @@
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+from queue import Full, Queue
+from threading import BoundedSemaphore, Event
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import httpx
+from shipstation import ShipStation
+
+import frappe
+from frappe.utils import cint
+
+from shipstation_integration.ratelimit import RateLimiter
+from shipstation_integration.recording import (
+	TrafficRecorder,
+	TrafficReplayer,
+	get_replayer,
+)
+from shipstation_integration.utils import SHIPSTATION_PAGE_SIZE, chunked
+
+if TYPE_CHECKING:
+	from shipstation_integration.shipstation_integration.doctype.shipstation_store.shipstation_store import (
+		ShipstationStore,
+	)
+	from shipstation_integration.shipstation_integration.doctype.shipstation_settings.shipstation_settings import (
+		ShipstationSettings,
+	)
+
+# the number of fetched pages a streaming fetch can hold before it waits
+# for the pages to be processed
+STREAM_BUFFER_SIZE = 2
+
+# marks the end of a fetch in its page queue
+_END_OF_PAGES = object()
+
+# the Shipstation API; set `shipstation_api_url` in the site config to use
+# another server, for e.g. a local fake Shipstation server while testing
+SHIPSTATION_API_URL = "https://ssapi.shipstation.com"
+
+# HTTP/2 is only available if the optional `h2` package is installed
+HTTP2_AVAILABLE = find_spec("h2") is not None
+
+# how long a request waits for Shipstation, in seconds; list requests with large
+# pages can take a while, so every client gets the same, generous timeout
+SHIPSTATION_TIMEOUT = 60
+
+# the idle connections kept open for each Shipstation account, and for how long
+KEEPALIVE_CONNECTIONS = 8
+KEEPALIVE_EXPIRY = 120
+
+# the clients for each Shipstation account in this process, along with the
+# modified timestamp of the settings each client was created from
+_clients: Dict[Tuple[str, str], Tuple[str, "RateLimitedShipStation"]] = {}
+
+
+class RateLimitedShipStation(ShipStation):
+	"""
+	A Shipstation client that reuses its connections, and sends every request
+	through the rate limiter shared by all the clients for the same API key.
+
+	Connections are kept alive between requests, and use HTTP/2 if it's available.
+	Responses are gzip-compressed, since httpx asks for that by default.
+	"""
+
+	def __init__(
+		self,
+		*args,
+		rate_limiter: RateLimiter,
+		api_url: str = SHIPSTATION_API_URL,
+		recorder: Optional[TrafficRecorder] = None,
+		replayer: Optional[TrafficReplayer] = None,
+		**kwargs,
+	):
+		super().__init__(*args, **kwargs)
+		self.rate_limiter = rate_limiter
+		self.recorder = recorder
+		self.replayer = replayer
+		self.http = httpx.Client(
+			base_url=api_url,
+			auth=(self.key, self.secret),
+			http2=HTTP2_AVAILABLE,
+			limits=httpx.Limits(
+				max_keepalive_connections=KEEPALIVE_CONNECTIONS,
+				keepalive_expiry=KEEPALIVE_EXPIRY,
+			),
+		)
+
+	def get(self, endpoint: str = "", payload: Optional[Dict] = None) -> httpx.Response:
+		return self.send_request("GET", endpoint, params=payload)
+
+	def post(self, endpoint: str = "", data=None) -> httpx.Response:
+		if isinstance(data, (dict, list)):
+			return self.send_request("POST", endpoint, json=data)
+		return self.send_request(
+			"POST", endpoint, content=data, headers={"Content-Type": "application/json"}
+		)
+
+	def send_request(self, method: str, url: str, **kwargs) -> httpx.Response:
+		"""
+		Send a request on the client's pooled connections, once the rate limit allows.
+
+		Args:
+			method (str): The HTTP method.
+			url (str): A Shipstation API endpoint, or an absolute URL.
+
+		Returns:
+			httpx.Response: The response.
+
+		Raises:
+			httpx.HTTPStatusError: If the response is an error.
+		"""
+
+		# a replayed response never touches the network, so it isn't rate limited
+		if self.replayer:
+			request = self.http.build_request(method, url, **kwargs)
+			response = self.replayer.replay(request)
+			response.raise_for_status()
+			return response
+
+		return self.rate_limiter.call(self._send_request, method, url, **kwargs)
+
+	def _send_request(self, method: str, url: str, **kwargs) -> httpx.Response:
+		response = self.http.request(method, url, timeout=self.timeout, **kwargs)
+		# throttled requests are retried by the rate limiter, so only the response
+		# it finally accepts is recorded, and replays never need to be retried
+		if self.recorder and response.status_code != 429:
+			self.recorder.record(response)
+		response.raise_for_status()
+		return response
+
+
+def get_client(settings: "ShipstationSettings") -> RateLimitedShipStation:
+	"""
+	Get the Shipstation client for an account.
+
+	Clients are kept for the life of the process, so their connections and the
+	decrypted credentials are reused across requests and jobs. A new client is
+	created once the settings are modified.
+
+	Args:
+		settings (ShipstationSettings): The Shipstation account.
+
+	Returns:
+		RateLimitedShipStation: The account's client.
+	"""
+
+	if settings.is_new():
+		return create_client(settings)
+
+	key = (frappe.local.site, settings.name)
+	version = ":".join(
+		[
+			str(settings.modified),
+			frappe.conf.get("shipstation_record_path") or "",
+			frappe.conf.get("shipstation_replay_path") or "",
+		]
+	)
+
+	cached = _clients.get(key)
+	if cached and cached[0] == version:
+		return cached[1]
+
+	# the replaced client's connections would otherwise stay open until it's
+	# garbage collected
+	if cached:
+		cached[1].http.close()
+
+	client = create_client(settings)
+	_clients[key] = (version, client)
+	return client
+
+
+def create_client(settings: "ShipstationSettings") -> RateLimitedShipStation:
+	api_key = settings.get_password("api_key")
+	replay_path = frappe.conf.get("shipstation_replay_path")
+	return RateLimitedShipStation(
+		key=api_key,
+		secret=settings.get_password("api_secret"),
+		debug=False,
+		timeout=SHIPSTATION_TIMEOUT,
+		rate_limiter=RateLimiter(api_key),
+		api_url=get_api_url(),
+		recorder=get_recorder(),
+		replayer=get_replayer(replay_path) if replay_path else None,
+	)
+
+
+def get_recorder() -> Optional[TrafficRecorder]:
+	record_path = frappe.conf.get("shipstation_record_path")
+	if record_path:
+		return TrafficRecorder(record_path)
+
+
+def get_api_url() -> str:
+	return (frappe.conf.get("shipstation_api_url") or SHIPSTATION_API_URL).rstrip("/")
+
+
+class FetchJob(NamedTuple):
+	settings: "ShipstationSettings"
+	store: "ShipstationStore"
+	method: Callable
+	parameters: Dict
+
+
+class FetchResult(NamedTuple):
+	job: FetchJob
+	pages: Iterator[List]
+
+
+def fetch_carriers(client: RateLimitedShipStation, max_workers: int) -> List[Dict]:
+	"""
+	Fetch the carriers of a Shipstation account, along with their services and packages.
+
+	The services and packages of all the carriers are fetched in parallel; the
+	client's rate limiter still keeps the requests within the account's limit.
+
+	Args:
+		client (RateLimitedShipStation): The account's client.
+		max_workers (int): The maximum number of requests to run at the same time.
+
+	Returns:
+		list of dict: The carriers, in the order Shipstation returns them.
+	"""
+
+	carriers = [carrier._unstructure() for carrier in client.list_carriers()]
+	if not carriers:
+		return []
+
+	def fetch(method: Callable, carrier_code: str) -> List[Dict]:
+		return [record._unstructure() for record in method(carrier_code)]
+
+	with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+		services = [
+			executor.submit(fetch, client.list_services, carrier["code"])
+			for carrier in carriers
+		]
+		packages = [
+			executor.submit(fetch, client.list_packages, carrier["code"])
+			for carrier in carriers
+		]
+
+		for carrier, carrier_services, carrier_packages in zip(
+			carriers, services, packages
+		):
+			carrier["services"] = carrier_services.result()
+			carrier["packages"] = carrier_packages.result()
+
+	return carriers
+
+
+def iter_pages(method: Callable, parameters: Dict) -> Iterator[List]:
+	"""
+	Fetch the results of a Shipstation list method one page at a time.
+
+	Only a single page of results is requested and held in memory at a time,
+	however large the filtered date range is.
+
+	Args:
+		method (Callable): The Shipstation client list method, for e.g.
+			`client.list_orders`.
+		parameters (dict): The list parameters, without any paging parameters.
+
+	Yields:
+		list: The records in each page of results.
+	"""
+
+	page_number = 1
+	while True:
+		response = method(
+			parameters={
+				**parameters,
+				"page": page_number,
+				"page_size": SHIPSTATION_PAGE_SIZE,
+			}
+		)
+
+		records = list(response.results or [])
+		total_pages = getattr(response, "pages", None)
+		del response
+
+		if records:
+			yield records
+
+		if not records or (total_pages and page_number >= total_pages):
+			return
+		if not total_pages and len(records) < SHIPSTATION_PAGE_SIZE:
+			return
+
+		page_number += 1
+
+
+def fetch_concurrently(jobs: List[FetchJob]) -> Iterator[FetchResult]:
+	"""
+	Run Shipstation list requests for multiple stores in parallel.
+
+	Requests for each Shipstation account are limited to the account's maximum
+	concurrent requests. Results are yielded in the same order as the jobs, as
+	soon as each one is available, so callers can start processing the first
+	store while the remaining stores are still being fetched.
+
+	If an account is set to stream pages, each store is fetched one page at a
+	time, and only a couple of pages are buffered ahead of processing. Otherwise,
+	all of a store's results are downloaded before its pages are handed over.
+
+	Fetches only make HTTP calls, and never touch the database, since the Frappe
+	request context isn't available outside the main thread.
+
+	Args:
+		jobs (list of FetchJob): The list requests to run.
+
+	Yields:
+		FetchResult: The pages of records for each job. Iterating over the pages
+			raises any HTTP error hit while fetching them.
+	"""
+
+	if not jobs:
+		return
+
+	limits = {
+		job.settings.name: cint(job.settings.max_concurrent_requests) or 1 for job in jobs
+	}
+	semaphores = {name: BoundedSemaphore(limit) for name, limit in limits.items()}
+
+	def fetch(job: FetchJob, pages: Queue, stop: Event):
+		with semaphores[job.settings.name]:
+			if stop.is_set():
+				return
+
+			try:
+				if job.settings.stream_pages:
+					for page in iter_pages(job.method, job.parameters):
+						if not put_page(pages, page, stop):
+							return
+				else:
+					records = list(job.method(parameters=job.parameters))
+					for page in chunked(records, SHIPSTATION_PAGE_SIZE):
+						put_page(pages, page, stop)
+			except Exception as e:
+				put_page(pages, e, stop)
+				return
+
+			put_page(pages, _END_OF_PAGES, stop)
+
+	max_workers = min(len(jobs), sum(limits.values()))
+	with ThreadPoolExecutor(max_workers=max_workers) as executor:
+		fetches = []
+		for job in jobs:
+			pages = Queue(maxsize=STREAM_BUFFER_SIZE if job.settings.stream_pages else 0)
+			stop = Event()
+			executor.submit(fetch, job, pages, stop)
+			fetches.append((job, pages, stop))
+
+		try:
+			for job, pages, stop in fetches:
+				yield FetchResult(job, read_pages(pages))
+				# release the fetch if the caller stopped reading its pages early,
+				# so that it doesn't hold up other fetches for the same account
+				stop.set()
+		finally:
+			for _, _, stop in fetches:
+				stop.set()
+
+
+def put_page(pages: Queue, page, stop: Event) -> bool:
+	while not stop.is_set():
+		try:
+			pages.put(page, timeout=1)
+			return True
+		except Full:
+			continue
+	return False
+
+
+def read_pages(pages: Queue) -> Iterator[List]:
+	while True:
+		page = pages.get()
+		if page is _END_OF_PAGES:
+			return
+		if isinstance(page, Exception):
+			raise page
+		yield page
@@ -0,0 +1,461 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional, Tuple, Type
+
+import frappe
+from frappe import _
+from frappe.utils import add_days, add_to_date, cint, flt, getdate, now_datetime
+
+from shipstation_integration.context import ImportContext
+from shipstation_integration.orders import (
+	get_existing_order_ids,
+	mark_order_as_failed,
+	preload_orders,
+	process_order,
+)
+from shipstation_integration.transaction import TransactionBatch
+from shipstation_integration.utils import chunked
+
+if TYPE_CHECKING:
+	from shipstation.models import ShipStationOrder
+	from shipstation_integration.api import RateLimitedShipStation
+	from shipstation_integration.shipstation_integration.doctype.shipstation_backfill.shipstation_backfill import (
+		ShipstationBackfill,
+	)
+	from shipstation_integration.shipstation_integration.doctype.shipstation_settings.shipstation_settings import (
+		ShipstationSettings,
+	)
+	from shipstation_integration.shipstation_integration.doctype.shipstation_store.shipstation_store import (
+		ShipstationStore,
+	)
+
+# a running backfill that hasn't saved a checkpoint for this many minutes is
+# assumed to have been interrupted, and can be resumed
+STALE_BACKFILL_MINUTES = 30
+
+# the number of rows changed by each batched `UPDATE` query
+UPDATE_CHUNK_SIZE = 500
+
+
+class BackfillBatch(NamedTuple):
+	# the units of work in the batch; can be empty if none of the records
+	# read for the batch need any work
+	units: List[Any]
+	# the checkpoint to save once the batch is done, or `None` if there's no
+	# more work left
+	checkpoint: Optional[str]
+
+
+class BackfillChanges(NamedTuple):
+	# the number of records that were changed
+	updated: int
+	# the number of records that failed to be written; the job logs their errors
+	failed: int = 0
+
+
+class BackfillJob:
+	"""
+	A kind of backfill run by the backfill engine.
+
+	A job splits its work into batches of units, each ending at a checkpoint. The
+	Shipstation data for each unit is fetched in a thread, and the whole batch is
+	then written to the database on the main thread.
+
+	Args:
+		backfill (ShipstationBackfill): The backfill being run.
+		settings (ShipstationSettings): The Shipstation account of the backfill.
+	"""
+
+	def __init__(self, backfill: "ShipstationBackfill", settings: "ShipstationSettings"):
+		self.backfill = backfill
+		self.settings = settings
+
+	def get_batch(self, checkpoint: Optional[str], size: int) -> BackfillBatch:
+		"""Get the next batch of up to `size` units after a checkpoint."""
+		raise NotImplementedError
+
+	def fetch(self, client: "RateLimitedShipStation", unit: Any) -> Any:
+		"""
+		Fetch the Shipstation data for a unit of work.
+
+		This runs in a thread, so it must only make HTTP calls, and never touch
+		the database or the Frappe request context.
+		"""
+		raise NotImplementedError
+
+	def apply(self, units: List[Any], results: List[Any]) -> BackfillChanges:
+		"""
+		Write the fetched data for a batch of units to the database.
+
+		Units that failed to fetch have an exception as their result. A record that
+		fails to be written should be logged and counted, instead of failing the
+		whole batch, since the batch would fail again every time it's resumed.
+
+		Returns:
+			BackfillChanges: The number of records that were changed, and that failed.
+		"""
+		raise NotImplementedError
+
+	def describe(self, unit: Any) -> str:
+		return str(unit)
+
+
+class OrderItemIDBackfill(BackfillJob):
+	"""Set the Shipstation order item ID on the items of existing Sales Orders."""
+
+	def get_batch(self, checkpoint: Optional[str], size: int) -> BackfillBatch:
+		stores = {
+			(store.store_name, store.marketplace_name)
+			for store in self.settings.shipstation_stores
+			if store.enable_orders
+		}
+		if not stores:
+			return BackfillBatch([], None)
+
+		filters = {
+			"docstatus": 1,
+			"shipstation_order_id": ("is", "set"),
+			"shipstation_store_name": ("in", list({store[0] for store in stores})),
+		}
+		if checkpoint:
+			filters["name"] = (">", checkpoint)
+
+		orders = frappe.get_all(
+			"Sales Order",
+			filters=filters,
+			fields=["name", "shipstation_order_id", "shipstation_store_name", "marketplace"],
+			order_by="name asc",
+			limit_page_length=size,
+		)
+		if not orders:
+			return BackfillBatch([], None)
+
+		units = [
+			order
+			for order in orders
+			if (order.shipstation_store_name, order.marketplace) in stores
+		]
+		return BackfillBatch(units, orders[-1].name)
+
+	def fetch(self, client: "RateLimitedShipStation", unit: frappe._dict):
+		return client.get_order(unit.shipstation_order_id)
+
+	def apply(self, units: List[frappe._dict], results: List[Any]) -> BackfillChanges:
+		fetched = {
+			unit.name: order
+			for unit, order in zip(units, results)
+			if order and not isinstance(order, Exception)
+		}
+		if not fetched:
+			return BackfillChanges(0)
+
+		# the unmatched rows of each Sales Order, by item code, quantity and rate
+		rows: Dict[str, Dict[Tuple, List[frappe._dict]]] = {}
+		for row in frappe.get_all(
+			"Sales Order Item",
+			filters={"parenttype": "Sales Order", "parent": ("in", list(fetched))},
+			fields=["name", "parent", "item_code", "qty", "rate", "shipstation_order_item_id"],
+			order_by="idx asc",
+		):
+			key = (row.item_code, flt(row.qty), flt(row.rate))
+			rows.setdefault(row.parent, {}).setdefault(key, []).append(row)
+
+		order_item_ids = {}
+		for sales_order, order in fetched.items():
+			order_rows = rows.get(sales_order, {})
+			for item in order.items or []:
+				if not (item.order_item_id and item.sku):
+					continue
+
+				key = (item.sku.strip(), flt(item.quantity), flt(item.unit_price))
+				matches = order_rows.get(key)
+				if not matches:
+					continue
+
+				row = matches.pop(0)
+				if row.shipstation_order_item_id != str(item.order_item_id):
+					order_item_ids[row.name] = str(item.order_item_id)
+
+		bulk_update("Sales Order Item", "shipstation_order_item_id", order_item_ids)
+		return BackfillChanges(len(order_item_ids))
+
+	def describe(self, unit: frappe._dict) -> str:
+		return f"Sales Order {unit.name}"
+
+
+class OrderHistoryUnit(NamedTuple):
+	store: "ShipstationStore"
+	date: datetime.date
+
+
+class OrderHistoryBackfill(BackfillJob):
+	"""
+	Create the Sales Orders of Shipstation orders created in a past date range.
+
+	Each unit is one day of a store's orders. Orders that already exist are skipped,
+	the same as in a scheduled sync.
+	"""
+
+	def __init__(self, backfill: "ShipstationBackfill", settings: "ShipstationSettings"):
+		super().__init__(backfill, settings)
+		self.context = ImportContext.build([settings])
+
+	def get_batch(self, checkpoint: Optional[str], size: int) -> BackfillBatch:
+		stores = [store for store in self.settings.shipstation_stores if store.enable_orders]
+
+		start_date = getdate(self.backfill.from_date)
+		if checkpoint:
+			start_date = add_days(getdate(checkpoint), 1)
+
+		end_date = getdate(self.backfill.to_date)
+		if not stores or start_date > end_date:
+			return BackfillBatch([], None)
+
+		# a batch always covers whole days, so a day is never half-done at a checkpoint
+		days = max(size // len(stores), 1)
+		last_date = min(add_days(start_date, days - 1), end_date)
+
+		units = [
+			OrderHistoryUnit(store, getdate(add_days(start_date, offset)))
+			for offset in range((last_date - start_date).days + 1)
+			for store in stores
+		]
+		return BackfillBatch(units, str(last_date))
+
+	def fetch(
+		self, client: "RateLimitedShipStation", unit: OrderHistoryUnit
+	) -> List["ShipStationOrder"]:
+		start = datetime.datetime.combine(unit.date, datetime.time.min)
+		return list(
+			client.list_orders(
+				parameters={
+					"store_id": unit.store.store_id,
+					"create_date_start": start,
+					"create_date_end": start + datetime.timedelta(days=1),
+				}
+			)
+		)
+
+	def apply(self, units: List[OrderHistoryUnit], results: List[Any]) -> BackfillChanges:
+		fetched = [
+			(unit.store, [order for order in orders if order])
+			for unit, orders in zip(units, results)
+			if orders and not isinstance(orders, Exception)
+		]
+
+		orders = [order for _store, store_orders in fetched for order in store_orders]
+		if not orders:
+			return BackfillChanges(0)
+
+		existing_order_ids = get_existing_order_ids(order.order_id for order in orders)
+		preload_orders(orders, existing_order_ids, self.context)
+		existing_count = len(existing_order_ids)
+
+		# the orders are committed along with the batch's checkpoint
+		batch = TransactionBatch(batch_size=len(orders) + 1)
+		failed_orders: List["ShipStationOrder"] = []
+		for store, store_orders in fetched:
+			for order in store_orders:
+				# a failed order has already been rolled back to its savepoint
+				try:
+					process_order(
+						self.settings,
+						order,
+						store,
+						existing_order_ids,
+						self.context,
+						batch,
+						failed_orders,
+					)
+				except Exception:
+					frappe.log_error(
+						title=f"Error while creating Shipstation order {order.order_id}",
+						message=frappe.get_traceback(),
+					)
+					mark_order_as_failed(order, failed_orders)
+
+		return BackfillChanges(len(existing_order_ids) - existing_count, len(failed_orders))
+
+	def describe(self, unit: OrderHistoryUnit) -> str:
+		return f"{unit.store.store_name} orders on {unit.date}"
+
+
+# the backfill jobs, by their backfill type
+BACKFILL_JOBS: Dict[str, Type[BackfillJob]] = {
+	"Order Item IDs": OrderItemIDBackfill,
+	"Order History": OrderHistoryBackfill,
+}
+
+
+def start_backfill(backfill: "ShipstationBackfill"):
+	"""Start a backfill in a background job, or resume it from its last checkpoint."""
+
+	if backfill.status == "Completed":
+		frappe.throw(_("Backfill {0} has already completed").format(backfill.name))
+	if backfill.status == "Running" and not is_stale(backfill):
+		frappe.throw(_("Backfill {0} is already running").format(backfill.name))
+
+	backfill.db_set({"status": "Queued", "last_checkpoint_at": now_datetime()})
+	frappe.enqueue(
+		"shipstation_integration.backfill.run_backfill",
+		queue="long",
+		timeout=24 * 60 * 60,
+		job_name=f"Shipstation Backfill {backfill.name}",
+		enqueue_after_commit=True,
+		backfill=backfill.name,
+	)
+
+
+def resume_backfills():
+	"""Resume the backfills that were interrupted, for e.g. by a worker restart."""
+
+	# every started backfill has a checkpoint time, so backfills that were created
+	# but never started aren't picked up here
+	for backfill in frappe.get_all(
+		"Shipstation Backfill",
+		filters={
+			"status": ("in", ["Queued", "Running"]),
+			"last_checkpoint_at": ("is", "set"),
+		},
+	):
+		backfill_doc: "ShipstationBackfill" = frappe.get_doc(
+			"Shipstation Backfill", backfill.name
+		)
+		if is_stale(backfill_doc):
+			start_backfill(backfill_doc)
+
+
+def is_stale(backfill: "ShipstationBackfill") -> bool:
+	if not backfill.last_checkpoint_at:
+		return True
+	stale_after = add_to_date(backfill.last_checkpoint_at, minutes=STALE_BACKFILL_MINUTES)
+	return stale_after < now_datetime()
+
+
+def run_backfill(backfill: str):
+	"""
+	Run a backfill from its last checkpoint until it's done or paused.
+
+	Each batch of units is fetched from Shipstation in parallel, written to the
+	database, and committed along with the checkpoint at its end. If the backfill is
+	interrupted, it continues from the last committed checkpoint when it's resumed.
+
+	Args:
+		backfill (str): The name of the Shipstation Backfill.
+	"""
+
+	backfill_doc: "ShipstationBackfill" = frappe.get_doc("Shipstation Backfill", backfill)
+	if backfill_doc.status not in ("Queued", "Running"):
+		return
+	# don't run a backfill twice at the same time, if it was resumed while still running
+	if backfill_doc.status == "Running" and not is_stale(backfill_doc):
+		return
+
+	settings: "ShipstationSettings" = frappe.get_doc(
+		"Shipstation Settings", backfill_doc.shipstation_settings
+	)
+	job = BACKFILL_JOBS[backfill_doc.backfill_type](backfill_doc, settings)
+	client = settings.client()
+
+	backfill_doc.db_set(
+		{"status": "Running", "error": None, "last_checkpoint_at": now_datetime()},
+		commit=True,
+	)
+
+	max_workers = cint(backfill_doc.max_workers) or cint(settings.max_concurrent_requests)
+	batch_size = cint(backfill_doc.batch_size) or 100
+
+	try:
+		with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+			while True:
+				# a backfill can be paused from the form while it runs
+				if frappe.db.get_value("Shipstation Backfill", backfill, "status") != "Running":
+					return
+
+				units, checkpoint = job.get_batch(backfill_doc.checkpoint, batch_size)
+				if checkpoint is None:
+					break
+
+				results = list(executor.map(lambda unit: fetch_unit(job, client, unit), units))
+				changes = job.apply(units, results)
+
+				errors = [
+					f"{job.describe(unit)}: {result}"
+					for unit, result in zip(units, results)
+					if isinstance(result, Exception)
+				]
+				if errors:
+					frappe.log_error(
+						title=f"Error while fetching Shipstation data for backfill {backfill}",
+						message="\n".join(errors),
+					)
+
+				# the backfill may have been paused, or paused and started again in
+				# another job, while the batch ran; lock it, and only save the batch
+				# if it's still running from the same checkpoint, so that the batch
+				# isn't written twice
+				status, current_checkpoint = frappe.db.get_value(
+					"Shipstation Backfill",
+					backfill,
+					["status", "checkpoint"],
+					for_update=True,
+				)
+				if status != "Running" or (current_checkpoint or None) != (
+					backfill_doc.checkpoint or None
+				):
+					frappe.db.rollback()
+					return
+
+				backfill_doc.db_set(
+					{
+						"checkpoint": checkpoint,
+						"last_checkpoint_at": now_datetime(),
+						"processed": cint(backfill_doc.processed) + len(units),
+						"updated": cint(backfill_doc.updated) + changes.updated,
+						"failed": cint(backfill_doc.failed) + len(errors) + changes.failed,
+					},
+					commit=True,
+				)
+	except Exception:
+		frappe.db.rollback()
+		backfill_doc.db_set(
+			{"status": "Failed", "error": frappe.get_traceback()}, commit=True
+		)
+		raise
+
+	backfill_doc.db_set("status", "Completed", commit=True)
+
+
+def fetch_unit(job: BackfillJob, client: "RateLimitedShipStation", unit: Any) -> Any:
+	try:
+		return job.fetch(client, unit)
+	except Exception as e:
+		return e
+
+
+def bulk_update(doctype: str, fieldname: str, values: Dict[str, Any]):
+	"""
+	Set a field on many documents, with one `UPDATE` query for each chunk of rows.
+
+	The documents' modified timestamps aren't changed.
+
+	Args:
+		doctype (str): The document type.
+		fieldname (str): The field to set.
+		values (dict): The new field value, by document name.
+	"""
+
+	for chunk in chunked(values.items(), UPDATE_CHUNK_SIZE):
+		cases = " ".join(["WHEN %s THEN %s"] * len(chunk))
+		names = ", ".join(["%s"] * len(chunk))
+		parameters = [value for row in chunk for value in row]
+		parameters.extend(name for name, _value in chunk)
+
+		frappe.db.sql(
+			f"""
+				UPDATE `tab{doctype}`
+				SET `{fieldname}` = CASE `name` {cases} END
+				WHERE `name` IN ({names})
+			""",
+			parameters,
+		)
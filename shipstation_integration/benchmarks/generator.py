@@ -0,0 +1,331 @@
+"""
+Generate synthetic Shipstation order and shipment payloads, in the same JSON
+format as the Shipstation API, for benchmarking the ingestion pipeline.
+
+The payloads are deterministic for a seed, and cover:
+	- orders with one or more lines, and repeated SKUs across orders;
+	- marketplace discounts, taxes and shipping charges;
+	- split orders, where the split-off order is skipped and the original order
+		is shipped in more than one shipment;
+	- Amazon, Shopify and manual orders, with their marketplace's order numbers,
+		customers and notes.
+"""
+
+import datetime
+import random
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+	from shipstation_integration.shipstation_integration.doctype.shipstation_settings.shipstation_settings import (
+		ShipstationSettings,
+	)
+	from shipstation_integration.shipstation_integration.doctype.shipstation_store.shipstation_store import (
+		ShipstationStore,
+	)
+
+# the order sources generated for stores that aren't set up for a marketplace
+ORDER_SOURCES = ("amazon", "shopify", "manual")
+
+# the number of distinct products the orders are made of
+CATALOG_SIZE = 50
+
+# the share of orders with a discount, and of orders that are split
+DISCOUNT_RATE = 0.2
+SPLIT_RATE = 0.1
+
+FIRST_NAMES = (
+	"Ava", "Ben", "Chloe", "Dev", "Elena", "Finn", "Grace", "Hiro", "Isla", "Jon"
+)
+LAST_NAMES = ("Adams", "Brooks", "Chen", "Diaz", "Evans", "Fischer", "Garcia", "Hughes")
+CITIES = (
+	("Portland", "OR", "97201"),
+	("Austin", "TX", "73301"),
+	("Columbus", "OH", "43004"),
+	("Denver", "CO", "80014"),
+	("Raleigh", "NC", "27601"),
+)
+CARRIERS = (
+	("stamps_com", "usps_priority_mail", "package"),
+	("ups", "ups_ground", "package"),
+	("fedex", "fedex_home_delivery", "package"),
+)
+
+
+class PayloadGenerator:
+	"""
+	Generate Shipstation payloads for the stores of a Shipstation account.
+
+	Args:
+		settings (ShipstationSettings): The Shipstation account the payloads are for.
+		seed (int, optional): The seed for the random payloads. Defaults to 0.
+	"""
+
+	def __init__(self, settings: "ShipstationSettings", seed: int = 0):
+		self.random = random.Random(seed)
+		self.stores = [store for store in settings.shipstation_stores if store.enable_orders]
+		self.warehouse_ids = sorted(settings.active_warehouse_ids) or [None]
+
+		# keep the IDs clear of real Shipstation IDs, which are much smaller
+		self.next_id = 9_000_000_000 + seed * 10_000_000
+		self.start_date = datetime.datetime(2021, 1, 1, 8, 0, 0)
+
+	def orders(self, count: int) -> List[Dict]:
+		"""
+		Generate Shipstation orders.
+
+		Split orders add a second order for the same order number, so more than
+		`count` orders can be returned.
+		"""
+
+		orders = []
+		for index in range(count):
+			store = self.stores[index % len(self.stores)]
+			order = self.order(store, self.get_source(store, index))
+			orders.append(order)
+
+			if self.random.random() < SPLIT_RATE and len(get_product_lines(order)) > 1:
+				orders.append(self.split_order(order))
+
+		return orders
+
+	def shipments(self, orders: List[Dict]) -> List[Dict]:
+		"""
+		Generate a shipment for each order, and two partial shipments for each
+		order that was split.
+		"""
+
+		split_order_ids = {
+			order["advancedOptions"]["parentId"]
+			for order in orders
+			if order["advancedOptions"]["mergedOrSplit"]
+		}
+
+		shipments = []
+		for order in orders:
+			if order["advancedOptions"]["mergedOrSplit"]:
+				continue
+
+			items = get_product_lines(order)
+			if order["orderId"] in split_order_ids:
+				middle = len(items) // 2
+				shipments.append(self.shipment(order, items[:middle]))
+				shipments.append(self.shipment(order, items[middle:]))
+			else:
+				shipments.append(self.shipment(order, items))
+
+		return shipments
+
+	def get_source(self, store: "ShipstationStore", index: int) -> str:
+		if store.get("is_amazon_store"):
+			return "amazon"
+		if store.get("is_shopify_store"):
+			return "shopify"
+		return ORDER_SOURCES[index % len(ORDER_SOURCES)]
+
+	def order(self, store: "ShipstationStore", source: str) -> Dict:
+		order_id = self.get_id()
+		order_date = self.start_date + datetime.timedelta(minutes=order_id % 100_000)
+		customer = self.customer(source)
+
+		items = [self.item(order_date) for _ in range(self.random.choice((1, 1, 2, 3, 5)))]
+		subtotal = sum(item["unitPrice"] * item["quantity"] for item in items)
+
+		if self.random.random() < DISCOUNT_RATE:
+			discount = round(subtotal * self.random.choice((0.05, 0.1, 0.2)), 2)
+			items.append(self.discount(order_date, discount))
+			subtotal -= discount
+
+		tax_amount = round(subtotal * 0.0725, 2)
+		shipping_amount = self.random.choice((0.0, 4.99, 7.99, 12.5))
+		carrier_code, service_code, package_code = self.random.choice(CARRIERS)
+
+		return {
+			"orderId": order_id,
+			"orderNumber": self.get_order_number(source, order_id),
+			"orderKey": f"{source}-{order_id}",
+			"orderDate": format_date(order_date),
+			"createDate": format_date(order_date),
+			"modifyDate": format_date(order_date),
+			"paymentDate": format_date(order_date),
+			"shipByDate": format_date(order_date + datetime.timedelta(days=3)),
+			"orderStatus": "awaiting_shipment",
+			"customerId": self.get_id(),
+			"customerUsername": customer["email"],
+			"customerEmail": customer["email"],
+			"billTo": customer["address"],
+			"shipTo": customer["address"],
+			"items": items,
+			"orderTotal": round(subtotal + tax_amount + shipping_amount, 2),
+			"amountPaid": round(subtotal + tax_amount + shipping_amount, 2),
+			"taxAmount": tax_amount,
+			"shippingAmount": shipping_amount,
+			"customerNotes": "Please leave at the door" if source == "shopify" else None,
+			"internalNotes": f"Synthetic {source} order",
+			"gift": False,
+			"paymentMethod": "Credit Card",
+			"requestedShippingService": service_code,
+			"carrierCode": carrier_code,
+			"serviceCode": service_code,
+			"packageCode": package_code,
+			"confirmation": "none",
+			"shipDate": format_date(order_date + datetime.timedelta(days=1)),
+			"weight": {"value": 16.0 * len(items), "units": "ounces", "WeightUnits": 1},
+			"dimensions": {"units": "inches", "length": 12.0, "width": 8.0, "height": 4.0},
+			"advancedOptions": {
+				"warehouseId": self.random.choice(self.warehouse_ids),
+				"nonMachinable": False,
+				"saturdayDelivery": False,
+				"containsAlcohol": False,
+				"mergedOrSplit": False,
+				"mergedIds": [],
+				"parentId": None,
+				"storeId": store.store_id,
+				"source": source,
+			},
+			"tagIds": None,
+			"externallyFulfilled": False,
+		}
+
+	def split_order(self, order: Dict) -> Dict:
+		split_order = dict(order)
+		split_order["orderId"] = self.get_id()
+		split_order["orderKey"] = f"{order['orderKey']}-split"
+		items = get_product_lines(order)
+		split_order["items"] = items[len(items) // 2 :]
+		split_order["advancedOptions"] = {
+			**order["advancedOptions"],
+			"mergedOrSplit": True,
+			"parentId": order["orderId"],
+		}
+		return split_order
+
+	def item(self, order_date: datetime.datetime) -> Dict:
+		product = self.random.randrange(CATALOG_SIZE)
+		return {
+			"orderItemId": self.get_id(),
+			"lineItemKey": str(self.get_id()),
+			"sku": f"SS-BENCH-{product:04d}",
+			"name": f"Benchmark Product {product}",
+			"imageUrl": None,
+			"weight": {"value": 16.0, "units": "ounces", "WeightUnits": 1},
+			"quantity": self.random.choice((1, 1, 1, 2, 3)),
+			"unitPrice": round(5 + product * 1.25, 2),
+			"taxAmount": None,
+			"shippingAmount": None,
+			"warehouseLocation": None,
+			"options": [{"name": "Description", "value": f"Benchmark product {product}"}],
+			"productId": 1_000 + product,
+			"fulfillmentSku": None,
+			"adjustment": False,
+			"upc": None,
+			"createDate": format_date(order_date),
+			"modifyDate": format_date(order_date),
+		}
+
+	def discount(self, order_date: datetime.datetime, amount: float) -> Dict:
+		# marketplace discounts are sent as an adjustment line
+		return {
+			"orderItemId": self.get_id(),
+			"lineItemKey": "discount",
+			"sku": None,
+			"name": "Discount",
+			"quantity": 1,
+			"unitPrice": -amount,
+			"options": [],
+			"adjustment": True,
+			"createDate": format_date(order_date),
+			"modifyDate": format_date(order_date),
+		}
+
+	def customer(self, source: str) -> Dict:
+		first_name = self.random.choice(FIRST_NAMES)
+		last_name = self.random.choice(LAST_NAMES)
+		city, state, postal_code = self.random.choice(CITIES)
+		number = self.random.randrange(1_000)
+
+		if source == "amazon":
+			email = f"{number:04d}{first_name.lower()}@marketplace.amazon.com"
+		else:
+			email = f"{first_name.lower()}.{last_name.lower()}{number}@example.com"
+
+		return {
+			"email": email,
+			"address": {
+				"name": f"{first_name} {last_name}",
+				"company": None,
+				"street1": f"{self.random.randrange(1, 9_999)} Main St",
+				"street2": None,
+				"street3": None,
+				"city": city,
+				"state": state,
+				"postalCode": postal_code,
+				"country": "US",
+				"phone": f"555-01{self.random.randrange(10, 99)}",
+				"residential": True,
+				"addressVerified": "Address validated successfully",
+			},
+		}
+
+	def shipment(self, order: Dict, items: List[Dict]) -> Dict:
+		ship_date = order["shipDate"]
+		return {
+			"shipmentId": self.get_id(),
+			"orderId": order["orderId"],
+			"orderKey": order["orderKey"],
+			"orderNumber": order["orderNumber"],
+			"customerEmail": order["customerEmail"],
+			"createDate": ship_date,
+			"shipDate": ship_date,
+			"shipmentCost": self.random.choice((3.5, 6.25, 9.8)),
+			"insuranceCost": 0.0,
+			"trackingNumber": f"9400{self.get_id()}",
+			"isReturnLabel": False,
+			"carrierCode": order["carrierCode"],
+			"serviceCode": order["serviceCode"],
+			"packageCode": order["packageCode"],
+			"confirmation": "none",
+			"warehouseId": order["advancedOptions"]["warehouseId"],
+			"voided": False,
+			"voidDate": None,
+			"marketplaceNotified": True,
+			"shipTo": order["shipTo"],
+			"weight": {"value": 16.0 * len(items), "units": "ounces", "WeightUnits": 1},
+			"dimensions": order["dimensions"],
+			"advancedOptions": {"storeId": order["advancedOptions"]["storeId"]},
+			"shipmentItems": [
+				{
+					key: item.get(key)
+					for key in (
+						"orderItemId",
+						"lineItemKey",
+						"sku",
+						"name",
+						"quantity",
+						"unitPrice",
+						"productId",
+					)
+				}
+				for item in items
+			],
+		}
+
+	def get_order_number(self, source: str, order_id: int) -> str:
+		if source == "amazon":
+			return "{:03d}-{:07d}-{:07d}".format(
+				order_id % 1_000, self.random.randrange(10_000_000), order_id % 10_000_000
+			)
+		if source == "shopify":
+			return f"#{order_id % 1_000_000}"
+		return f"SS-{order_id}"
+
+	def get_id(self) -> int:
+		self.next_id += 1
+		return self.next_id
+
+
+def format_date(date: Optional[datetime.datetime]) -> Optional[str]:
+	return date.strftime("%Y-%m-%dT%H:%M:%S.0000000") if date else None
+
+
+def get_product_lines(order: Dict) -> List[Dict]:
+	return [item for item in order["items"] if item["lineItemKey"] != "discount"]
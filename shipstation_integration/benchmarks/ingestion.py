@@ -0,0 +1,290 @@
+"""
+Benchmark the ingestion of Shipstation orders and shipments, using synthetic
+payloads from `shipstation_integration.benchmarks.generator`.
+
+The orders are created with `create_erpnext_order` and the shipments with
+`create_erpnext_shipment`, page by page the same way a sync does, for the stores
+of an existing Shipstation account. Everything the benchmark creates is rolled
+back, but use a test site all the same, with the stores' companies, warehouses
+and accounts set up.
+
+Each run reports the records per second, the database queries per record and the
+peak Python memory of each stage, and appends the numbers to a JSON Lines file
+along with the app version, so they can be compared between releases. Memory is
+traced during the whole run, which slows it down, so only compare runs made on
+the same machine.
+
+Usage:
+	bench --site <site_name> execute shipstation_integration.benchmarks.ingestion.execute \\
+		--kwargs "{'settings': '<settings>', 'orders': 500}"
+"""
+
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+
+from shipstation.models import ShipStationOrder, ShipStationShipment
+
+import frappe
+from frappe.utils import now_datetime
+
+from shipstation_integration import __version__
+from shipstation_integration.benchmarks.generator import PayloadGenerator
+from shipstation_integration.context import ImportContext
+from shipstation_integration.orders import (
+	create_erpnext_order,
+	get_existing_order_ids,
+	mark_order_as_processed,
+	preload_orders,
+	should_create_order,
+)
+from shipstation_integration.shipments import ShipmentDocuments, create_erpnext_shipment
+from shipstation_integration.transaction import TransactionBatch
+from shipstation_integration.utils import SHIPSTATION_PAGE_SIZE, chunked
+
+if TYPE_CHECKING:
+	from shipstation_integration.shipstation_integration.doctype.shipstation_settings.shipstation_settings import (
+		ShipstationSettings,
+	)
+
+# the file the results of every run are appended to, in the site folder
+RESULTS_FILE = "shipstation_benchmarks.jsonl"
+
+
+class StageMetrics:
+	"""The measurements of one stage of a benchmark run."""
+
+	def __init__(self, stage: str):
+		self.stage = stage
+		self.records = 0
+		self.created = 0
+		self.failed = 0
+		self.queries = 0
+		self.seconds = 0.0
+		self.peak_memory = 0
+		self.errors: List[str] = []
+
+	def as_dict(self) -> Dict:
+		return {
+			"stage": self.stage,
+			"records": self.records,
+			"created": self.created,
+			"failed": self.failed,
+			"seconds": round(self.seconds, 3),
+			"records_per_second": (
+				round(self.records / self.seconds, 2) if self.seconds else 0
+			),
+			"queries": self.queries,
+			"queries_per_record": (
+				round(self.queries / self.records, 2) if self.records else 0
+			),
+			"peak_memory_mb": round(self.peak_memory / 1024 / 1024, 2),
+		}
+
+
+def execute(
+	settings: Optional[str] = None,
+	orders: int = 100,
+	seed: int = 0,
+	results_file: Optional[str] = None,
+):
+	"""
+	Run the ingestion benchmark on the current site.
+
+	Args:
+		settings (str, optional): The Shipstation Settings whose stores the orders are
+			created for. Defaults to the first enabled account.
+		orders (int, optional): The number of orders to generate. Defaults to 100.
+		seed (int, optional): The seed for the generated payloads. Use the same seed
+			to compare runs. Defaults to 0.
+		results_file (str, optional): The JSON Lines file to append the results to.
+			Defaults to `shipstation_benchmarks.jsonl` in the site folder.
+
+	Returns:
+		dict: The results of the run.
+	"""
+
+	settings = settings or frappe.db.get_value("Shipstation Settings", {"enabled": True})
+	if not settings:
+		print("An enabled Shipstation Settings is needed to run the benchmark")
+		return
+
+	sss_doc: "ShipstationSettings" = frappe.get_doc("Shipstation Settings", settings)
+	generator = PayloadGenerator(sss_doc, seed=seed)
+	if not generator.stores:
+		print(f"Shipstation Settings {settings} has no stores with orders enabled")
+		return
+
+	order_payloads = generator.orders(orders)
+	shipment_payloads = generator.shipments(order_payloads)
+	order_stores = {
+		order["orderId"]: str(order["advancedOptions"]["storeId"])
+		for order in order_payloads
+	}
+
+	# the payloads are structured up front, so only the ingestion is measured
+	order_pages = [
+		[ShipStationOrder._structure(order) for order in page]
+		for page in chunked(order_payloads, SHIPSTATION_PAGE_SIZE)
+	]
+	shipment_pages = [
+		[ShipStationShipment._structure(shipment) for shipment in page]
+		for page in chunked(shipment_payloads, SHIPSTATION_PAGE_SIZE)
+	]
+
+	try:
+		order_metrics = ingest_orders(sss_doc, order_pages)
+		shipment_metrics = ingest_shipments(sss_doc, shipment_pages, order_stores)
+	finally:
+		frappe.db.rollback()
+
+	results = {
+		"version": __version__,
+		"timestamp": str(now_datetime()),
+		"site": frappe.local.site,
+		"orders": orders,
+		"seed": seed,
+		"stages": [order_metrics.as_dict(), shipment_metrics.as_dict()],
+	}
+
+	results_file = results_file or frappe.get_site_path(RESULTS_FILE)
+	previous = get_previous_results(results_file, results)
+	with open(results_file, "a") as f:
+		f.write(json.dumps(results) + "\n")
+
+	print_results(results, previous)
+	for metrics in (order_metrics, shipment_metrics):
+		for error in metrics.errors[:5]:
+			print(f"  {metrics.stage} error: {error}")
+
+	return results
+
+
+def ingest_orders(
+	settings: "ShipstationSettings", pages: List[List[ShipStationOrder]]
+) -> StageMetrics:
+	context = ImportContext.build([settings])
+	stores = {str(store.store_id): store for store in settings.shipstation_stores}
+	# nothing is committed; every order is still created in its own savepoint
+	batch = TransactionBatch(batch_size=sys.maxsize)
+
+	with measure("orders") as metrics:
+		existing_order_ids = set()
+		for page in pages:
+			existing_order_ids |= get_existing_order_ids(order.order_id for order in page)
+			preload_orders(page, existing_order_ids, context)
+
+			for order in page:
+				metrics.records += 1
+				store = stores[str(order.advanced_options.store_id)]
+				if not should_create_order(
+					settings, order, store, existing_order_ids, context
+				):
+					continue
+
+				try:
+					with batch.savepoint(on_rollback=context.customers.checkpoint()):
+						if create_erpnext_order(order, store, context):
+							mark_order_as_processed(order, existing_order_ids)
+							metrics.created += 1
+				except Exception as e:
+					metrics.failed += 1
+					metrics.errors.append(f"{order.order_id}: {e!r}")
+
+	return metrics
+
+
+def ingest_shipments(
+	settings: "ShipstationSettings",
+	pages: List[List[ShipStationShipment]],
+	order_stores: Dict[int, str],
+) -> StageMetrics:
+	stores = {str(store.store_id): store for store in settings.shipstation_stores}
+	batch = TransactionBatch(batch_size=sys.maxsize)
+
+	with measure("shipments") as metrics:
+		for page in pages:
+			documents = ShipmentDocuments.for_shipments(page)
+
+			for shipment in page:
+				metrics.records += 1
+				store = stores[order_stores[shipment.order_id]]
+
+				try:
+					with batch.savepoint():
+						if create_erpnext_shipment(shipment, store, documents):
+							metrics.created += 1
+				except Exception as e:
+					metrics.failed += 1
+					metrics.errors.append(f"{shipment.shipment_id}: {e!r}")
+
+	return metrics
+
+
+@contextmanager
+def measure(stage: str) -> Iterator[StageMetrics]:
+	"""Measure the time, database queries and peak memory of a stage."""
+
+	metrics = StageMetrics(stage)
+	sql = frappe.db.sql
+
+	def counted_sql(*args, **kwargs):
+		metrics.queries += 1
+		return sql(*args, **kwargs)
+
+	frappe.db.sql = counted_sql
+	tracemalloc.start()
+	start = time.perf_counter()
+	try:
+		yield metrics
+	finally:
+		metrics.seconds = time.perf_counter() - start
+		metrics.peak_memory = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+		# remove the instance attribute, so the class's method is used again
+		del frappe.db.sql
+
+
+def get_previous_results(results_file: str, results: Dict) -> Optional[Dict]:
+	"""Get the last run with the same parameters on an earlier version, if any."""
+
+	try:
+		with open(results_file) as f:
+			runs = [json.loads(line) for line in f if line.strip()]
+	except FileNotFoundError:
+		return None
+
+	for run in reversed(runs):
+		if (
+			run.get("version") != results["version"]
+			and run.get("orders") == results["orders"]
+			and run.get("seed") == results["seed"]
+		):
+			return run
+
+
+def print_results(results: Dict, previous: Optional[Dict] = None):
+	print(f"Shipstation ingestion benchmark, version {results['version']}")
+	if previous:
+		print(f"Compared to version {previous['version']} ({previous['timestamp']})")
+
+	previous_stages = {stage["stage"]: stage for stage in (previous or {}).get("stages", [])}
+	for stage in results["stages"]:
+		print(
+			f"\n{stage['stage'].title()}: {stage['records']} records, "
+			f"{stage['created']} created, {stage['failed']} failed"
+		)
+		for key, label in (
+			("records_per_second", "Records per second"),
+			("queries_per_record", "Queries per record"),
+			("peak_memory_mb", "Peak memory (MB)"),
+		):
+			line = f"  {label}: {stage[key]}"
+			previous_value = previous_stages.get(stage["stage"], {}).get(key)
+			if previous_value:
+				change = (stage[key] - previous_value) / previous_value * 100
+				line += f" ({change:+.1f}%)"
+			print(line)
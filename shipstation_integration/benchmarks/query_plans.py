@@ -0,0 +1,108 @@
+"""
+Compare the query plans of the Shipstation lookup queries with and without the
+indexes created by `shipstation_integration.setup.setup_indexes`.
+
+Usage:
+	bench --site <site_name> execute shipstation_integration.benchmarks.query_plans.execute
+"""
+
+from typing import Dict, List
+
+import frappe
+
+from shipstation_integration.setup import SHIPSTATION_INDEXES
+
+# the hot lookups made while syncing orders and shipments; each query is
+# explained with a sample value taken from the site's own data
+LOOKUP_QUERIES = [
+	{
+		"title": "Sales Order by Shipstation order ID",
+		"doctype": "Sales Order",
+		"sample_field": "shipstation_order_id",
+		"query": """SELECT name FROM `tabSales Order` {hint}
+			WHERE shipstation_order_id = %(value)s AND docstatus = 1""",
+	},
+	{
+		"title": "Sales Invoice by Shipstation order ID",
+		"doctype": "Sales Invoice",
+		"sample_field": "shipstation_order_id",
+		"query": """SELECT name FROM `tabSales Invoice` {hint}
+			WHERE shipstation_order_id = %(value)s AND docstatus = 1""",
+	},
+	{
+		"title": "Delivery Note by Shipstation order or shipment ID",
+		"doctype": "Delivery Note",
+		"sample_field": "shipstation_order_id",
+		"query": """SELECT name FROM `tabDelivery Note` {hint}
+			WHERE docstatus = 1
+			AND (shipstation_order_id = %(value)s OR shipstation_shipment_id = %(value)s)""",
+	},
+	{
+		"title": "Shipment by Shipstation shipment or order ID",
+		"doctype": "Shipment",
+		"sample_field": "shipstation_order_id",
+		"query": """SELECT name FROM `tabShipment` {hint}
+			WHERE docstatus = 1
+			AND (shipment_id = %(value)s OR shipstation_order_id = %(value)s)""",
+	},
+	{
+		"title": "Sales Order Item by Shipstation order item ID",
+		"doctype": "Sales Order Item",
+		"sample_field": "shipstation_order_item_id",
+		"query": """SELECT name FROM `tabSales Order Item` {hint}
+			WHERE shipstation_order_item_id = %(value)s""",
+	},
+	{
+		"title": "Warehouse by Shipstation warehouse ID",
+		"doctype": "Warehouse",
+		"sample_field": "shipstation_warehouse_id",
+		"query": """SELECT name FROM `tabWarehouse` {hint}
+			WHERE shipstation_warehouse_id = %(value)s""",
+	},
+]
+
+
+def execute():
+	if frappe.db.db_type != "mariadb":
+		print("Query plan comparisons are only supported on MariaDB")
+		return
+
+	for lookup in LOOKUP_QUERIES:
+		value = get_sample_value(lookup["doctype"], lookup["sample_field"])
+		index_names = get_index_names(lookup["doctype"])
+
+		print(f"\n{lookup['title']} ({lookup['sample_field']} = {value!r})")
+		print_plan("Without Shipstation indexes", lookup, value, index_names)
+		print_plan("With Shipstation indexes", lookup, value)
+
+
+def get_sample_value(doctype: str, fieldname: str):
+	value = frappe.db.sql(
+		f"""SELECT `{fieldname}` FROM `tab{doctype}`
+			WHERE IFNULL(`{fieldname}`, '') != ''
+			ORDER BY modified DESC LIMIT 1"""
+	)
+	return value[0][0] if value else ""
+
+
+def get_index_names(doctype: str) -> List[str]:
+	table = f"tab{doctype}"
+	index_names = ["_".join(fields) + "_index" for fields in SHIPSTATION_INDEXES[doctype]]
+	return [name for name in index_names if frappe.db.has_index(table, name)]
+
+
+def print_plan(label: str, lookup: Dict, value, ignored_indexes: List[str] = None):
+	hint = ""
+	if ignored_indexes:
+		hint = "IGNORE INDEX ({})".format(", ".join(f"`{i}`" for i in ignored_indexes))
+
+	plan = frappe.db.sql(
+		"EXPLAIN " + lookup["query"].format(hint=hint), {"value": value}, as_dict=True
+	)
+
+	print(f"  {label}:")
+	for row in plan:
+		print(
+			f"    type={row.get('type')} key={row.get('key')} "
+			f"rows={row.get('rows')} extra={row.get('Extra')}"
+		)
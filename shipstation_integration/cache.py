@@ -0,0 +1,178 @@
+from collections import OrderedDict
+from typing import Any, FrozenSet, Hashable, Iterable, Optional
+
+import frappe
+
+# the number of SKUs each worker process keeps in memory
+ITEM_CODE_CACHE_SIZE = 4096
+
+# Redis keys for the item codes shared between worker processes, the SKUs
+# cached for each item code, and the version of each item code that was last
+# invalidated, which drops the in-memory copies in every process
+ITEM_CODE_CACHE_KEY = "shipstation_item_codes"
+ITEM_CODE_SKUS_CACHE_KEY = "shipstation_item_code_skus"
+ITEM_CODE_VERSION_CACHE_KEY = "shipstation_item_code_versions"
+
+# Redis hash of the Shipstation warehouse IDs of each Shipstation Settings
+WAREHOUSE_ID_CACHE_KEY = "shipstation_warehouse_ids"
+
+# Redis key for whether the Parsimony app is installed on the site, and how long
+# it's kept for, in seconds
+PARSIMONY_INSTALLED_CACHE_KEY = "shipstation_parsimony_installed"
+PARSIMONY_INSTALLED_CACHE_EXPIRY = 60 * 60
+
+
+class LRUCache:
+	"""A simple in-memory cache that evicts the least recently used entries."""
+
+	def __init__(self, maxsize: int):
+		self.maxsize = maxsize
+		self.data: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+	def get(self, key: Hashable, default: Any = None) -> Any:
+		if key not in self.data:
+			return default
+		self.data.move_to_end(key)
+		return self.data[key]
+
+	def set(self, key: Hashable, value: Any):
+		self.data[key] = value
+		self.data.move_to_end(key)
+		while len(self.data) > self.maxsize:
+			self.data.popitem(last=False)
+
+	def pop(self, key: Hashable):
+		self.data.pop(key, None)
+
+	def clear(self):
+		self.data.clear()
+
+
+_item_codes = LRUCache(ITEM_CODE_CACHE_SIZE)
+
+
+def get_cached_item_code(sku: str, store: Optional[str] = None) -> Optional[str]:
+	"""
+	Get the item code that a Shipstation SKU was last resolved to.
+
+	Lookups check the worker's in-memory cache first, and then the cache shared
+	through Redis.
+
+	Args:
+		sku (str): The Shipstation SKU (or product name, for products without a SKU).
+		store (str, optional): The row name of the Shipstation store.
+
+	Returns:
+		(str, None): The cached item code, if any.
+	"""
+
+	local_key = (frappe.local.site, sku, store)
+
+	cached = _item_codes.get(local_key)
+	if cached and cached[0] == get_item_code_version(cached[1]):
+		return cached[1]
+
+	item_code = frappe.cache().hget(ITEM_CODE_CACHE_KEY, get_shared_key(sku, store))
+	if item_code:
+		_item_codes.set(local_key, (get_item_code_version(item_code), item_code))
+	return item_code
+
+
+def set_cached_item_code(sku: str, store: Optional[str], item_code: str):
+	shared_key = get_shared_key(sku, store)
+	_item_codes.set(
+		(frappe.local.site, sku, store), (get_item_code_version(item_code), item_code)
+	)
+	frappe.cache().hset(ITEM_CODE_CACHE_KEY, shared_key, item_code)
+	frappe.cache().sadd(get_item_code_skus_key(item_code), shared_key)
+
+
+def remove_cached_item_code(sku: str, store: Optional[str] = None):
+	_item_codes.pop((frappe.local.site, sku, store))
+	frappe.cache().hdel(ITEM_CODE_CACHE_KEY, get_shared_key(sku, store))
+
+
+def clear_cached_item_codes(item_codes: Iterable[str]):
+	"""
+	Invalidate the SKUs cached for some item codes, in every worker process.
+
+	The SKUs of other item codes stay cached.
+
+	Args:
+		item_codes (list of str): The item codes, for e.g. of an item that was
+			changed, renamed or deleted.
+	"""
+
+	for item_code in {item_code for item_code in item_codes if item_code}:
+		skus_key = get_item_code_skus_key(item_code)
+		for shared_key in frappe.cache().smembers(skus_key):
+			frappe.cache().hdel(ITEM_CODE_CACHE_KEY, frappe.safe_decode(shared_key))
+		frappe.cache().delete_value(skus_key)
+
+		# the in-memory copies in other processes are dropped on their next lookup
+		frappe.cache().hset(
+			ITEM_CODE_VERSION_CACHE_KEY, item_code, frappe.generate_hash(length=10)
+		)
+
+
+def get_item_code_version(item_code: str) -> Optional[str]:
+	return frappe.cache().hget(ITEM_CODE_VERSION_CACHE_KEY, item_code)
+
+
+def get_item_code_skus_key(item_code: str) -> str:
+	return f"{ITEM_CODE_SKUS_CACHE_KEY}:{item_code}"
+
+
+def get_shared_key(sku: str, store: Optional[str] = None) -> str:
+	return f"{store or ''}::{sku}"
+
+
+def get_cached_warehouse_ids(settings: str, warehouses: Iterable[str]) -> FrozenSet:
+	"""
+	Get the Shipstation warehouse IDs of the warehouses set in Shipstation Settings.
+
+	The IDs are looked up in a single query, and cached until the settings or
+	any warehouse changes.
+
+	Args:
+		settings (str): The name of the Shipstation Settings.
+		warehouses (list of str): The warehouses set in the settings.
+
+	Returns:
+		frozenset: The Shipstation warehouse IDs.
+	"""
+
+	warehouses = tuple(sorted(set(warehouses)))
+	if not warehouses:
+		return frozenset()
+
+	# the cached IDs are only valid for the same set of warehouses, in case the
+	# settings have unsaved changes
+	cached = frappe.cache().hget(WAREHOUSE_ID_CACHE_KEY, settings)
+	if cached and cached[0] == warehouses:
+		return cached[1]
+
+	warehouse_ids = frozenset(
+		warehouse_id
+		for warehouse_id in frappe.get_all(
+			"Warehouse",
+			filters={"name": ("in", warehouses)},
+			pluck="shipstation_warehouse_id",
+		)
+		if warehouse_id
+	)
+	frappe.cache().hset(WAREHOUSE_ID_CACHE_KEY, settings, (warehouses, warehouse_ids))
+	return warehouse_ids
+
+
+def clear_warehouse_id_cache(settings: Optional[str] = None):
+	if settings:
+		frappe.cache().hdel(WAREHOUSE_ID_CACHE_KEY, settings)
+	else:
+		frappe.cache().delete_value(WAREHOUSE_ID_CACHE_KEY)
+
+
+def clear_parsimony_installed_cache():
+	"""Forget whether the Parsimony app is installed, whenever the site's cache is cleared."""
+
+	frappe.cache().delete_value(PARSIMONY_INSTALLED_CACHE_KEY)
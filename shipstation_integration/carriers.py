@@ -0,0 +1,108 @@
+import json
+from typing import Dict, List, Optional, Tuple
+
+import frappe
+
+# the Redis hash of the compiled carrier indexes, by Shipstation Settings name
+CARRIER_INDEX_CACHE_KEY = "shipstation_carrier_index"
+
+# the package code used when a carrier doesn't have the selected package
+DEFAULT_PACKAGE_CODE = "Package"
+
+
+def build_carrier_index(carrier_data: Optional[str]) -> Dict:
+	"""
+	Compile the carrier data of a Shipstation account into a lookup index.
+
+	The index holds:
+		- `carriers`: the carrier, service and package names shown in the
+			shipping label dialog, in Shipstation's order.
+		- `codes`: the Shipstation codes for label generation, keyed by the carrier
+			name and nickname, and then by the service and package names.
+
+	Args:
+		carrier_data (str): The JSON carrier data from Shipstation Settings.
+
+	Returns:
+		dict: The carrier index.
+	"""
+
+	carriers: List[Dict] = []
+	codes: Dict[str, Dict] = {}
+
+	for carrier in json.loads(carrier_data) if carrier_data else []:
+		services = carrier.get("services") or []
+		packages = carrier.get("packages") or []
+
+		carriers.append(
+			{
+				"name": carrier.get("name"),
+				"nickname": carrier.get("nickname"),
+				"services": [{"name": service.get("name")} for service in services],
+				"packages": [{"name": package.get("name")} for package in packages],
+			}
+		)
+
+		# a later carrier with the same name or nickname takes precedence
+		for key in {carrier.get("name"), carrier.get("nickname")} - {None}:
+			carrier_codes = codes.setdefault(
+				key, {"code": None, "services": {}, "packages": {}}
+			)
+			carrier_codes["code"] = carrier.get("code")
+			carrier_codes["services"].update(
+				{service.get("name"): service.get("code") for service in services}
+			)
+			carrier_codes["packages"].update(
+				{package.get("name"): package.get("code") for package in packages}
+			)
+
+	return {"carriers": carriers, "codes": codes}
+
+
+def get_carrier_index(settings: str) -> Dict:
+	"""Get the compiled carrier index of a Shipstation account."""
+
+	index = frappe.cache().hget(CARRIER_INDEX_CACHE_KEY, settings)
+	if index is None:
+		carrier_data = frappe.db.get_value("Shipstation Settings", settings, "carrier_data")
+		index = build_carrier_index(carrier_data)
+		frappe.cache().hset(CARRIER_INDEX_CACHE_KEY, settings, index)
+	return index
+
+
+def set_carrier_index(settings: str, carrier_data: Optional[str]):
+	frappe.cache().hset(
+		CARRIER_INDEX_CACHE_KEY, settings, build_carrier_index(carrier_data)
+	)
+
+
+def clear_carrier_index(settings: str):
+	frappe.cache().hdel(CARRIER_INDEX_CACHE_KEY, settings)
+
+
+def get_carrier_codes(
+	settings: str, carrier: str, service: str, package: str
+) -> Tuple[Optional[str], Optional[str], str]:
+	"""
+	Get the Shipstation codes of a carrier, service and package by their names.
+
+	Args:
+		settings (str): The name of the Shipstation Settings.
+		carrier (str): The carrier name or nickname.
+		service (str): The service name.
+		package (str): The package name.
+
+	Returns:
+		tuple: The carrier, service and package codes. The package code defaults
+			to "Package" if the carrier doesn't have the package.
+	"""
+
+	carrier_codes = get_carrier_index(settings)["codes"].get(carrier)
+	if not carrier_codes:
+		return None, None, DEFAULT_PACKAGE_CODE
+
+	return (
+		carrier_codes["code"],
+		carrier_codes["services"].get(service),
+		carrier_codes["packages"].get(package) or DEFAULT_PACKAGE_CODE,
+	)
@@ -0,0 +1,453 @@
+import cProfile
+import datetime
+import io
+import os
+import pstats
+from contextlib import contextmanager, nullcontext
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
+
+import click
+
+import frappe
+from frappe.commands import get_site, pass_context
+
+if TYPE_CHECKING:
+	from shipstation_integration.shipstation_integration.doctype.shipstation_settings.shipstation_settings import (
+		ShipstationSettings,
+	)
+	from shipstation_integration.shipstation_integration.doctype.shipstation_store.shipstation_store import (
+		ShipstationStore,
+	)
+
+# the number of functions shown in a profile
+PROFILE_LIMIT = 40
+
+
+def sync_options(include_store: bool = True) -> Callable:
+	"""The options shared by all the sync commands."""
+
+	options = [
+		click.option(
+			"--settings",
+			"settings",
+			multiple=True,
+			help="The Shipstation Settings to sync. Defaults to every enabled account.",
+		),
+		click.option(
+			"--store",
+			"stores",
+			multiple=True,
+			help="The name or Shipstation ID of a store to sync. Defaults to every store.",
+		),
+		click.option(
+			"--from-date",
+			type=click.DateTime(),
+			help="The start of the sync window, in Shipstation's timezone.",
+		),
+		click.option(
+			"--to-date",
+			type=click.DateTime(),
+			help="The end of the sync window, in Shipstation's timezone. Defaults to now.",
+		),
+		click.option(
+			"--workers",
+			type=int,
+			help="The maximum Shipstation requests to run at the same time for each account.",
+		),
+		click.option(
+			"--dry-run",
+			is_flag=True,
+			default=False,
+			help="Fetch and check the records, without creating anything.",
+		),
+		click.option(
+			"--profile",
+			is_flag=True,
+			default=False,
+			help="Print a profile of the sync once it's done.",
+		),
+		click.option(
+			"--record",
+			type=click.Path(dir_okay=False),
+			help="Append the Shipstation responses to a recording at this path.",
+		),
+		click.option(
+			"--replay",
+			type=click.Path(exists=True, dir_okay=False),
+			help="Answer the Shipstation requests from a recording, without any network access.",
+		),
+	]
+	if not include_store:
+		del options[1]
+
+	def decorator(command: Callable) -> Callable:
+		for option in reversed(options):
+			command = option(command)
+		return command
+
+	return decorator
+
+
+@click.command("shipstation-sync-orders")
+@sync_options()
+@pass_context
+def sync_orders(
+	context, settings, stores, from_date, to_date, workers, dry_run, profile, record, replay
+):
+	"""Fetch Shipstation orders and create Sales Orders."""
+
+	with connect(context, record, replay), profiling(profile):
+		run_order_sync(settings, stores, from_date, to_date, workers, dry_run)
+
+
+@click.command("shipstation-sync-shipments")
+@sync_options()
+@pass_context
+def sync_shipments(
+	context, settings, stores, from_date, to_date, workers, dry_run, profile, record, replay
+):
+	"""Fetch Shipstation shipments and create Sales Invoices, Delivery Notes and Shipments."""
+
+	with connect(context, record, replay), profiling(profile):
+		run_shipment_sync(settings, stores, from_date, to_date, workers, dry_run)
+
+
+@click.command("shipstation-sync-products")
+@sync_options(include_store=False)
+@pass_context
+def sync_products(
+	context, settings, from_date, to_date, workers, dry_run, profile, record, replay
+):
+	"""Fetch Shipstation products and create or update Items."""
+
+	with connect(context, record, replay), profiling(profile):
+		run_product_sync(settings, from_date, to_date, workers, dry_run)
+
+
+def run_order_sync(
+	settings: Tuple[str],
+	stores: Tuple[str],
+	from_date: Optional[datetime.datetime] = None,
+	to_date: Optional[datetime.datetime] = None,
+	workers: Optional[int] = None,
+	dry_run: bool = False,
+):
+	from httpx import HTTPError
+
+	from shipstation_integration.api import FetchJob, fetch_concurrently
+	from shipstation_integration.context import ImportContext
+	from shipstation_integration.orders import (
+		get_existing_order_ids,
+		get_order_sync_start,
+		mark_order_as_processed,
+		preload_orders,
+		process_order,
+		should_create_order,
+		update_order_sync_cursor,
+	)
+	from shipstation_integration.transaction import TransactionBatch
+	from shipstation_integration.utils import get_shipstation_datetime
+
+	context = ImportContext.build(get_settings_docs(settings, workers))
+
+	jobs = []
+	for sss_doc in context.settings.values():
+		client = sss_doc.client()
+
+		for store in get_stores(sss_doc, stores):
+			if not store.enable_orders:
+				continue
+
+			parameters = {
+				"store_id": store.store_id,
+				"modify_date_start": from_date or get_order_sync_start(sss_doc, store),
+				"modify_date_end": to_date or get_shipstation_datetime(),
+			}
+			parameters = context.hooks.apply(
+				"update_shipstation_list_order_parameters", parameters
+			)
+			jobs.append(FetchJob(sss_doc, store, client.list_orders, parameters))
+
+	total_fetched = total_created = 0
+	for result in fetch_concurrently(jobs):
+		sss_doc, store, _, parameters = result.job
+		label = get_store_label(sss_doc, store)
+
+		batch_context = nullcontext() if dry_run else TransactionBatch.for_settings(sss_doc)
+		with batch_context as batch:
+			existing_order_ids = set()
+			failed_orders = []
+			try:
+				for page_number, page in enumerate(result.pages, start=1):
+					existing_order_ids |= get_existing_order_ids(
+						order.order_id for order in page if order
+					)
+					processed_count = len(existing_order_ids)
+
+					if dry_run:
+						for order in page:
+							if should_create_order(
+								sss_doc,
+								order,
+								store,
+								existing_order_ids,
+								context,
+								failed_orders,
+							):
+								mark_order_as_processed(order, existing_order_ids)
+					else:
+						preload_orders(page, existing_order_ids, context)
+						for order in page:
+							process_order(
+								sss_doc,
+								order,
+								store,
+								existing_order_ids,
+								context,
+								batch,
+								failed_orders,
+							)
+
+					created = len(existing_order_ids) - processed_count
+					total_fetched += len(page)
+					total_created += created
+					echo_page(label, page_number, len(page), "orders", created, dry_run)
+			except HTTPError as e:
+				click.secho(f"{label}: error while fetching orders: {e}", fg="red", err=True)
+				continue
+
+			if not dry_run:
+				update_order_sync_cursor(
+					store,
+					parameters.get("modify_date_start"),
+					parameters.get("modify_date_end"),
+					failed_orders,
+				)
+
+	echo_summary(total_fetched, "orders", total_created, dry_run)
+
+
+def run_shipment_sync(
+	settings: Tuple[str],
+	stores: Tuple[str],
+	from_date: Optional[datetime.datetime] = None,
+	to_date: Optional[datetime.datetime] = None,
+	workers: Optional[int] = None,
+	dry_run: bool = False,
+):
+	from httpx import HTTPError
+
+	from shipstation_integration.api import FetchJob, fetch_concurrently
+	from shipstation_integration.shipments import process_shipments
+	from shipstation_integration.transaction import TransactionBatch
+	from shipstation_integration.utils import get_shipstation_datetime
+
+	jobs = []
+	for sss_doc in get_settings_docs(settings, workers):
+		client = sss_doc.client()
+
+		for store in get_stores(sss_doc, stores):
+			if not store.enable_shipments or not any(
+				[
+					store.create_sales_invoice,
+					store.create_delivery_note,
+					store.create_shipment,
+				]
+			):
+				continue
+
+			parameters = {
+				"store_id": store.store_id,
+				"create_date_start": (
+					from_date or get_shipstation_datetime() - datetime.timedelta(hours=24)
+				),
+				"create_date_end": to_date or get_shipstation_datetime(),
+				"include_shipment_items": True,
+			}
+			jobs.append(FetchJob(sss_doc, store, client.list_shipments, parameters))
+
+	total_fetched = 0
+	for result in fetch_concurrently(jobs):
+		sss_doc, store, _, _ = result.job
+		label = get_store_label(sss_doc, store)
+
+		batch_context = nullcontext() if dry_run else TransactionBatch.for_settings(sss_doc)
+		with batch_context as batch:
+			try:
+				for page_number, page in enumerate(result.pages, start=1):
+					shipments = [shipment for shipment in page if shipment]
+					if not dry_run:
+						process_shipments(sss_doc, store, page, batch)
+
+					voided = sum(1 for shipment in shipments if shipment.voided)
+					total_fetched += len(shipments)
+					click.echo(
+						f"{label}: page {page_number}, {len(shipments)} shipments"
+						f" ({voided} voided)" + (" [dry run]" if dry_run else "")
+					)
+			except HTTPError as e:
+				click.secho(
+					f"{label}: error while fetching shipments: {e}", fg="red", err=True
+				)
+
+	click.echo(f"Fetched {total_fetched} shipments" + (" [dry run]" if dry_run else ""))
+
+
+def run_product_sync(
+	settings: Tuple[str],
+	from_date: Optional[datetime.datetime] = None,
+	to_date: Optional[datetime.datetime] = None,
+	workers: Optional[int] = None,
+	dry_run: bool = False,
+):
+	from httpx import HTTPError
+
+	from shipstation_integration.api import FetchJob, fetch_concurrently
+	from shipstation_integration.context import ImportContext
+	from shipstation_integration.items import create_item, get_item_code
+
+	context = ImportContext.build(get_settings_docs(settings, workers))
+
+	jobs = []
+	for sss_doc in context.settings.values():
+		parameters = {}
+		if from_date:
+			parameters["start_date"] = from_date
+		if to_date:
+			parameters["end_date"] = to_date
+
+		jobs.append(FetchJob(sss_doc, None, sss_doc.client().list_products, parameters))
+
+	total_fetched = total_created = 0
+	for result in fetch_concurrently(jobs):
+		sss_doc = result.job.settings
+		try:
+			for page_number, page in enumerate(result.pages, start=1):
+				products = [product for product in page if product]
+				context.item_aliases.load(products)
+				created = sum(
+					1 for product in products if not get_item_code(product, context)
+				)
+
+				if not dry_run:
+					for product in products:
+						create_item(product, settings=sss_doc, context=context)
+					frappe.db.commit()
+
+				total_fetched += len(products)
+				total_created += created
+				echo_page(
+					sss_doc.name, page_number, len(products), "products", created, dry_run
+				)
+		except HTTPError as e:
+			click.secho(
+				f"{sss_doc.name}: error while fetching products: {e}", fg="red", err=True
+			)
+
+	echo_summary(total_fetched, "products", total_created, dry_run)
+
+
+def get_settings_docs(
+	settings: Tuple[str], workers: Optional[int] = None
+) -> List["ShipstationSettings"]:
+	"""
+	Get the Shipstation accounts to sync.
+
+	Pages are always streamed, so each page is created while the next one is being
+	fetched. The worker count only applies to this sync, and isn't saved.
+	"""
+
+	names = settings or frappe.get_all(
+		"Shipstation Settings", filters={"enabled": True}, pluck="name"
+	)
+
+	settings_docs = []
+	for name in names:
+		if not frappe.db.exists("Shipstation Settings", name):
+			raise click.BadParameter(
+				f"Shipstation Settings {name} not found", param_hint="--settings"
+			)
+
+		sss_doc: "ShipstationSettings" = frappe.get_doc("Shipstation Settings", name)
+		if not sss_doc.enabled:
+			click.secho(
+				f"Skipping disabled Shipstation Settings {name}", fg="yellow", err=True
+			)
+			continue
+
+		sss_doc.stream_pages = 1
+		if workers:
+			sss_doc.max_concurrent_requests = workers
+		settings_docs.append(sss_doc)
+
+	return settings_docs
+
+
+def get_stores(
+	settings: "ShipstationSettings", stores: Tuple[str]
+) -> List["ShipstationStore"]:
+	if not stores:
+		return settings.shipstation_stores
+
+	return [
+		store
+		for store in settings.shipstation_stores
+		if store.store_name in stores or str(store.store_id) in stores
+	]
+
+
+def get_store_label(settings: "ShipstationSettings", store: "ShipstationStore") -> str:
+	return f"{settings.name} / {store.store_name}"
+
+
+def echo_page(
+	label: str, page_number: int, count: int, records: str, created: int, dry_run: bool
+):
+	action = "to create" if dry_run else "created"
+	click.echo(f"{label}: page {page_number}, {count} {records}, {created} {action}")
+
+
+def echo_summary(fetched: int, records: str, created: int, dry_run: bool):
+	action = "would be created" if dry_run else "created"
+	click.secho(f"Fetched {fetched} {records}, {created} {action}", fg="green")
+
+
+@contextmanager
+def connect(context, record: Optional[str] = None, replay: Optional[str] = None):
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+
+	# only applies to this sync, instead of being saved in the site config
+	if record:
+		frappe.local.conf.shipstation_record_path = os.path.abspath(record)
+	if replay:
+		frappe.local.conf.shipstation_replay_path = os.path.abspath(replay)
+	try:
+		yield
+	finally:
+		# anything the sync didn't commit is discarded, for e.g. any records
+		# created by hooks while checking orders in a dry run
+		frappe.db.rollback()
+		frappe.destroy()
+
+
+@contextmanager
+def profiling(enabled: bool):
+	if not enabled:
+		yield
+		return
+
+	profiler = cProfile.Profile()
+	profiler.enable()
+	try:
+		yield
+	finally:
+		profiler.disable()
+		output = io.StringIO()
+		stats = pstats.Stats(profiler, stream=output)
+		stats.sort_stats("cumulative").print_stats(PROFILE_LIMIT)
+		click.echo(output.getvalue(), err=True)
+
+
+commands = [sync_orders, sync_shipments, sync_products]
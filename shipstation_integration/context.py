@@ -0,0 +1,134 @@
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+import frappe
+
+from shipstation_integration.hook_events.item import ItemAliasResolver
+from shipstation_integration.pipeline import HookPipeline
+
+if TYPE_CHECKING:
+	from shipstation_integration.customer import CustomerResolver
+	from shipstation_integration.orders import MarketplaceOrderResolver
+	from shipstation_integration.shipstation_integration.doctype.shipstation_store.shipstation_store import (
+		ShipstationStore,
+	)
+	from shipstation_integration.shipstation_integration.doctype.shipstation_settings.shipstation_settings import (
+		ShipstationSettings,
+	)
+
+# defaults for customers created from Shipstation orders
+DEFAULT_CUSTOMER_GROUP = "ShipStation"
+DEFAULT_TERRITORY = "United States"
+
+
+class ImportContext(NamedTuple):
+	"""
+	Configuration and reference data shared by every record imported in a sync run.
+
+	Build it once per run with `ImportContext.build`, and pass it to the create
+	functions, instead of having them look up the same data for every record.
+	Functions called without a context share one per Shipstation account for the
+	rest of the request or job, from `ImportContext.for_settings`.
+	"""
+
+	# Shipstation Settings, by name
+	settings: Mapping[str, "ShipstationSettings"]
+	# Shipstation stores from all the settings, by row name
+	stores: Mapping[str, "ShipstationStore"]
+	# the default stock UOM from Stock Settings
+	stock_uom: str
+	# Country names, by lowercase country code
+	countries: Mapping[str, str]
+	customer_group: str
+	territory: str
+	hooks: HookPipeline
+	# Item Aliases of the imported SKUs, loaded in bulk as records are fetched
+	item_aliases: ItemAliasResolver
+	# existing customers, contacts and billing addresses, loaded in bulk per page
+	customers: "CustomerResolver"
+	# existing Sales Orders of Amazon and Shopify orders, loaded in bulk per page
+	marketplace_orders: "MarketplaceOrderResolver"
+
+	@classmethod
+	def build(
+		cls,
+		settings: List["ShipstationSettings"],
+		hooks: Optional[HookPipeline] = None,
+	) -> "ImportContext":
+		"""
+		Load the reference data for a sync run.
+
+		Args:
+			settings (list of ShipstationSettings): The Shipstation accounts being synced.
+			hooks (HookPipeline, optional): The import hooks, if already resolved.
+
+		Returns:
+			ImportContext: The context for the sync run.
+		"""
+
+		# the customer and order modules import this one, for the defaults and the context
+		from shipstation_integration.customer import CustomerResolver
+		from shipstation_integration.orders import MarketplaceOrderResolver
+
+		countries = {
+			country.code.lower(): country.name
+			for country in frappe.get_all("Country", fields=["name", "code"])
+			if country.code
+		}
+
+		return cls(
+			settings=MappingProxyType({doc.name: doc for doc in settings}),
+			stores=MappingProxyType(
+				{
+					store.name: store
+					for doc in settings
+					for store in doc.shipstation_stores
+				}
+			),
+			stock_uom=frappe.db.get_single_value("Stock Settings", "stock_uom"),
+			countries=MappingProxyType(countries),
+			customer_group=DEFAULT_CUSTOMER_GROUP,
+			territory=DEFAULT_TERRITORY,
+			hooks=hooks or HookPipeline(),
+			item_aliases=ItemAliasResolver(),
+			customers=CustomerResolver(),
+			marketplace_orders=MarketplaceOrderResolver(),
+		)
+
+	@classmethod
+	def for_settings(cls, settings: "ShipstationSettings") -> "ImportContext":
+		"""
+		Get a context for importing records one at a time into a Shipstation account.
+
+		The context is built once, and kept for the rest of the request or job, or
+		until the settings are modified.
+		"""
+
+		contexts = get_cached_contexts()
+		cached = contexts.get(settings.name)
+		if cached and cached[0] == str(settings.modified):
+			return cached[1]
+
+		context = cls.build([settings])
+		contexts[settings.name] = (str(settings.modified), context)
+		return context
+
+	@classmethod
+	def for_store(cls, store: "ShipstationStore") -> "ImportContext":
+		"""Get a context for importing a single record into a store."""
+
+		cached = get_cached_contexts().get(store.parent)
+		if cached:
+			return cached[1]
+
+		return cls.for_settings(frappe.get_doc("Shipstation Settings", store.parent))
+
+	def get_country(self, country_code: Optional[str]) -> Optional[str]:
+		return self.countries.get((country_code or "").lower())
+
+
+def get_cached_contexts() -> Dict[str, Tuple[str, ImportContext]]:
+	# kept on `frappe.local`, so they're dropped at the end of every request or job
+	if not hasattr(frappe.local, "shipstation_import_contexts"):
+		frappe.local.shipstation_import_contexts = {}
+	return frappe.local.shipstation_import_contexts
@@ -1,13 +1,26 @@
-from typing import TYPE_CHECKING
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
 
 import frappe
 from frappe.utils import getdate, parse_addr
 
+from shipstation_integration.context import DEFAULT_CUSTOMER_GROUP, DEFAULT_TERRITORY
+
 if TYPE_CHECKING:
+    from erpnext.selling.doctype.customer.customer import Customer
     from erpnext.selling.doctype.sales_order.sales_order import SalesOrder
     from frappe.contacts.doctype.address.address import Address
     from frappe.contacts.doctype.contact.contact import Contact
     from shipstation.models import ShipStationAddress, ShipStationOrder
+    from shipstation_integration.context import ImportContext
     from shipstation_integration.shipstation_integration.doctype.shipstation_store.shipstation_store import (
         ShipstationStore,
     )
@@ -96,24 +109,36 @@ def update_shopify_order(
 
 
 def create_address(
-    address: "ShipStationAddress", customer: str, email: str, address_type: str
+    address: "ShipStationAddress",
+    customer: str,
+    email: str,
+    address_type: str,
+    context: Optional["ImportContext"] = None,
 ):
     addr: "Address" = frappe.new_doc("Address")
     addr.append("links", {"link_doctype": "Customer", "link_name": customer})
-    _update_address(address, addr, email, address_type)
+    _update_address(address, addr, email, address_type, context)
     return addr
 
 
 def update_address(
-    address: "ShipStationAddress", address_name: str, email: str, address_type: str
+    address: "ShipStationAddress",
+    address_name: str,
+    email: str,
+    address_type: str,
+    context: Optional["ImportContext"] = None,
 ):
     addr: "Address" = frappe.get_doc("Address", address_name)
-    _update_address(address, addr, email, address_type)
+    _update_address(address, addr, email, address_type, context)
     return addr
 
 
 def _update_address(
-    address: "ShipStationAddress", addr: "Address", email: str, address_type: str
+    address: "ShipStationAddress",
+    addr: "Address",
+    email: str,
+    address_type: str,
+    context: Optional["ImportContext"] = None,
 ):
     addr.address_type = address_type
     addr.address_line1 = address.street1
@@ -122,7 +147,12 @@ def _update_address(
     addr.city = address.city
     addr.state = address.state
     addr.pincode = address.postal_code
-    addr.country = frappe.get_cached_value("Country", {"code": address.country}, "name")
+    if context:
+        addr.country = context.get_country(address.country)
+    else:
+        addr.country = frappe.get_cached_value(
+            "Country", {"code": address.country}, "name"
+        )
     addr.phone = address.phone
     addr.email = email
     try:
@@ -132,54 +162,245 @@ def _update_address(
         frappe.log_error(title="Error saving Shipstation Address", message=e)
 
 
-def create_customer(order: "ShipStationOrder"):
-    customer_id = (
-        order.customer_id
-        or order.customer_email
-        or order.ship_to.name
-        or frappe.generate_hash("", 10)
-    )
+class CustomerResolver:
+    """
+    The existing customers, contacts and billing addresses for Shipstation orders.
+
+    Call `load` with a page of orders to look up the records for all of them in a
+    few queries, instead of a few queries for every order. Names that weren't
+    preloaded are looked up when first requested, and records created during the
+    sync run are added as they're created.
+
+    Names are matched case-insensitively, like the database does.
+    """
+
+    def __init__(self):
+        # existing customers, by casefolded name
+        self.customers: Dict[str, frappe._dict] = {}
+        # contact names, by casefolded email address
+        self.contacts: Dict[str, str] = {}
+        # billing address names, by casefolded customer name
+        self.billing_addresses: Dict[str, str] = {}
+        self.loaded_customers: Set[str] = set()
+        self.loaded_emails: Set[str] = set()
+        # the records added to the maps above, as (map, key) pairs, so that they
+        # can be forgotten if the records are rolled back
+        self.added: List[Tuple[Dict, str]] = []
+
+    def load(self, orders: Iterable["ShipStationOrder"]):
+        customer_names = {get_customer_name(order) for order in orders if order}
+        customer_names.discard(None)
+        self.load_customers(customer_names)
+        self.load_contacts(parse_addr(name)[0] for name in customer_names)
+
+    def load_customers(self, customer_names: Iterable[str]):
+        customer_names = {
+            name for name in customer_names if name.casefold() not in self.loaded_customers
+        }
+        if not customer_names:
+            return
+
+        self.loaded_customers |= {name.casefold() for name in customer_names}
+        for customer in frappe.get_all(
+            "Customer",
+            filters={"name": ("in", list(customer_names))},
+            fields=["name", "customer_primary_address"],
+        ):
+            self.customers[customer.name.casefold()] = customer
+
+        for address in frappe.db.sql(
+            """
+                SELECT `tabAddress`.name, `tabDynamic Link`.link_name AS customer
+                FROM `tabAddress`
+                INNER JOIN `tabDynamic Link`
+                    ON `tabDynamic Link`.parent = `tabAddress`.name
+                    AND `tabDynamic Link`.parenttype = 'Address'
+                WHERE `tabDynamic Link`.link_doctype = 'Customer'
+                AND `tabDynamic Link`.link_name IN %(customer_names)s
+                AND `tabAddress`.address_type = 'Billing'
+                ORDER BY `tabAddress`.creation
+            """,
+            {"customer_names": tuple(customer_names)},
+            as_dict=True,
+        ):
+            self.billing_addresses.setdefault(address.customer.casefold(), address.name)
+
+    def load_contacts(self, emails: Iterable[Optional[str]]):
+        emails = {
+            email for email in emails if email and email.casefold() not in self.loaded_emails
+        }
+        if not emails:
+            return
+
+        self.loaded_emails |= {email.casefold() for email in emails}
+        for contact in frappe.get_all(
+            "Contact Email",
+            filters={"email_id": ("in", list(emails)), "parenttype": "Contact"},
+            fields=["parent", "email_id"],
+            order_by="creation",
+        ):
+            self.contacts.setdefault(contact.email_id.casefold(), contact.parent)
+
+    def get_customer(self, customer_name: str) -> Optional[frappe._dict]:
+        self.load_customers([customer_name])
+        return self.customers.get(customer_name.casefold())
+
+    def get_contact(self, email_id: Optional[str]) -> Optional[str]:
+        if not email_id:
+            return None
+        self.load_contacts([email_id])
+        return self.contacts.get(email_id.casefold())
+
+    def get_billing_address(self, customer_name: str) -> Optional[str]:
+        self.load_customers([customer_name])
+        return self.billing_addresses.get(customer_name.casefold())
+
+    def add_customer(self, customer: "Customer"):
+        self.loaded_customers.add(customer.name.casefold())
+        self._add(
+            self.customers,
+            customer.name.casefold(),
+            frappe._dict(
+                name=customer.name,
+                customer_primary_address=customer.customer_primary_address,
+            ),
+        )
+
+    def add_contact(self, email_id: str, contact_name: str):
+        self.loaded_emails.add(email_id.casefold())
+        self._add(self.contacts, email_id.casefold(), contact_name)
+
+    def add_billing_address(self, customer_name: str, address_name: str):
+        self._add(self.billing_addresses, customer_name.casefold(), address_name)
+
+    def _add(self, records: Dict, key: str, value):
+        if key not in records:
+            records[key] = value
+            self.added.append((records, key))
+
+    def checkpoint(self) -> Callable[[], None]:
+        """
+        Get a function that forgets the records added to the resolver from now on.
+
+        Pass it as the `on_rollback` of a transaction savepoint, so that records
+        rolled back with a failed order aren't reused by later orders in the run.
+        The names stay marked as loaded, since they're no longer in the database.
+        """
+
+        position = len(self.added)
+
+        def rollback():
+            while len(self.added) > position:
+                records, key = self.added.pop()
+                records.pop(key, None)
+
+        return rollback
+
+
+def get_customer_name(order: "ShipStationOrder") -> Optional[str]:
+    """Get the name of the customer for a Shipstation order, if the order has one."""
 
     customer_name = (
-        order.customer_email or order.customer_id or order.ship_to.name or customer_id
-    ).strip()
+        order.customer_email
+        or order.customer_id
+        or (order.ship_to.name if order.ship_to else None)
+    )
+    return str(customer_name).strip() if customer_name else None
+
+
+def create_customer(
+    order: "ShipStationOrder", context: Optional["ImportContext"] = None
+) -> "Customer":
+    """
+    Get the customer for a Shipstation order, creating it along with its contact
+    and addresses if it doesn't exist yet.
+
+    Args:
+        order (ShipStationOrder): The Shipstation order.
+        context (ImportContext, optional): The import context of the sync run.
+
+    Returns:
+        Customer: The new or existing customer.
+    """
+
+    customer = get_or_create_customer(order, context)
+    if isinstance(customer, frappe._dict):
+        return frappe.get_doc("Customer", customer.name)
+    return customer
+
+
+def get_or_create_customer(
+    order: "ShipStationOrder", context: Optional["ImportContext"] = None
+):
+    """
+    Like `create_customer`, but an existing customer is only looked up by name,
+    without loading its document.
 
-    if frappe.db.exists("Customer", customer_name):
-        return frappe.get_doc("Customer", customer_name)
+    New customers are created in the same transaction as the order, so nothing is
+    committed here, and they're rolled back along with a failed order.
+
+    Args:
+        order (ShipStationOrder): The Shipstation order.
+        context (ImportContext, optional): The import context of the sync run.
+
+    Returns:
+        (Customer, frappe._dict): The new customer, or the name and primary
+            address of an existing customer.
+    """
+
+    customers = context.customers if context else CustomerResolver()
+    customer_name = get_customer_name(order) or frappe.generate_hash("", 10)
+
+    customer = customers.get_customer(customer_name)
+    if customer:
+        return customer
 
     cust = frappe.new_doc("Customer")
     cust.customer_name = customer_name
     cust.customer_type = "Individual"
-    cust.customer_group = "ShipStation"
-    cust.territory = "United States"
+    cust.customer_group = context.customer_group if context else DEFAULT_CUSTOMER_GROUP
+    cust.territory = context.territory if context else DEFAULT_TERRITORY
     cust.save()
-    frappe.db.commit()
+    customers.add_customer(cust)
 
     email_id, user_name = parse_addr(customer_name)
     phone_no = order.ship_to.phone if order.ship_to and order.ship_to.phone else None
     if email_id or phone_no:
-        customer_primary_contact = create_contact(order, email_id, phone_no)
+        customer_primary_contact = create_contact(order, email_id, phone_no, context)
         if customer_primary_contact:
+            # the contact links to the customer, so it can only be set once the
+            # customer exists
             cust.customer_primary_contact = customer_primary_contact.name
+            cust.save()
 
-    if order.ship_to.street1:
-        create_address(
-            order.ship_to, customer_name, order.customer_email, "Shipping"
-        ).name
-    if order.bill_to.street1:
+    if order.ship_to and order.ship_to.street1:
         create_address(
-            order.bill_to, order.customer_username, order.customer_email, "Billing"
-        ).name
+            order.ship_to, customer_name, order.customer_email, "Shipping", context
+        )
+    if order.bill_to and order.bill_to.street1:
+        bill_address = create_address(
+            order.bill_to,
+            order.customer_username,
+            order.customer_email,
+            "Billing",
+            context,
+        )
+        if order.customer_username and not bill_address.is_new():
+            customers.add_billing_address(order.customer_username, bill_address.name)
 
-    try:
-        cust.save()
-        return cust
-    except Exception as e:
-        frappe.log_error(title="Error saving Shipstation Customer", message=e)
+    return cust
 
 
-def create_contact(order: "ShipStationOrder", email_id: str=None, phone_no: str=None):
-    contact = frappe.get_value("Contact Email", {"email_id": email_id}, "parent")
+def create_contact(
+    order: "ShipStationOrder",
+    email_id: str = None,
+    phone_no: str = None,
+    context: Optional["ImportContext"] = None,
+):
+    if context:
+        contact = context.customers.get_contact(email_id)
+    else:
+        contact = frappe.get_value("Contact Email", {"email_id": email_id}, "parent")
     if contact:
         return frappe._dict({"name": contact})
     cont: "Contact" = frappe.new_doc("Contact")
@@ -195,23 +416,16 @@ def create_contact(order: "ShipStationOrder", email_id: str=None, phone_no: str=
         cont.append("links", {"link_doctype": "Customer", "link_name": email_id})
     try:
         cont.save()
-        frappe.db.commit()
+        if context and email_id:
+            context.customers.add_contact(email_id, cont.name)
         return cont
     except Exception as e:
         frappe.log_error(title="Error saving Shipstation Contact", message=e)
 
 
-def get_billing_address(customer_name: str):
-    billing_address = frappe.db.sql(
-        """
-            SELECT `tabAddress`.name
-            FROM `tabDynamic Link`, `tabAddress`
-            WHERE `tabDynamic Link`.link_doctype = 'Customer'
-            AND `tabDynamic Link`.link_name = %(customer_name)s
-            AND `tabAddress`.address_type = 'Billing'
-            LIMIT 1
-        """,
-        {"customer_name": customer_name},
-        as_dict=True,
-    )
-    return billing_address[0].get("name") if billing_address else None
+def get_billing_address(
+    customer_name: str, context: Optional["ImportContext"] = None
+) -> Optional[str]:
+    if context:
+        return context.customers.get_billing_address(customer_name)
+    return CustomerResolver().get_billing_address(customer_name)
@@ -0,0 +1,204 @@
+"""
+A local fake of the Shipstation API, for testing the webhook flow end-to-end
+without a Shipstation account.
+
+The fake serves batches of orders and shipments, and the webhook subscription
+endpoints. Point a site at it with the `shipstation_api_url` site config, and
+then send webhooks to the site the same way Shipstation would:
+
+	server = FakeShipStation(key="key", secret="secret")
+	server.start()
+	frappe.conf.shipstation_api_url = server.url
+
+	settings.register_webhooks()
+	resource_url = server.add_batch("ORDER_NOTIFY", store_id, [order_json, ...])
+	server.notify("ORDER_NOTIFY", resource_url)
+
+	server.stop()
+
+The server doesn't touch the database, and can also be run on its own with:
+
+	python -m shipstation_integration.fake_shipstation --port 8765
+"""
+
+import argparse
+import base64
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import httpx
+
+# the resource path, record key and batch parameter of each webhook event
+RESOURCES = {
+	"ORDER_NOTIFY": ("/orders", "orders", "importBatch"),
+	"SHIP_NOTIFY": ("/shipments", "shipments", "batchId"),
+}
+
+
+class FakeShipStation:
+	"""A fake Shipstation API server, run in a background thread."""
+
+	def __init__(
+		self,
+		host: str = "127.0.0.1",
+		port: int = 0,
+		key: Optional[str] = None,
+		secret: Optional[str] = None,
+	):
+		self.key = key
+		self.secret = secret
+		# the records of each batch, by the batch ID
+		self.batches: Dict[str, List[Dict]] = {}
+		# the subscribed webhooks, by the webhook ID
+		self.webhooks: Dict[int, Dict] = {}
+		# every request made to the server, as (method, path, query) tuples
+		self.requests: List[tuple] = []
+
+		self._ids = count(1)
+		self._server = ThreadingHTTPServer((host, port), self._get_handler())
+		self._thread: Optional[threading.Thread] = None
+
+	@property
+	def url(self) -> str:
+		host, port = self._server.server_address[:2]
+		return f"http://{host}:{port}"
+
+	def start(self) -> "FakeShipStation":
+		self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+		self._thread.start()
+		return self
+
+	def stop(self):
+		self._server.shutdown()
+		self._server.server_close()
+		if self._thread:
+			self._thread.join()
+
+	def add_batch(self, resource_type: str, store_id: str, records: List[Dict]) -> str:
+		"""
+		Add a batch of orders or shipments to the server.
+
+		Args:
+			resource_type (str): The webhook event, either `ORDER_NOTIFY` or `SHIP_NOTIFY`.
+			store_id (str): The Shipstation store ID of the records.
+			records (list of dict): The records, as returned by the Shipstation API.
+
+		Returns:
+			str: The resource URL of the batch, as sent in a webhook.
+		"""
+
+		path, _key, batch_parameter = RESOURCES[resource_type]
+		batch_id = str(next(self._ids))
+		self.batches[batch_id] = records
+		query = urlencode({"storeID": store_id, batch_parameter: batch_id})
+		return f"{self.url}{path}?{query}"
+
+	def notify(self, resource_type: str, resource_url: str) -> List[httpx.Response]:
+		"""Send a webhook to every target URL subscribed to the event."""
+
+		return [
+			httpx.post(
+				webhook["target_url"],
+				json={"resource_url": resource_url, "resource_type": resource_type},
+				timeout=60,
+			)
+			for webhook in self.webhooks.values()
+			if webhook["event"] == resource_type
+		]
+
+	def _get_handler(self):
+		fake = self
+
+		class Handler(BaseHTTPRequestHandler):
+			def log_message(self, format, *args):
+				pass
+
+			def do_GET(self):
+				url = urlsplit(self.path)
+				query = dict(parse_qsl(url.query))
+				fake.requests.append(("GET", url.path, query))
+				if not self.authorized():
+					return self.respond(401, {"message": "Unauthorized"})
+
+				for path, key, batch_parameter in RESOURCES.values():
+					if url.path == path:
+						records = fake.batches.get(query.get(batch_parameter), [])
+						return self.respond(200, paginate(records, key, query))
+
+				if url.path == "/webhooks":
+					return self.respond(200, {"webhooks": list(fake.webhooks.values())})
+
+				self.respond(404, {"message": "Not Found"})
+
+			def do_POST(self):
+				url = urlsplit(self.path)
+				length = int(self.headers.get("Content-Length") or 0)
+				body = json.loads(self.rfile.read(length) or b"{}")
+				fake.requests.append(("POST", url.path, body))
+				if not self.authorized():
+					return self.respond(401, {"message": "Unauthorized"})
+
+				if url.path == "/webhooks/subscribe":
+					webhook_id = next(fake._ids)
+					fake.webhooks[webhook_id] = {**body, "id": webhook_id}
+					return self.respond(201, {"id": webhook_id})
+
+				self.respond(404, {"message": "Not Found"})
+
+			def do_DELETE(self):
+				url = urlsplit(self.path)
+				fake.requests.append(("DELETE", url.path, None))
+				if not self.authorized():
+					return self.respond(401, {"message": "Unauthorized"})
+
+				webhook_id = url.path.rsplit("/", 1)[-1]
+				if url.path.startswith("/webhooks/") and webhook_id.isdigit():
+					if fake.webhooks.pop(int(webhook_id), None):
+						return self.respond(200, {})
+
+				self.respond(404, {"message": "Not Found"})
+
+			def authorized(self) -> bool:
+				if not (fake.key or fake.secret):
+					return True
+				credentials = f"{fake.key}:{fake.secret}".encode()
+				expected = "Basic " + base64.b64encode(credentials).decode()
+				return self.headers.get("Authorization") == expected
+
+			def respond(self, status: int, data: Dict):
+				body = json.dumps(data).encode()
+				self.send_response(status)
+				self.send_header("Content-Type", "application/json")
+				self.send_header("Content-Length", str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+		return Handler
+
+
+def paginate(records: List[Dict], key: str, query: Dict) -> Dict:
+	page = max(int(query.get("page") or 1), 1)
+	page_size = max(int(query.get("pageSize") or 100), 1)
+	pages = max((len(records) + page_size - 1) // page_size, 1)
+	start = (page - 1) * page_size
+	return {
+		key: records[start : start + page_size],
+		"total": len(records),
+		"page": page,
+		"pages": pages,
+	}
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Run a fake Shipstation API server")
+	parser.add_argument("--host", default="127.0.0.1")
+	parser.add_argument("--port", type=int, default=8765)
+	args = parser.parse_args()
+
+	server = FakeShipStation(args.host, args.port)
+	print(f"Fake Shipstation API running at {server.url}")
+	server._server.serve_forever()
@@ -1,19 +1,22 @@
-from typing import Union
+from typing import Dict, Iterable, Optional, Set, Union
 
 from shipstation.models import ShipStationItem, ShipStationOrderItem
 
 import frappe
+from frappe.model.document import Document
+
+from shipstation_integration.cache import (
+	PARSIMONY_INSTALLED_CACHE_EXPIRY,
+	PARSIMONY_INSTALLED_CACHE_KEY,
+	clear_cached_item_codes,
+)
 
 
 def get_item_alias(product: Union[ShipStationItem, ShipStationOrderItem]):
-	# ref: https://github.com/ParsimonyGit/parsimony/
-	# check if the Parsimony app is installed on the current site;
-	# `frappe.db.table_exists` returns a false positive if any other
-	# site on the bench has the Parsimony app installed instead
-	if "parsimony" not in frappe.get_installed_apps():
+	if not is_parsimony_installed():
 		return
 
-	sku = product.sku and product.sku.strip() or product.name and product.name[:140]
+	sku = get_alias_sku(product)
 	if not sku:
 		return
 
@@ -25,3 +28,90 @@ def get_item_alias(product: Union[ShipStationItem, ShipStationOrderItem]):
 
 	if item_aliases:
 		return item_aliases[0]
+
+
+class ItemAliasResolver:
+	"""
+	Resolve Item Aliases for many Shipstation products with as few queries as possible.
+
+	Load the SKUs of a whole page (or run) of products upfront with `load`; any
+	SKU that wasn't loaded beforehand is looked up when it's first requested.
+	"""
+
+	def __init__(self):
+		self.aliases: Dict[str, str] = {}
+		self.loaded_skus: Set[str] = set()
+
+	def load(self, products: Iterable[Union[ShipStationItem, ShipStationOrderItem]]):
+		"""Look up the aliases for all the given products' SKUs in a single query."""
+
+		if not is_parsimony_installed():
+			return
+
+		skus = {get_alias_sku(product) for product in products if product}
+		skus = {sku for sku in skus if sku and sku.casefold() not in self.loaded_skus}
+		if not skus:
+			return
+
+		item_aliases = frappe.get_all(
+			"Item Alias",
+			filters={"sku": ["in", list(skus)]},
+			fields=["sku", "parent"],
+		)
+
+		# match the single-SKU lookup, which picks the first alias found
+		for alias in item_aliases:
+			self.aliases.setdefault(alias.sku.casefold(), alias.parent)
+		self.loaded_skus.update(sku.casefold() for sku in skus)
+
+	def get(
+		self, product: Union[ShipStationItem, ShipStationOrderItem]
+	) -> Optional[str]:
+		"""Get the item code aliased to a product's SKU, if any."""
+
+		sku = get_alias_sku(product)
+		if not sku:
+			return
+
+		if sku.casefold() not in self.loaded_skus:
+			self.load([product])
+
+		return self.aliases.get(sku.casefold())
+
+
+def get_alias_sku(
+	product: Union[ShipStationItem, ShipStationOrderItem]
+) -> Optional[str]:
+	return product.sku and product.sku.strip() or product.name and product.name[:140]
+
+
+def is_parsimony_installed() -> bool:
+	# ref: https://github.com/ParsimonyGit/parsimony/
+	# check if the Parsimony app is installed on the current site;
+	# `frappe.db.table_exists` returns a false positive if any other
+	# site on the bench has the Parsimony app installed instead;
+	# the result is cached per site; installing or removing an app doesn't clear
+	# it by itself, so it's cleared along with the site's cache (for e.g. on
+	# `bench migrate` or `bench clear-cache`), and expires after an hour anyway
+	installed = frappe.cache().get_value(PARSIMONY_INSTALLED_CACHE_KEY)
+	if installed is None:
+		installed = "parsimony" in frappe.get_installed_apps()
+		frappe.cache().set_value(
+			PARSIMONY_INSTALLED_CACHE_KEY,
+			installed,
+			expires_in_sec=PARSIMONY_INSTALLED_CACHE_EXPIRY,
+		)
+	return installed
+
+
+def clear_shipstation_item_cache(doc: Document, method: str = None, *args, **kwargs):
+	# items saved while importing Shipstation products already match their cached SKUs
+	if method == "on_update" and doc.flags.from_shipstation_sync:
+		return
+
+	# only the SKUs cached for this item are cleared; `after_rename` is passed the
+	# old and new names after the method
+	item_codes = [doc.name]
+	if method == "after_rename" and args:
+		item_codes.append(args[0])
+	clear_cached_item_codes(item_codes)
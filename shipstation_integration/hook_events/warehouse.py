@@ -0,0 +1,9 @@
+from frappe.model.document import Document
+
+from shipstation_integration.cache import clear_warehouse_id_cache
+
+
+def clear_shipstation_warehouse_cache(
+	doc: Document, method: str = None, *args, **kwargs
+):
+	clear_warehouse_id_cache()
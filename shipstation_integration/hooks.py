@@ -67,6 +67,11 @@ doctype_js = {
 # after_install = "shipstation_integration.install.after_install"
 before_migrate = "shipstation_integration.setup.setup_custom_fields"
 
+# Cache
+# -----
+
+clear_cache = "shipstation_integration.cache.clear_parsimony_installed_cache"
+
 # Desk Notifications
 # ------------------
 # See frappe.core.notifications.get_notification_config
@@ -89,18 +94,26 @@ before_migrate = "shipstation_integration.setup.setup_custom_fields"
 # ---------------
 # Hook on document methods and events
 
-# doc_events = {
-# 	"*": {
-# 		"on_update": "method",
-# 		"on_cancel": "method",
-# 		"on_trash": "method"
-# 	}
-# }
+doc_events = {
+	"Item": {
+		"on_update": "shipstation_integration.hook_events.item.clear_shipstation_item_cache",
+		"after_rename": "shipstation_integration.hook_events.item.clear_shipstation_item_cache",
+		"on_trash": "shipstation_integration.hook_events.item.clear_shipstation_item_cache",
+	},
+	"Warehouse": {
+		"on_update": "shipstation_integration.hook_events.warehouse.clear_shipstation_warehouse_cache",
+		"after_rename": "shipstation_integration.hook_events.warehouse.clear_shipstation_warehouse_cache",
+		"on_trash": "shipstation_integration.hook_events.warehouse.clear_shipstation_warehouse_cache",
+	},
+}
 
 # Scheduled Tasks
 # ---------------
 
 scheduler_events = {
+	"hourly": [
+		"shipstation_integration.backfill.resume_backfills"
+	],
 	"hourly_long": [
 		"shipstation_integration.orders.list_orders",
 		"shipstation_integration.shipments.list_shipments"
@@ -5,10 +5,17 @@ from shipstation.models import ShipStationItem, ShipStationOrderItem
 import frappe
 from frappe.utils import flt
 
+from shipstation_integration.cache import (
+	get_cached_item_code,
+	remove_cached_item_code,
+	set_cached_item_code,
+)
 from shipstation_integration.hook_events.item import get_item_alias
+from shipstation_integration.pipeline import HookPipeline
 
 if TYPE_CHECKING:
 	from erpnext.stock.doctype.item.item import Item
+	from shipstation_integration.context import ImportContext
 	from shipstation_integration.shipstation_integration.doctype.shipstation_store.shipstation_store import (
 		ShipstationStore,
 	)
@@ -24,6 +31,7 @@ def create_item(
 	product: Union[ShipStationItem, ShipStationOrderItem],
 	settings: "ShipstationSettings",
 	store: Optional["ShipstationStore"] = None,
+	context: Optional["ImportContext"] = None,
 ) -> str:
 	"""
 	Create or update a Shipstation item, and setup item defaults.
@@ -31,27 +39,31 @@ def create_item(
 	:param product: The Shipstation item or order item document
 	:param settings: (optional) A Shipstation Settings instance
 	:param store: (optional) The selected Shipstation store, defaults to None
+	:param context: (optional) The import context of the sync run, defaults to None
 	:return: The item code of the created or updated Shipstation item
 	"""
 
-	item_code = get_item_alias(product)
-	item_name = (
-		frappe.db.get_value("Item", item_code, "item_name") or product.name[:140]
-	)
-
-	if not item_code:
-		if not product.sku:
-			item_code = frappe.db.get_value("Item", {"item_name": item_name.strip()})
-		else:
-			item_code = frappe.db.get_value("Item", {"item_code": product.sku.strip()})
-			item_name = (
-				frappe.db.get_value("Item", item_code, "item_name")
-				or product.name[:140]
-			)
+	sku = get_product_sku(product)
+	store_name = store.name if store else None
 
+	item: Optional["Item"] = None
+	item_code = get_cached_item_code(sku, store_name) if sku else None
 	if item_code:
-		item: "Item" = frappe.get_doc("Item", item_code)
-	else:
+		try:
+			item = frappe.get_doc("Item", item_code)
+		except frappe.DoesNotExistError:
+			remove_cached_item_code(sku, store_name)
+
+	if not item:
+		item_code = get_item_code(product, context)
+		if item_code:
+			item = frappe.get_doc("Item", item_code)
+
+	# only save existing items if the import changes them
+	original_item = None if not item else item.as_json()
+
+	if not item:
+		item_name = product.name[:140]
 		weight_per_unit = weight_uom = None
 		if isinstance(product, ShipStationItem):
 			weight_per_unit = getattr(product, "weight_oz", None)
@@ -113,9 +125,44 @@ def create_item(
 				],
 			)
 
-	before_save_hook = frappe.get_hooks("update_shipstation_item_before_save")
-	if before_save_hook:
-		item = frappe.get_attr(before_save_hook[0])(store, item)
+	if context:
+		item = context.hooks.apply("update_shipstation_item_before_save", store, item)
+	else:
+		item = HookPipeline().apply("update_shipstation_item_before_save", store, item)
+
+	if item.is_new() or item.as_json() != original_item:
+		item.flags.from_shipstation_sync = True
+		item.save()
+
+	if sku:
+		set_cached_item_code(sku, store_name, item.item_code)
 
-	item.save()
 	return item.item_code
+
+
+def get_product_sku(
+	product: Union[ShipStationItem, ShipStationOrderItem]
+) -> Optional[str]:
+	"""Get the SKU of a Shipstation product, or its name if it doesn't have a SKU."""
+
+	if product.sku and product.sku.strip():
+		return product.sku.strip()
+	return product.name and product.name[:140].strip()
+
+
+def get_item_code(
+	product: Union[ShipStationItem, ShipStationOrderItem],
+	context: Optional["ImportContext"] = None,
+) -> Optional[str]:
+	"""Find the existing item for a Shipstation product, if any."""
+
+	if context:
+		item_code = context.item_aliases.get(product)
+	else:
+		item_code = get_item_alias(product)
+	if item_code:
+		return item_code
+
+	if not product.sku:
+		return frappe.db.get_value("Item", {"item_name": product.name[:140].strip()})
+	return frappe.db.get_value("Item", {"item_code": product.sku.strip()})
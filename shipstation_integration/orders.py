@@ -1,18 +1,25 @@
 import datetime
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 from httpx import HTTPError
 
 import frappe
-from frappe.utils import flt, getdate
+from frappe.utils import cint, flt, get_datetime, getdate
 
+from shipstation_integration.api import FetchJob, fetch_concurrently
+from shipstation_integration.context import ImportContext
 from shipstation_integration.customer import (
-	create_customer,
 	get_billing_address,
+	get_or_create_customer,
 	update_amazon_order,
 	update_shopify_order,
 )
 from shipstation_integration.items import create_item
+from shipstation_integration.transaction import TransactionBatch
+from shipstation_integration.utils import chunked, get_shipstation_datetime
+
+# how long the job counters of an order run are kept, in seconds
+ORDER_RUN_EXPIRY = 7 * 24 * 60 * 60
 
 if TYPE_CHECKING:
 	from erpnext.selling.doctype.sales_order.sales_order import SalesOrder
@@ -32,15 +39,25 @@ def list_orders(
 	"""
 	Fetch Shipstation orders and create Sales Orders.
 
-	By default, only orders from enabled Shipstation Settings and from the last day onwards
-	will be fetched. Optionally, a list of Shipstation Settings instances and a custom
+	By default, only orders from enabled Shipstation Settings will be fetched, starting
+	from each store's last successful sync (or the last day, for a store that has never
+	been synced). Optionally, a list of Shipstation Settings instances and a custom
 	start date can be passed.
 
+	If a Shipstation account is set to create orders in background jobs, this only
+	validates the fetched orders and enqueues them for creation. The stores' sync
+	cursors are then moved once every job in the order run has finished, and only
+	if none of their orders failed.
+
 	Args:
 		settings (ShipstationSettings, optional): The Shipstation account to use for
 			fetching orders. Defaults to None.
 		last_order_datetime (datetime.datetime, optional): The start date for fetching orders.
 			Defaults to None.
+
+	Returns:
+		(str, None): The ID of the order run tracking the enqueued jobs, if any orders
+			were sent to background jobs.
 	"""
 
 	if not settings:
@@ -48,21 +65,13 @@ def list_orders(
 	elif not isinstance(settings, list):
 		settings = [settings]
 
-	for sss in settings:
-		sss_doc: "ShipstationSettings" = frappe.get_doc(
-			"Shipstation Settings", sss.name
-		)
-		if not sss_doc.enabled:
-			continue
+	settings_docs = [frappe.get_doc("Shipstation Settings", sss.name) for sss in settings]
+	context = ImportContext.build([doc for doc in settings_docs if doc.enabled])
 
+	jobs = []
+	sss_doc: "ShipstationSettings"
+	for sss_doc in context.settings.values():
 		client = sss_doc.client()
-		client.timeout = 60
-
-		if not last_order_datetime:
-			# Get data for the last day, Shipstation API behaves oddly when it's a shorter period
-			last_order_datetime = datetime.datetime.utcnow() - datetime.timedelta(
-				hours=24
-			)
 
 		store: "ShipstationStore"
 		for store in sss_doc.shipstation_stores:
@@ -71,62 +80,643 @@ def list_orders(
 
 			parameters = {
 				"store_id": store.store_id,
-				"modify_date_start": last_order_datetime,
-				"modify_date_end": datetime.datetime.utcnow(),
+				"modify_date_start": (
+					last_order_datetime or get_order_sync_start(sss_doc, store)
+				),
+				"modify_date_end": get_shipstation_datetime(),
 			}
 
-			update_parameter_hook = frappe.get_hooks(
-				"update_shipstation_list_order_parameters"
+			parameters = context.hooks.apply(
+				"update_shipstation_list_order_parameters", parameters
 			)
-			if update_parameter_hook:
-				parameters = frappe.get_attr(update_parameter_hook[0])(parameters)
 
-			try:
-				orders = client.list_orders(parameters=parameters)
-			except HTTPError as e:
-				frappe.log_error(
-					title="Error while fetching Shipstation orders", message=e
-				)
-				continue
+			jobs.append(FetchJob(sss_doc, store, client.list_orders, parameters))
+
+	# fetch all stores in parallel, and process each store as soon as it's available
+	run_id = None
+	try:
+		for result in fetch_concurrently(jobs):
+			sss_doc, store, _, parameters = result.job
 
-			order: "ShipStationOrder"
-			for order in orders:
+			failed_orders: List["ShipStationOrder"] = []
+			with TransactionBatch.for_settings(sss_doc) as batch:
 				try:
-					should_create_order = validate_order(sss_doc, order, store)
-				except Exception as e:
+					if sss_doc.enqueue_orders:
+						run_id = run_id or start_order_run()
+						dispatch_orders(
+							sss_doc, store, result.pages, run_id, context, failed_orders
+						)
+					else:
+						existing_order_ids = set()
+						for page in result.pages:
+							existing_order_ids |= get_existing_order_ids(
+								order.order_id for order in page if order
+							)
+							preload_orders(page, existing_order_ids, context)
+							for order in page:
+								process_order(
+									sss_doc,
+									order,
+									store,
+									existing_order_ids,
+									context,
+									batch,
+									failed_orders,
+								)
+				except HTTPError as e:
 					frappe.log_error(
-						title=f"Error while validating Shipstation order {order.order_id}",
-						message=e
+						title="Error while fetching Shipstation orders", message=e
 					)
 					continue
 
-				if should_create_order:
-					process_order_hook = frappe.get_hooks("process_shipstation_order")
-					if process_order_hook:
-						should_create_order = frappe.get_attr(process_order_hook[0])(
-							order, store
-						)
+				# only move the cursor once every page in the window has been processed,
+				# so that an interrupted run fetches the same window again; the cursor
+				# is committed along with the store's last batch of orders, or moved by
+				# the last job of the order run if the orders were enqueued
+				if sss_doc.enqueue_orders:
+					add_order_run_window(
+						run_id,
+						store,
+						parameters.get("modify_date_start"),
+						get_order_sync_end(parameters.get("modify_date_end"), failed_orders),
+					)
+				else:
+					update_order_sync_cursor(
+						store,
+						parameters.get("modify_date_start"),
+						parameters.get("modify_date_end"),
+						failed_orders,
+					)
+	finally:
+		# release the run's own job once every store has been dispatched, or if the
+		# run is interrupted, so that the jobs already enqueued can finish the run;
+		# stores that weren't fully dispatched have no window, and keep their cursor
+		if run_id:
+			finish_order_run_job(run_id, 0, 0)
 
-					if should_create_order:
-						try:
-							create_erpnext_order(order, store)
-						except frappe.LinkValidationError as e:
-							frappe.log_error(
-								title=f"Error while creating Shipstation order {order.order_id}",
-								message=e
-							)
+	return run_id
+
+
+def process_order(
+	settings: "ShipstationSettings",
+	order: "ShipStationOrder",
+	store: "ShipstationStore",
+	existing_order_ids: Optional[Set[str]] = None,
+	context: Optional[ImportContext] = None,
+	batch: Optional[TransactionBatch] = None,
+	failed_orders: Optional[List["ShipStationOrder"]] = None,
+):
+	context = context or ImportContext.for_settings(settings)
+	batch = batch or TransactionBatch()
+	if should_create_order(
+		settings, order, store, existing_order_ids, context, failed_orders
+	):
+		try:
+			with batch.savepoint(on_rollback=context.customers.checkpoint()):
+				if create_erpnext_order(order, store, context):
+					mark_order_as_processed(order, existing_order_ids)
+		except frappe.LinkValidationError as e:
+			frappe.log_error(
+				title=f"Error while creating Shipstation order {order.order_id}",
+				message=e
+			)
+			mark_order_as_failed(order, failed_orders)
+
+
+def should_create_order(
+	settings: "ShipstationSettings",
+	order: "ShipStationOrder",
+	store: "ShipstationStore",
+	existing_order_ids: Optional[Set[str]] = None,
+	context: Optional[ImportContext] = None,
+	failed_orders: Optional[List["ShipStationOrder"]] = None,
+) -> bool:
+	context = context or ImportContext.for_settings(settings)
+	try:
+		create_order = validate_order(
+			settings, order, store, existing_order_ids, context
+		)
+	except Exception as e:
+		frappe.log_error(
+			title=f"Error while validating Shipstation order {order.order_id}",
+			message=e
+		)
+		mark_order_as_failed(order, failed_orders)
+		return False
+
+	if create_order:
+		create_order = context.hooks.check("process_shipstation_order", order, store)
+
+	return bool(create_order)
+
+
+def dispatch_orders(
+	settings: "ShipstationSettings",
+	store: "ShipstationStore",
+	pages: Iterable[List["ShipStationOrder"]],
+	run_id: str,
+	context: Optional[ImportContext] = None,
+	failed_orders: Optional[List["ShipStationOrder"]] = None,
+):
+	"""
+	Validate a store's orders, and enqueue the valid ones in chunks for creation.
+
+	Args:
+		settings (ShipstationSettings): The Shipstation account of the store.
+		store (ShipstationStore): The Shipstation store the orders belong to.
+		pages (iterable of lists of ShipStationOrder): The fetched Shipstation orders,
+			one page at a time.
+		run_id (str): The ID of the order run to report job results to.
+		context (ImportContext, optional): The import context of the sync run.
+		failed_orders (list of ShipStationOrder, optional): Collects the orders that
+			failed validation.
+	"""
+
+	context = context or ImportContext.for_settings(settings)
+
+	def get_valid_orders():
+		existing_order_ids = set()
+		for page in pages:
+			existing_order_ids |= get_existing_order_ids(
+				order.order_id for order in page if order
+			)
+			preload_marketplace_orders(page, existing_order_ids, context)
+			for order in page:
+				if should_create_order(
+					settings, order, store, existing_order_ids, context, failed_orders
+				):
+					mark_order_as_processed(order, existing_order_ids)
+					yield order
+
+	# chunks are enqueued as soon as they fill up, so streamed pages aren't held
+	# in memory until the whole store has been fetched
+	for chunk in chunked(get_valid_orders(), cint(settings.order_job_size) or 1):
+		add_order_run_jobs(run_id, 1)
+		frappe.enqueue(
+			"shipstation_integration.orders.create_erpnext_orders",
+			queue=settings.order_queue or "long",
+			job_name=f"Shipstation orders for {store.store_name}",
+			settings=settings.name,
+			store=store.name,
+			orders=chunk,
+			run_id=run_id,
+		)
+
+
+def create_erpnext_orders(
+	settings: str,
+	store: str,
+	orders: List["ShipStationOrder"],
+	run_id: Optional[str] = None,
+) -> Dict[str, int]:
+	"""
+	Create Sales Orders for a chunk of Shipstation orders from a single store.
+
+	This runs as a background job enqueued by `list_orders`. Orders are committed in
+	batches, and a failed order is rolled back and logged without affecting the rest
+	of the chunk.
+
+	Args:
+		settings (str): The name of the Shipstation Settings of the store.
+		store (str): The row name of the Shipstation store the orders belong to.
+		orders (list of ShipStationOrder): The validated Shipstation orders.
+		run_id (str, optional): The ID of the order run to report results to.
+
+	Returns:
+		dict: The number of orders that succeeded and failed.
+	"""
+
+	sss_doc: "ShipstationSettings" = frappe.get_doc("Shipstation Settings", settings)
+	store_doc: "ShipstationStore" = sss_doc.get("shipstation_stores", {"name": store})[0]
+
+	# another job may have created some of these orders after they were enqueued
+	existing_order_ids = get_existing_order_ids(order.order_id for order in orders)
+	context = ImportContext.build([sss_doc])
+	preload_orders(orders, existing_order_ids, context)
+
+	succeeded = failed = 0
+	failed_orders: List["ShipStationOrder"] = []
+	with TransactionBatch.for_settings(sss_doc) as batch:
+		for order in orders:
+			if str(order.order_id) in existing_order_ids:
+				continue
+
+			try:
+				with batch.savepoint(on_rollback=context.customers.checkpoint()):
+					if create_erpnext_order(order, store_doc, context):
+						mark_order_as_processed(order, existing_order_ids)
+						succeeded += 1
+			except Exception:
+				frappe.log_error(
+					title=f"Error while creating Shipstation order {order.order_id}",
+					message=frappe.get_traceback(),
+				)
+				mark_order_as_failed(order, failed_orders)
+				failed += 1
+
+	if run_id:
+		finish_order_run_job(run_id, succeeded, failed, store_doc, failed_orders)
+
+	return {"succeeded": succeeded, "failed": failed}
+
+
+def start_order_run() -> str:
+	run_id = frappe.generate_hash(length=10)
+	key = get_order_run_key(run_id)
+	# the run holds a job of its own until every store has been dispatched, so that
+	# jobs finishing while others are still being enqueued don't finish the run
+	frappe.cache().hincrby(key, "pending_jobs", 1)
+	frappe.cache().expire(key, ORDER_RUN_EXPIRY)
+	return run_id
+
+
+def add_order_run_jobs(run_id: str, count: int):
+	key = get_order_run_key(run_id)
+	frappe.cache().hincrby(key, "pending_jobs", count)
+	frappe.cache().expire(key, ORDER_RUN_EXPIRY)
+
+
+def add_order_run_window(
+	run_id: str,
+	store: "ShipstationStore",
+	window_start: Optional[datetime.datetime],
+	window_end: Optional[datetime.datetime],
+):
+	key = get_order_run_windows_key(run_id)
+	frappe.cache().hset(key, store.name, (window_start, window_end))
+	frappe.cache().expire(frappe.cache().make_key(key), ORDER_RUN_EXPIRY)
+
+
+def add_order_run_failures(
+	run_id: str, store: "ShipstationStore", failed_orders: List["ShipStationOrder"]
+):
+	# only the modify dates are needed to hold back the store's cursor, and each job
+	# gets a field of its own, since the cache's hash commands can't append to a field
+	key = get_order_run_failures_key(run_id)
+	failures = [
+		frappe._dict(order_id=order.order_id, modify_date=order.modify_date)
+		for order in failed_orders
+	]
+	frappe.cache().hset(key, frappe.generate_hash(length=10), (store.name, failures))
+	frappe.cache().expire(frappe.cache().make_key(key), ORDER_RUN_EXPIRY)
+
+
+def finish_order_run_job(
+	run_id: str,
+	succeeded: int,
+	failed: int,
+	store: Optional["ShipstationStore"] = None,
+	failed_orders: Optional[List["ShipStationOrder"]] = None,
+):
+	# the failures are recorded before the job is released, so that they're seen by
+	# whichever job finishes the run
+	if store and failed_orders:
+		add_order_run_failures(run_id, store, failed_orders)
+
+	key = get_order_run_key(run_id)
+	frappe.cache().hincrby(key, "succeeded", succeeded)
+	frappe.cache().hincrby(key, "failed", failed)
+	if frappe.cache().hincrby(key, "pending_jobs", -1) == 0:
+		finish_order_run(run_id)
+
+
+def finish_order_run(run_id: str):
+	"""
+	Move the sync cursors of the stores in an order run, once all of its jobs have
+	finished. If any orders of a store failed, its cursor is only moved up to the
+	earliest of them, so that the next sync fetches them again.
+
+	Args:
+		run_id (str): The ID of the order run, as returned by `list_orders`.
+	"""
+
+	failures: Dict[str, List[frappe._dict]] = {}
+	failures_key = get_order_run_failures_key(run_id)
+	for store_name, failed_orders in frappe.cache().hgetall(failures_key).values():
+		failures.setdefault(store_name, []).extend(failed_orders)
+
+	windows_key = get_order_run_windows_key(run_id)
+	windows = frappe.cache().hgetall(windows_key)
+	for store_name, (window_start, window_end) in windows.items():
+		store_name = frappe.safe_decode(store_name)
+		store = frappe.db.get_value(
+			"Shipstation Store", store_name, ["name", "last_order_sync"], as_dict=True
+		)
+		if store:
+			update_order_sync_cursor(
+				store, window_start, window_end, failures.get(store_name)
+			)
+
+	frappe.cache().delete_value([failures_key, windows_key])
+
+
+def get_order_run_status(run_id: str) -> Dict[str, int]:
+	"""
+	Get the progress of the background jobs enqueued by an order run.
+
+	Args:
+		run_id (str): The ID of the order run, as returned by `list_orders`.
+
+	Returns:
+		dict: The number of pending jobs, and the number of orders that succeeded
+			and failed in finished jobs. Until every store has been dispatched, the
+			run itself counts as a pending job.
+	"""
+
+	fields = ("pending_jobs", "succeeded", "failed")
+	values = frappe.cache().hmget(get_order_run_key(run_id), fields)
+	return {
+		field: cint(value.decode() if value else 0)
+		for field, value in zip(fields, values)
+	}
+
+
+def get_order_run_key(run_id: str) -> str:
+	# the counters are updated atomically from multiple workers, so they're kept
+	# in a plain Redis hash, and only accessed through the raw Redis commands
+	# that aren't wrapped to pickle values
+	return frappe.cache().make_key(f"shipstation_order_run:{run_id}")
+
+
+def get_order_run_windows_key(run_id: str) -> str:
+	# the sync window of each store in the run, kept apart from the counters since
+	# they're pickled by the cache's hash commands
+	return f"shipstation_order_run_windows:{run_id}"
+
+
+def get_order_run_failures_key(run_id: str) -> str:
+	# the orders that failed in each job of the run, by store
+	return f"shipstation_order_run_failures:{run_id}"
+
+
+def get_existing_order_ids(order_ids: Iterable) -> Set[str]:
+	"""
+	Find which Shipstation orders already have a submitted Sales Order.
+
+	Args:
+		order_ids (Iterable): The Shipstation order IDs to check.
+
+	Returns:
+		set: The Shipstation order IDs (as strings) that already exist as Sales Orders.
+	"""
+
+	order_ids = list({str(order_id) for order_id in order_ids if order_id})
+	if not order_ids:
+		return set()
+
+	return set(
+		frappe.get_all(
+			"Sales Order",
+			filters={"shipstation_order_id": ["in", order_ids], "docstatus": 1},
+			pluck="shipstation_order_id",
+		)
+	)
+
+
+def preload_orders(
+	orders: List["ShipStationOrder"],
+	existing_order_ids: Set[str],
+	context: ImportContext,
+):
+	"""
+	Load the Item Aliases and customers for a page of new orders at once, instead
+	of looking them up separately for every order.
+	"""
+
+	new_orders = [
+		order
+		for order in orders
+		if order and str(order.order_id) not in existing_order_ids
+	]
+	context.item_aliases.load(
+		item
+		for order in new_orders
+		for item in (order.items if hasattr(order, "items") else None) or []
+	)
+	context.customers.load(new_orders)
+	preload_marketplace_orders(new_orders, existing_order_ids, context)
+
+
+def preload_marketplace_orders(
+	orders: List["ShipStationOrder"],
+	existing_order_ids: Set[str],
+	context: ImportContext,
+):
+	"""
+	Load the existing Sales Orders for a page of new Amazon and Shopify orders at
+	once, and pass them to the marketplace hooks, instead of the hooks looking them
+	up for every order.
+	"""
+
+	stores = {str(store.store_id): store for store in context.stores.values()}
+	context.marketplace_orders.load(
+		order
+		for order in orders
+		if order
+		and str(order.order_id) not in existing_order_ids
+		and get_marketplace_hook(
+			stores.get(str(order.advanced_options.store_id)), context
+		)
+	)
+
+
+def get_marketplace_hook(
+	store: Optional["ShipstationStore"], context: ImportContext
+) -> Optional[Tuple[str, Callable]]:
+	"""
+	Get the hook other apps use to process a marketplace store's orders, along with
+	the function that updates an existing Sales Order for an order.
+	"""
+
+	if not store:
+		return None
+
+	if store.get("is_amazon_store") and store.get("amazon_seller_setup"):
+		hook = ("process_shipstation_amazon_order", update_amazon_order)
+	elif store.get("is_shopify_store") and store.get("shopify_store"):
+		hook = ("process_shipstation_shopify_order", update_shopify_order)
+	else:
+		return None
+
+	return hook if context.hooks.has(hook[0]) else None
+
+
+class MarketplaceOrderResolver:
+	"""
+	The submitted Sales Orders of Amazon and Shopify orders, by their marketplace
+	order number and Shipstation order ID.
+
+	Call `load` with a page of orders to look them up in one query; orders that
+	weren't preloaded are looked up when first requested.
+
+	A Sales Order only matches an order if it's linked to the same Shipstation order,
+	or not linked to one yet (for e.g. if it was created by the marketplace's app),
+	so that another Shipstation order for the same marketplace order, like a split
+	order, never matches it.
+	"""
+
+	def __init__(self):
+		# Sales Order names, by marketplace order number and Shipstation order ID;
+		# the ID is empty for Sales Orders that aren't linked to Shipstation yet
+		self.sales_orders: Dict[Tuple[str, str], str] = {}
+		self.loaded_order_numbers: Set[str] = set()
+
+	def load(self, orders: Iterable["ShipStationOrder"]):
+		order_numbers = {
+			str(order.order_number)
+			for order in orders
+			if order
+			and order.order_number
+			and str(order.order_number) not in self.loaded_order_numbers
+		}
+		if not order_numbers:
+			return
+
+		for sales_order in frappe.get_all(
+			"Sales Order",
+			filters={"marketplace_order_id": ["in", list(order_numbers)], "docstatus": 1},
+			fields=["name", "marketplace_order_id", "shipstation_order_id"],
+			order_by="creation asc",
+		):
+			key = (sales_order.marketplace_order_id, sales_order.shipstation_order_id or "")
+			self.sales_orders.setdefault(key, sales_order.name)
+		self.loaded_order_numbers.update(order_numbers)
+
+	def get(self, order: "ShipStationOrder") -> Optional[str]:
+		"""Get the existing Sales Order for a Shipstation order's marketplace order."""
+
+		if not order.order_number:
+			return None
+
+		self.load([order])
+		order_number = str(order.order_number)
+		return self.sales_orders.get(
+			(order_number, str(order.order_id))
+		) or self.sales_orders.get((order_number, ""))
+
+
+def mark_order_as_processed(
+	order: "ShipStationOrder", existing_order_ids: Optional[Set[str]] = None
+):
+	# Shipstation can return the same order more than once in a sync window
+	# (for e.g. if it was modified while the pages were being fetched)
+	if existing_order_ids is not None:
+		existing_order_ids.add(str(order.order_id))
+
+
+def mark_order_as_failed(
+	order: "ShipStationOrder", failed_orders: Optional[List["ShipStationOrder"]] = None
+):
+	# the sync cursor is held back at failed orders, so the next sync retries them
+	if failed_orders is not None:
+		failed_orders.append(order)
+
+
+def get_order_sync_start(
+	settings: "ShipstationSettings", store: "ShipstationStore"
+) -> datetime.datetime:
+	"""
+	Get the start of the order sync window for a store.
+
+	If the store has been synced before, the window starts from the end of the last
+	successful sync, minus the overlap set in Shipstation Settings.
+
+	Args:
+		settings (ShipstationSettings): The Shipstation account of the store.
+		store (ShipstationStore): The Shipstation store being synced.
+
+	Returns:
+		datetime.datetime: The start date for fetching orders.
+	"""
+
+	if store.last_order_sync:
+		overlap = datetime.timedelta(minutes=cint(settings.order_sync_overlap))
+		return get_datetime(store.last_order_sync) - overlap
+
+	# Get data for the last day, Shipstation API behaves oddly when it's a shorter period
+	return get_shipstation_datetime() - datetime.timedelta(hours=24)
+
+
+def get_order_sync_end(
+	window_end: Optional[datetime.datetime],
+	failed_orders: Optional[List["ShipStationOrder"]] = None,
+) -> Optional[datetime.datetime]:
+	"""
+	Get how far a store's sync cursor can move for a sync window, which is up to the
+	earliest of the orders that failed in it, if any.
+	"""
+
+	for order in failed_orders or []:
+		# without a modify date, there's no telling how far the cursor can move
+		if not order.modify_date or not window_end:
+			return None
+		window_end = min(get_datetime(window_end), get_datetime(order.modify_date))
+
+	return window_end
+
+
+def update_order_sync_cursor(
+	store: "ShipstationStore",
+	window_start: Optional[datetime.datetime],
+	window_end: Optional[datetime.datetime],
+	failed_orders: Optional[List["ShipStationOrder"]] = None,
+):
+	"""
+	Move a store's order sync cursor to the end of a fully processed sync window.
+
+	If any orders in the window failed, the cursor is only moved up to the earliest
+	of them, so that the next sync fetches them again.
+
+	Args:
+		store (ShipstationStore): The Shipstation store that was synced.
+		window_start (datetime.datetime): The start of the sync window.
+		window_end (datetime.datetime): The end of the sync window.
+		failed_orders (list of ShipStationOrder, optional): The orders in the window
+			that failed to validate or to be created.
+	"""
+
+	window_end = get_order_sync_end(window_end, failed_orders)
+	if not window_end:
+		return
+
+	# a window that starts after the current cursor leaves a gap behind it,
+	# so don't advance past orders that were never fetched
+	last_sync = get_datetime(store.last_order_sync) if store.last_order_sync else None
+	if last_sync and (not window_start or get_datetime(window_start) > last_sync):
+		return
+
+	if last_sync and get_datetime(window_end) <= last_sync:
+		return
+
+	store.last_order_sync = window_end
+	frappe.db.set_value(
+		"Shipstation Store",
+		store.name,
+		"last_order_sync",
+		window_end,
+		update_modified=False,
+	)
 
 
 def validate_order(
 	settings: "ShipstationSettings",
 	order: "ShipStationOrder",
 	store: "ShipstationStore",
+	existing_order_ids: Optional[Set[str]] = None,
+	context: Optional[ImportContext] = None,
 ):
 	if not order:
 		return False
 
-	# if an order already exists, skip
-	if frappe.db.get_value(
+	context = context or ImportContext.for_settings(settings)
+
+	# if an order already exists, skip; callers processing a page of orders can
+	# pass in the existing order IDs for the whole page to avoid per-order queries;
+	# this also stops the Amazon and Shopify hooks below for known orders
+	if existing_order_ids is not None:
+		if str(order.order_id) in existing_order_ids:
+			return False
+	elif frappe.db.get_value(
 		"Sales Order", {"shipstation_order_id": order.order_id, "docstatus": 1}
 	):
 		return False
@@ -140,9 +730,10 @@ def validate_order(
 
 	# only create orders for warehouses defined in Shipstation Settings;
 	# if no warehouses are set, fetch everything
+	active_warehouse_ids = settings.active_warehouse_ids
 	if (
-		settings.active_warehouse_ids
-		and order.advanced_options.warehouse_id not in settings.active_warehouse_ids
+		active_warehouse_ids
+		and order.advanced_options.warehouse_id not in active_warehouse_ids
 	):
 		return False
 
@@ -152,22 +743,29 @@ def validate_order(
 
 	# allow other apps to run validations on Shipstation-Amazon or Shipstation-Shopify
 	# orders; if an order already exists, stop process flow
-	if store.get("is_amazon_store") and store.get("amazon_seller_setup"):
-		process_hook = frappe.get_hooks("process_shipstation_amazon_order")
-		if process_hook:
-			frappe.get_attr(process_hook[0])(store, order, update_amazon_order)
-			return False
-	elif store.get("is_shopify_store") and store.get("shopify_store"):
-		process_hook = frappe.get_hooks("process_shipstation_shopify_order")
-		if process_hook:
-			frappe.get_attr(process_hook[0])(store, order, update_shopify_order)
-			return False
+	marketplace_hook = get_marketplace_hook(store, context)
+	if marketplace_hook:
+		hook, update_order = marketplace_hook
+
+		# hooks that accept it get the order's existing Sales Order, if any, from
+		# the page's preloaded Sales Orders, instead of looking it up themselves
+		context.hooks.run(
+			hook,
+			store,
+			order,
+			update_order,
+			existing_sales_order=context.marketplace_orders.get(order),
+		)
+		mark_order_as_processed(order, existing_order_ids)
+		return False
 
 	return True
 
 
 def create_erpnext_order(
-	order: "ShipStationOrder", store: "ShipstationStore"
+	order: "ShipStationOrder",
+	store: "ShipstationStore",
+	context: Optional[ImportContext] = None,
 ) -> Optional[str]:
 	"""
 	Create a Sales Order from a Shipstation order.
@@ -175,12 +773,15 @@ def create_erpnext_order(
 	Args:
 		order (ShipStationOrder): The Shipstation order.
 		store (ShipstationStore): The Shipstation store to set order defaults.
+		context (ImportContext, optional): The import context of the sync run. If not
+			set, the context is loaded for this order.
 
 	Returns:
 		(str, None): The ID of the created Sales Order. If no items are found, returns None.
 	"""
 
-	customer = create_customer(order)
+	context = context or ImportContext.for_store(store)
+	customer = get_or_create_customer(order, context)
 	so: "SalesOrder" = frappe.new_doc("Sales Order")
 	so.update(
 		{
@@ -195,7 +796,7 @@ def create_erpnext_order(
 			"transaction_date": getdate(order.order_date),
 			"delivery_date": getdate(order.ship_date),
 			"shipping_address_name": customer.customer_primary_address,
-			"customer_primary_address": get_billing_address(customer.name),
+			"customer_primary_address": get_billing_address(customer.name, context),
 			"integration_doctype": "Shipstation Settings",
 			"integration_doc": store.parent,
 			"has_pii": True,
@@ -203,22 +804,16 @@ def create_erpnext_order(
 	)
 
 	if store.get("is_amazon_store"):
-		update_hook = frappe.get_hooks("update_shipstation_amazon_order")
-		if update_hook:
-			so = frappe.get_attr(update_hook[0])(store, order, so)
+		so = context.hooks.apply("update_shipstation_amazon_order", store, order, so)
 	elif store.get("is_shopify_store"):
-		update_hook = frappe.get_hooks("update_shipstation_shopify_order")
-		if update_hook:
-			so = frappe.get_attr(update_hook[0])(store, order, so)
+		so = context.hooks.apply("update_shipstation_shopify_order", store, order, so)
 
 	# using `hasattr` over `getattr` to use type annotations
 	order_items = order.items if hasattr(order, "items") else []
 	if not order_items:
 		return
 
-	process_order_items_hook = frappe.get_hooks("process_shipstation_order_items")
-	if process_order_items_hook:
-		order_items = frappe.get_attr(process_order_items_hook[0])(order_items)
+	order_items = context.hooks.apply("process_shipstation_order_items", order_items)
 
 	discount_amount = 0.0
 	for item in order_items:
@@ -233,15 +828,15 @@ def create_erpnext_order(
 			discount_amount += abs(rate * item.quantity)
 			continue
 
-		settings = frappe.get_doc("Shipstation Settings", store.parent)
-		item_code = create_item(item, settings=settings, store=store)
+		settings = context.settings[store.parent]
+		item_code = create_item(item, settings=settings, store=store, context=context)
 		item_notes = get_item_notes(item)
 		so.append(
 			"items",
 			{
 				"item_code": item_code,
 				"qty": item.quantity,
-				"uom": frappe.db.get_single_value("Stock Settings", "stock_uom"),
+				"uom": context.stock_uom,
 				"conversion_factor": 1,
 				"rate": rate,
 				"warehouse": store.warehouse,
@@ -285,13 +880,11 @@ def create_erpnext_order(
 
 	so.save()
 
-	before_submit_hook = frappe.get_hooks("update_shipstation_order_before_submit")
-	if before_submit_hook:
-		so = frappe.get_attr(before_submit_hook[0])(store, so)
+	if context.hooks.has("update_shipstation_order_before_submit"):
+		so = context.hooks.apply("update_shipstation_order_before_submit", store, so)
 		so.save()
 
 	so.submit()
-	frappe.db.commit()
 	return so.name
 
 
@@ -0,0 +1,95 @@
+import inspect
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, List
+
+import frappe
+
+# the hooks other apps can register to customise how Shipstation data is imported
+SHIPSTATION_HOOKS = (
+	"update_shipstation_list_order_parameters",
+	"process_shipstation_order",
+	"process_shipstation_amazon_order",
+	"process_shipstation_shopify_order",
+	"update_shipstation_amazon_order",
+	"update_shipstation_shopify_order",
+	"process_shipstation_order_items",
+	"update_shipstation_order_before_submit",
+	"update_shipstation_item_before_save",
+)
+
+
+class HookPipeline:
+	"""
+	The Shipstation import hooks from all installed apps, resolved once per sync run.
+
+	Every registered method for a hook is run, in the order the apps are installed.
+	"""
+
+	def __init__(self):
+		self.hooks: Dict[str, List[Callable]] = {
+			hook: [frappe.get_attr(method) for method in frappe.get_hooks(hook)]
+			for hook in SHIPSTATION_HOOKS
+		}
+
+	def has(self, hook: str) -> bool:
+		return bool(self.hooks.get(hook))
+
+	def apply(self, hook: str, *args):
+		"""
+		Pass a value through every method registered for a hook.
+
+		The value is the last argument; each method receives the value returned
+		by the previous one, and the final value is returned.
+		"""
+
+		*context, value = args
+		for method in self.hooks.get(hook, []):
+			value = method(*context, value)
+		return value
+
+	def check(self, hook: str, *args) -> bool:
+		"""
+		Check if every method registered for a hook allows the value to be processed.
+
+		Stops at the first method that returns a falsy value.
+		"""
+
+		return all(method(*args) for method in self.hooks.get(hook, []))
+
+	def run(self, hook: str, *args, **kwargs) -> bool:
+		"""
+		Run every method registered for a hook.
+
+		Keyword arguments are only passed to the methods that accept them, so they
+		can be added to a hook without breaking the methods written before them.
+
+		Returns True if any method was run.
+		"""
+
+		methods = self.hooks.get(hook, [])
+		for method in methods:
+			accepted = get_keyword_arguments(method)
+			method_kwargs = {
+				key: value
+				for key, value in kwargs.items()
+				if "**" in accepted or key in accepted
+			}
+			method(*args, **method_kwargs)
+		return bool(methods)
+
+
+@lru_cache(maxsize=None)
+def get_keyword_arguments(method: Callable) -> FrozenSet[str]:
+	"""Get the keyword arguments a method accepts, with `**` if it accepts any."""
+
+	try:
+		parameters = inspect.signature(method).parameters.values()
+	except (TypeError, ValueError):
+		return frozenset()
+
+	return frozenset(
+		"**" if parameter.kind == parameter.VAR_KEYWORD else parameter.name
+		for parameter in parameters
+		if parameter.kind
+		in (parameter.POSITIONAL_OR_KEYWORD, parameter.KEYWORD_ONLY, parameter.VAR_KEYWORD)
+	)
@@ -0,0 +1,145 @@
+import hashlib
+import time
+from typing import Callable, Optional
+
+import httpx
+
+import frappe
+from frappe.utils import cint, flt
+
+# Shipstation allows 40 requests per minute for each API key
+SHIPSTATION_RATE_LIMIT = 40
+SHIPSTATION_RATE_PERIOD = 60
+
+# the number of times a throttled request is retried before giving up
+MAX_RATE_LIMIT_RETRIES = 5
+
+# Take a token from the bucket, after refilling it for the time that has passed.
+# Returns the number of seconds to wait before a token is available; a wait of
+# zero means a token was taken. Numbers are returned as strings, since Redis
+# truncates Lua numbers to integers.
+TAKE_TOKEN_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated", "blocked_until")
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+local blocked_until = tonumber(bucket[3]) or 0
+
+if now < blocked_until then
+	return tostring(blocked_until - now)
+end
+
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+	tokens = tokens - 1
+else
+	wait = (1 - tokens) / rate
+end
+
+redis.call("HMSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now))
+redis.call("EXPIRE", KEYS[1], tonumber(ARGV[4]))
+return tostring(wait)
+"""
+
+
+class RateLimiter:
+	"""
+	A token bucket for the requests made with a Shipstation API key.
+
+	The bucket is kept in Redis, so it's shared by every worker and background job
+	using the same key. Requests wait for a token before they're sent, and the
+	bucket is corrected from the rate limit headers of every Shipstation response.
+
+	The limiter doesn't use the Frappe request context after it's created, so it
+	can be used from the fetch threads in `shipstation_integration.api`.
+	"""
+
+	def __init__(
+		self,
+		api_key: str,
+		limit: int = SHIPSTATION_RATE_LIMIT,
+		period: int = SHIPSTATION_RATE_PERIOD,
+	):
+		self.limit = limit
+		self.period = period
+		self.cache = frappe.cache()
+		# don't keep the API key itself in Redis
+		key_hash = hashlib.sha1(api_key.encode()).hexdigest()
+		self.key = self.cache.make_key(f"shipstation_rate_limit:{key_hash}")
+
+	def acquire(self):
+		"""Wait until a request can be sent."""
+
+		while True:
+			wait = flt(
+				self.cache.eval(
+					TAKE_TOKEN_SCRIPT,
+					1,
+					self.key,
+					self.limit,
+					self.limit / self.period,
+					time.time(),
+					self.period * 2,
+				)
+			)
+			if wait <= 0:
+				return
+			time.sleep(wait)
+
+	def update(self, response: Optional[httpx.Response]):
+		"""Sync the bucket with the rate limit headers of a Shipstation response."""
+
+		if response is None:
+			return
+
+		remaining = response.headers.get("X-Rate-Limit-Remaining")
+		reset = response.headers.get("X-Rate-Limit-Reset")
+		if remaining is None and response.status_code != 429:
+			return
+
+		now = time.time()
+		mapping = {"updated": now}
+		if remaining is not None:
+			mapping["tokens"] = max(cint(remaining), 0)
+
+		# hold every request until the window resets, once it's used up
+		if response.status_code == 429 or (remaining is not None and cint(remaining) <= 0):
+			mapping["tokens"] = 0
+			mapping["blocked_until"] = now + (cint(reset) or self.period)
+
+		self.cache.hmset(self.key, mapping)
+
+	def call(self, method: Callable, *args, **kwargs):
+		"""
+		Send a Shipstation request once the rate limit allows it.
+
+		Throttled requests wait for the rate limit window to reset and are retried,
+		instead of failing.
+
+		Args:
+			method (Callable): The function that sends the request, and returns an
+				`httpx.Response` or raises an `httpx.HTTPStatusError`.
+
+		Returns:
+			The result of the method.
+		"""
+
+		for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+			self.acquire()
+			try:
+				result = method(*args, **kwargs)
+			except httpx.HTTPStatusError as e:
+				self.update(e.response)
+				if e.response.status_code != 429 or attempt == MAX_RATE_LIMIT_RETRIES:
+					raise
+				continue
+
+			if isinstance(result, httpx.Response):
+				self.update(result)
+				if result.status_code == 429 and attempt < MAX_RATE_LIMIT_RETRIES:
+					continue
+			return result
@@ -0,0 +1,151 @@
+"""
+Record the Shipstation API traffic of a sync, and replay it later without any
+network access.
+
+Set `shipstation_record_path` in the site config to append every Shipstation
+response to a gzip-compressed JSON Lines file, and `shipstation_replay_path` to
+answer every request from such a file instead of the Shipstation API. Since the
+recordings go through the same client as a live sync, `list_orders`,
+`list_shipments` and `get_items` can be re-run on the exact same payloads, for
+e.g. to reproduce a broken sync or to compare the performance of two releases.
+
+Recordings hold the order and customer data returned by Shipstation, so keep
+them as safe as a database backup. Credentials are never recorded.
+"""
+
+import gzip
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+# the response headers kept in a recording
+RECORDED_HEADERS = (
+	"content-type",
+	"x-rate-limit-limit",
+	"x-rate-limit-remaining",
+	"x-rate-limit-reset",
+)
+
+# recordings can be written, and replayers created, from the fetch threads of a sync
+_lock = threading.Lock()
+
+# the replayers in this process, by the recording path; the clients of every
+# account share a replayer, so no response is replayed twice
+_replayers: Dict[str, "TrafficReplayer"] = {}
+
+
+class RecordingNotFound(httpx.TransportError):
+	"""A request being replayed isn't in the recording."""
+
+
+def get_request_key(request: httpx.Request) -> Tuple[str, str, Tuple]:
+	"""Get the method, path and sorted query parameters of a request."""
+
+	params = tuple(sorted(request.url.params.multi_items()))
+	return request.method, urlsplit(str(request.url)).path, params
+
+
+def get_replayer(path: str) -> "TrafficReplayer":
+	with _lock:
+		if path not in _replayers:
+			_replayers[path] = TrafficReplayer(path)
+		return _replayers[path]
+
+
+class TrafficRecorder:
+	"""Append Shipstation responses to a recording."""
+
+	def __init__(self, path: str):
+		self.path = path
+
+	def record(self, response: httpx.Response):
+		method, path, params = get_request_key(response.request)
+		entry = {
+			"method": method,
+			"path": path,
+			"params": [list(param) for param in params],
+			"status": response.status_code,
+			"headers": {
+				header: response.headers[header]
+				for header in RECORDED_HEADERS
+				if header in response.headers
+			},
+			"body": response.text,
+		}
+
+		line = json.dumps(entry) + "\n"
+		# every write adds a gzip member to the file, which are read back as one
+		with _lock, gzip.open(self.path, "at", encoding="utf-8") as recording:
+			recording.write(line)
+
+
+class TrafficReplayer:
+	"""
+	Answer Shipstation requests from a recording.
+
+	A request gets the first unused response recorded for the same method, path and
+	query parameters. If there isn't one, it gets the next unused response for the
+	same method and path, in the order they were recorded, since sync windows end
+	at the current time and so never have the same parameters twice.
+	"""
+
+	def __init__(self, path: str):
+		self.path = path
+		self.entries: List[Dict] = []
+		self.used: List[bool] = []
+		# the indexes of the recorded responses, by their full request key, and
+		# by their method and path
+		self.by_key: Dict[Tuple, List[int]] = {}
+		self.by_path: Dict[Tuple[str, str], List[int]] = {}
+		self.lock = threading.Lock()
+
+		with gzip.open(path, "rt", encoding="utf-8") as recording:
+			for line in recording:
+				if not line.strip():
+					continue
+
+				entry = json.loads(line)
+				# older recordings can hold throttled responses, which were retried
+				if entry["status"] == 429:
+					continue
+
+				index = len(self.entries)
+				key = (
+					entry["method"],
+					entry["path"],
+					tuple(tuple(param) for param in entry["params"]),
+				)
+				self.entries.append(entry)
+				self.used.append(False)
+				self.by_key.setdefault(key, []).append(index)
+				self.by_path.setdefault(key[:2], []).append(index)
+
+	def replay(self, request: httpx.Request) -> httpx.Response:
+		key = get_request_key(request)
+
+		with self.lock:
+			index = self.take(self.by_key.get(key))
+			if index is None:
+				index = self.take(self.by_path.get(key[:2]))
+
+		if index is None:
+			raise RecordingNotFound(
+				f"No recorded response for {request.method} {request.url}", request=request
+			)
+
+		entry = self.entries[index]
+		return httpx.Response(
+			entry["status"],
+			headers=entry["headers"],
+			content=entry["body"].encode("utf-8"),
+			request=request,
+		)
+
+	def take(self, indexes: Optional[List[int]]) -> Optional[int]:
+		for index in indexes or []:
+			if not self.used[index]:
+				self.used[index] = True
+				return index
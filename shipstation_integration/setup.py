@@ -3,6 +3,24 @@ from frappe import _
 from frappe.custom.doctype.custom_field.custom_field import create_custom_fields
 from frappe.custom.doctype.property_setter.property_setter import make_property_setter
 
+# indexes for the columns used to look up Shipstation records; most lookups
+# filter on a Shipstation ID along with the document status
+SHIPSTATION_INDEXES = {
+	"Sales Order": [["shipstation_order_id", "docstatus"], ["marketplace_order_id"]],
+	"Sales Order Item": [["shipstation_order_item_id"]],
+	"Sales Invoice": [
+		["shipstation_order_id", "docstatus"],
+		["shipstation_shipment_id", "docstatus"],
+	],
+	"Delivery Note": [
+		["shipstation_order_id", "docstatus"],
+		["shipstation_shipment_id", "docstatus"],
+	],
+	"Delivery Note Item": [["shipstation_order_item_id"]],
+	"Shipment": [["shipment_id", "docstatus"], ["shipstation_order_id", "docstatus"]],
+	"Warehouse": [["shipstation_warehouse_id"]],
+}
+
 
 def get_setup_stages(args=None):
 	return [
@@ -344,3 +362,48 @@ def setup_custom_fields(args=None):
 			),
 		):
 			make_property_setter(**property_setter)
+
+	setup_indexes()
+
+
+def setup_indexes():
+	"""
+	Create indexes on the Shipstation lookup columns.
+
+	Indexes are only created if they don't exist yet, so this can safely run on
+	every migration.
+	"""
+
+	print("Creating database indexes for Shipstation")
+	for doctype, indexes in SHIPSTATION_INDEXES.items():
+		for fields in indexes:
+			add_index(doctype, fields)
+
+
+def add_index(doctype: str, fields: list):
+	table = f"tab{doctype}"
+	index_name = "_".join(fields) + "_index"
+	if frappe.db.has_index(table, index_name):
+		return
+
+	if frappe.db.db_type == "mariadb":
+		# build the index online to avoid locking large tables for writes during a
+		# migration; if the server can't do that, skip the index instead of falling
+		# back to a blocking table copy, unless the site allows it
+		columns = ", ".join(f"`{field}`" for field in fields)
+		try:
+			frappe.db.sql_ddl(
+				f"""ALTER TABLE `{table}` ADD INDEX `{index_name}` ({columns}),
+					ALGORITHM=INPLACE, LOCK=NONE"""
+			)
+			return
+		except (frappe.db.InternalError, frappe.db.OperationalError) as e:
+			if not frappe.conf.get("shipstation_allow_blocking_index"):
+				print(
+					f"Skipped index {index_name} on {table}, since it can't be built "
+					f"without locking the table ({e}). Set `shipstation_allow_blocking_index` "
+					"in the site config to build it with a table lock instead."
+				)
+				return
+
+	frappe.db.add_index(doctype, fields, index_name)
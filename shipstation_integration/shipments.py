@@ -1,5 +1,5 @@
 import datetime
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set
 
 from httpx import HTTPError
 
@@ -14,11 +14,17 @@ from erpnext.selling.doctype.sales_order.sales_order import (
 )
 from erpnext.stock.doctype.delivery_note.delivery_note import make_shipment
 
+from shipstation_integration.api import FetchJob, fetch_concurrently
+from shipstation_integration.cache import get_cached_item_code
+from shipstation_integration.hook_events.item import ItemAliasResolver
+from shipstation_integration.transaction import TransactionBatch
+from shipstation_integration.utils import get_shipstation_datetime
+
 if TYPE_CHECKING:
 	from erpnext.accounts.doctype.sales_invoice.sales_invoice import SalesInvoice
 	from erpnext.stock.doctype.delivery_note.delivery_note import DeliveryNote
 	from erpnext.stock.doctype.shipment.shipment import Shipment
-	from shipstation.models import ShipStationOrder
+	from shipstation.models import ShipStationOrder, ShipStationOrderItem
 	from shipstation_integration.shipstation_integration.doctype.shipstation_store.shipstation_store import (
 		ShipstationStore,
 	)
@@ -47,6 +53,7 @@ def list_shipments(
 	elif not isinstance(settings, list):
 		settings = [settings]
 
+	jobs = []
 	for sss in settings:
 		sss_doc: "ShipstationSettings" = frappe.get_doc(
 			"Shipstation Settings", sss.name
@@ -55,11 +62,10 @@ def list_shipments(
 			continue
 
 		client = sss_doc.client()
-		client.timeout = 60
 
 		if not last_shipment_datetime:
 			# Get data for the last day, Shipstation API behaves oddly when it's a shorter period
-			last_shipment_datetime = datetime.datetime.utcnow() - datetime.timedelta(
+			last_shipment_datetime = get_shipstation_datetime() - datetime.timedelta(
 				hours=24
 			)
 
@@ -77,43 +83,186 @@ def list_shipments(
 			parameters = {
 				"store_id": store.store_id,
 				"create_date_start": last_shipment_datetime,
-				"create_date_end": datetime.datetime.utcnow(),
+				"create_date_end": get_shipstation_datetime(),
 				"include_shipment_items": True,
 			}
 
+			jobs.append(FetchJob(sss_doc, store, client.list_shipments, parameters))
+
+	# fetch all stores in parallel, and process each store as soon as it's available
+	for result in fetch_concurrently(jobs):
+		sss_doc, store, _, _ = result.job
+
+		with TransactionBatch.for_settings(sss_doc) as batch:
 			try:
-				shipments = client.list_shipments(parameters=parameters)
+				for page in result.pages:
+					process_shipments(sss_doc, store, page, batch)
 			except HTTPError as e:
 				frappe.log_error(
 					title="Error while fetching Shipstation shipment", message=e
 				)
+
+
+# the fields that link each document to a Shipstation order and shipment
+SHIPMENT_DOCUMENT_FIELDS = {
+	"Sales Order": ("shipstation_order_id", None),
+	"Sales Invoice": ("shipstation_order_id", "shipstation_shipment_id"),
+	"Delivery Note": ("shipstation_order_id", "shipstation_shipment_id"),
+	"Shipment": ("shipstation_order_id", "shipment_id"),
+}
+
+
+class ShipmentDocuments:
+	"""
+	The submitted ERPNext documents for a page of Shipstation shipments.
+
+	The Sales Orders, Sales Invoices, Delivery Notes and Shipments of all the
+	shipments are looked up with one query per document type, and mapped by their
+	Shipstation order ID and shipment ID. Documents created or cancelled while
+	processing the page are added to or removed from the maps.
+	"""
+
+	def __init__(self):
+		# document names by Shipstation order ID, for each document type
+		self.by_order: Dict[str, Dict[str, str]] = {
+			doctype: {} for doctype in SHIPMENT_DOCUMENT_FIELDS
+		}
+		# document names by Shipstation shipment ID, for each document type
+		self.by_shipment: Dict[str, Dict[str, str]] = {
+			doctype: {} for doctype in SHIPMENT_DOCUMENT_FIELDS
+		}
+		self.loaded_order_ids: Set[str] = set()
+		self.loaded_shipment_ids: Set[str] = set()
+
+	@classmethod
+	def for_shipments(
+		cls, shipments: Iterable[Optional["ShipStationOrder"]]
+	) -> "ShipmentDocuments":
+		documents = cls()
+		documents.load(shipments)
+		return documents
+
+	def load(self, shipments: Iterable[Optional["ShipStationOrder"]]):
+		shipments = [shipment for shipment in shipments if shipment]
+		order_ids = {
+			str(shipment.order_id) for shipment in shipments if shipment.order_id
+		} - self.loaded_order_ids
+		shipment_ids = {
+			str(shipment.shipment_id) for shipment in shipments if shipment.shipment_id
+		} - self.loaded_shipment_ids
+
+		if not (order_ids or shipment_ids):
+			return
+
+		self.loaded_order_ids |= order_ids
+		self.loaded_shipment_ids |= shipment_ids
+
+		for doctype, (order_field, shipment_field) in SHIPMENT_DOCUMENT_FIELDS.items():
+			or_filters = {}
+			if order_ids:
+				or_filters[order_field] = ("in", list(order_ids))
+			if shipment_field and shipment_ids:
+				or_filters[shipment_field] = ("in", list(shipment_ids))
+			if not or_filters:
 				continue
 
-			shipment: Optional["ShipStationOrder"]
-			for shipment in shipments:
-				# sometimes Shipstation will return `None` in the response
-				if not shipment:
-					continue
+			# documents are sorted by the latest first, same as `frappe.get_value`
+			for document in frappe.get_all(
+				doctype,
+				filters={"docstatus": 1},
+				or_filters=or_filters,
+				fields=["name", *or_filters],
+			):
+				self.add(
+					doctype,
+					document.name,
+					document.get(order_field),
+					document.get(shipment_field) if shipment_field else None,
+					overwrite=False,
+				)
+
+	def get(
+		self,
+		doctype: str,
+		order_id: Optional[str] = None,
+		shipment_id: Optional[str] = None,
+	) -> Optional[str]:
+		"""
+		Get a submitted document for a Shipstation shipment.
+
+		If both IDs are set, a document for the shipment is preferred over a
+		document for the order.
+		"""
+
+		if shipment_id and str(shipment_id) in self.by_shipment[doctype]:
+			return self.by_shipment[doctype][str(shipment_id)]
+		if order_id:
+			return self.by_order[doctype].get(str(order_id))
+
+	def add(
+		self,
+		doctype: str,
+		name: str,
+		order_id: Optional[str] = None,
+		shipment_id: Optional[str] = None,
+		overwrite: bool = True,
+	):
+		for ids, key in (
+			(self.by_order[doctype], order_id),
+			(self.by_shipment[doctype], shipment_id),
+		):
+			if key and (overwrite or str(key) not in ids):
+				ids[str(key)] = name
+
+	def remove(self, doctype: str, name: str):
+		for ids in (self.by_order[doctype], self.by_shipment[doctype]):
+			for key in [key for key, value in ids.items() if value == name]:
+				del ids[key]
+
+
+def process_shipments(
+	settings: "ShipstationSettings",
+	store: "ShipstationStore",
+	shipments: List[Optional["ShipStationOrder"]],
+	batch: Optional[TransactionBatch] = None,
+):
+	batch = batch or TransactionBatch()
+	documents = ShipmentDocuments.for_shipments(shipments)
+	voided_shipments: List["ShipStationOrder"] = []
+	new_shipments: List["ShipStationOrder"] = []
+
+	shipment: Optional["ShipStationOrder"]
+	for shipment in shipments:
+		# sometimes Shipstation will return `None` in the response
+		if not shipment:
+			continue
+
+		# if a date filter is set in Shipstation Settings, don't create orders before that date
+		if settings.since_date and getdate(shipment.create_date) < settings.since_date:
+			continue
 
-				# if a date filter is set in Shipstation Settings, don't create orders before that date
-				if (
-					sss_doc.since_date
-					and getdate(shipment.create_date) < sss_doc.since_date
-				):
-					continue
+		if shipment.voided:
+			if documents.get("Delivery Note", order_id=shipment.order_id):
+				voided_shipments.append(shipment)
+		else:
+			new_shipments.append(shipment)
 
-				if shipment.voided:
-					if frappe.db.exists(
-						"Delivery Note",
-						{"docstatus": 1, "shipstation_order_id": shipment.order_id},
-					):
-						cancel_voided_shipments(shipment)
-					continue
+	# voided shipments are cancelled together, before the rest of the page is
+	# created; a relabelled order's new shipment would otherwise be linked to the
+	# voided shipment's documents, and then cancelled along with them
+	if voided_shipments:
+		cancel_voided_shipments_in_bulk(voided_shipments, documents, batch)
 
-				create_erpnext_shipment(shipment, store)
+	for shipment in new_shipments:
+		with batch.savepoint():
+			create_erpnext_shipment(shipment, store, documents)
 
 
-def create_erpnext_shipment(shipment: "ShipStationOrder", store: "ShipstationStore"):
+def create_erpnext_shipment(
+	shipment: "ShipStationOrder",
+	store: "ShipstationStore",
+	documents: Optional[ShipmentDocuments] = None,
+):
 	"""
 	Create a Delivery Note using shipment data from Shipstation
 
@@ -122,57 +271,110 @@ def create_erpnext_shipment(shipment: "ShipStationOrder", store: "ShipstationSto
 
 	:param shipment: The shipment data.
 	:param store: The current active Shipstation store.
+	:param documents: The prefetched documents for the page of shipments, if any.
 	"""
 
+	documents = documents or ShipmentDocuments.for_shipments([shipment])
+
 	sales_invoice = None
 	if store.create_sales_invoice:
-		sales_invoice = create_sales_invoice(shipment, store)
+		sales_invoice = create_sales_invoice(shipment, store, documents)
 
 	delivery_note = None
 	if store.create_delivery_note:
-		delivery_note = create_delivery_note(shipment, sales_invoice)
+		delivery_note = create_delivery_note(shipment, sales_invoice, documents)
 
 	shipment_doc = None
 	if store.create_shipment:
-		shipment_doc = create_shipment(shipment, store, delivery_note)
+		shipment_doc = create_shipment(shipment, store, delivery_note, documents)
 
 	return shipment_doc
 
 
-def cancel_voided_shipments(shipment: "ShipStationOrder"):
-	existing_shipment = frappe.get_value(
-		"Shipment",
-		{"docstatus": 1, "shipment_id": shipment.shipment_id},
-	)
-	if existing_shipment:
-		frappe.get_doc("Shipment", existing_shipment).cancel()
+def cancel_voided_shipments(
+	shipment: "ShipStationOrder", documents: Optional[ShipmentDocuments] = None
+):
+	documents = documents or ShipmentDocuments.for_shipments([shipment])
 
-	existing_dn = frappe.get_value(
-		"Delivery Note",
-		{"docstatus": 1, "shipstation_shipment_id": shipment.shipment_id},
-	)
-	if existing_dn:
-		frappe.get_doc("Delivery Note", existing_dn).cancel()
+	for doctype in ("Shipment", "Delivery Note", "Sales Invoice"):
+		existing_doc = documents.get(doctype, shipment_id=shipment.shipment_id)
+		if existing_doc:
+			frappe.get_doc(doctype, existing_doc).cancel()
+			documents.remove(doctype, existing_doc)
 
-	existing_si = frappe.get_value(
-		"Sales Invoice",
-		{"docstatus": 1, "shipstation_shipment_id": shipment.shipment_id},
-	)
-	if existing_si:
-		frappe.get_doc("Sales Invoice", existing_si).cancel()
 
+def cancel_voided_shipments_in_bulk(
+	shipments: List["ShipStationOrder"],
+	documents: Optional[ShipmentDocuments] = None,
+	batch: Optional[TransactionBatch] = None,
+) -> Set[str]:
+	"""
+	Cancel the ERPNext documents of a page of voided Shipstation shipments.
+
+	The documents of every shipment are cancelled in dependency order, first all the
+	Shipments, then all the Delivery Notes and then all the Sales Invoices. Each
+	document is cancelled in its own savepoint; if a document fails to cancel, the
+	error is logged and the rest of that shipment's documents are left as they are.
+
+	Args:
+		shipments (list of ShipStationOrder): The voided Shipstation shipments.
+		documents (ShipmentDocuments, optional): The documents of the shipments.
+			Defaults to looking them up.
+		batch (TransactionBatch, optional): The batch to commit the cancellations
+			in. Defaults to committing after every document.
+
+	Returns:
+		set of str: The IDs of the shipments that couldn't be fully cancelled.
+	"""
+
+	documents = documents or ShipmentDocuments.for_shipments(shipments)
+	batch = batch or TransactionBatch()
+
+	# the documents to cancel for each shipment, resolved before any are cancelled
+	cancellations = [
+		(doctype, shipment, name)
+		for doctype in ("Shipment", "Delivery Note", "Sales Invoice")
+		for shipment in shipments
+		for name in [documents.get(doctype, shipment_id=shipment.shipment_id)]
+		if name
+	]
+
+	failed_shipment_ids: Set[str] = set()
+	for count, (doctype, shipment, name) in enumerate(cancellations, start=1):
+		shipment_id = str(shipment.shipment_id)
+		if shipment_id not in failed_shipment_ids:
+			try:
+				with batch.savepoint():
+					frappe.get_doc(doctype, name).cancel()
+				documents.remove(doctype, name)
+			except Exception:
+				failed_shipment_ids.add(shipment_id)
+				frappe.log_error(
+					title=f"Error while cancelling voided Shipstation shipment {shipment_id}",
+					message=frappe.get_traceback(),
+				)
+
+		frappe.publish_progress(
+			count * 100 / len(cancellations),
+			title="Cancelling voided Shipstation shipments",
+			description=f"{doctype} {name}",
+		)
+
+	return failed_shipment_ids
 
-def create_sales_invoice(shipment: "ShipStationOrder", store: "ShipstationStore"):
-	existing_si = frappe.get_value(
-		"Sales Invoice", {"docstatus": 1, "shipstation_order_id": shipment.order_id}
-	)
+
+def create_sales_invoice(
+	shipment: "ShipStationOrder",
+	store: "ShipstationStore",
+	documents: Optional[ShipmentDocuments] = None,
+):
+	documents = documents or ShipmentDocuments.for_shipments([shipment])
+	existing_si = documents.get("Sales Invoice", order_id=shipment.order_id)
 
 	if existing_si:
 		return frappe.get_doc("Sales Invoice", existing_si)
 
-	so_name = frappe.get_value(
-		"Sales Order", {"docstatus": 1, "shipstation_order_id": shipment.order_id}
-	)
+	so_name = documents.get("Sales Order", order_id=shipment.order_id)
 	if not so_name:
 		return
 
@@ -194,15 +396,19 @@ def create_sales_invoice(shipment: "ShipStationOrder", store: "ShipstationStore"
 
 	si.save()
 	si.submit()
+	documents.add(
+		"Sales Invoice", si.name, shipment.order_id, shipment.shipment_id
+	)
 	return si
 
 
 def create_delivery_note(
-	shipment: "ShipStationOrder", sales_invoice: Optional["SalesInvoice"] = None
+	shipment: "ShipStationOrder",
+	sales_invoice: Optional["SalesInvoice"] = None,
+	documents: Optional[ShipmentDocuments] = None,
 ):
-	existing_dn = frappe.get_value(
-		"Delivery Note", {"docstatus": 1, "shipstation_order_id": shipment.order_id}
-	)
+	documents = documents or ShipmentDocuments.for_shipments([shipment])
+	existing_dn = documents.get("Delivery Note", order_id=shipment.order_id)
 
 	if existing_dn:
 		return frappe.get_doc("Delivery Note", existing_dn)
@@ -210,9 +416,7 @@ def create_delivery_note(
 	if sales_invoice:
 		dn: "DeliveryNote" = make_delivery_from_invoice(sales_invoice.name)
 	else:
-		so_name = frappe.get_value(
-			"Sales Order", {"docstatus": 1, "shipstation_order_id": shipment.order_id}
-		)
+		so_name = documents.get("Sales Order", order_id=shipment.order_id)
 		if not so_name:
 			return
 		dn: "DeliveryNote" = make_delivery_from_order(so_name)
@@ -224,7 +428,9 @@ def create_delivery_note(
 
 	dn.save()
 	dn.submit()
-	frappe.db.commit()
+	documents.add(
+		"Delivery Note", dn.name, shipment.order_id, shipment.shipment_id
+	)
 	return dn
 
 
@@ -232,38 +438,28 @@ def create_shipment(
 	shipment: "ShipStationOrder",
 	store: "ShipstationStore",
 	delivery_note: Optional["DeliveryNote"] = None,
+	documents: Optional[ShipmentDocuments] = None,
 ):
-	existing_shipment = frappe.get_all(
-		"Shipment",
-		filters={"docstatus": 1},
-		or_filters={
-			"shipment_id": shipment.shipment_id,
-			"shipstation_order_id": shipment.order_id,
-		},
-		pluck="name",
+	documents = documents or ShipmentDocuments.for_shipments([shipment])
+	existing_shipment = documents.get(
+		"Shipment", order_id=shipment.order_id, shipment_id=shipment.shipment_id
 	)
 
 	if existing_shipment:
-		shipment_doc: "Shipment" = frappe.get_doc("Shipment", existing_shipment[0])
+		shipment_doc: "Shipment" = frappe.get_doc("Shipment", existing_shipment)
 		return shipment_doc
 
 	if delivery_note:
 		shipment_doc: "Shipment" = make_shipment(delivery_note.name)
 	else:
-		shipment_deliveries = frappe.get_all(
-			"Delivery Note",
-			filters={"docstatus": 1},
-			or_filters={
-				"shipstation_order_id": shipment.order_id,
-				"shipstation_shipment_id": shipment.shipment_id,
-			},
-			pluck="name",
+		shipment_delivery = documents.get(
+			"Delivery Note", order_id=shipment.order_id, shipment_id=shipment.shipment_id
 		)
 
-		if not shipment_deliveries:
+		if not shipment_delivery:
 			return
 
-		shipment_doc: "Shipment" = make_shipment(shipment_deliveries[0])
+		shipment_doc: "Shipment" = make_shipment(shipment_delivery)
 
 	shipment_doc.update(
 		{
@@ -283,11 +479,11 @@ def create_shipment(
 	)
 
 	if shipment.shipment_items:
+		stock_uoms = get_stock_uoms(shipment.shipment_items, store)
 		description = ""
-		for count, shipment_item in enumerate(shipment.shipment_items, 1):
-			stock_uom = frappe.get_value(
-				"Item", {"item_name": shipment_item.name}, "stock_uom"
-			)
+		for count, (shipment_item, stock_uom) in enumerate(
+			zip(shipment.shipment_items, stock_uoms), 1
+		):
 			description += f"{count}. {shipment_item.name} - {shipment_item.quantity} {stock_uom}\n"
 		shipment_doc.update({"description_of_content": description})
 
@@ -313,6 +509,110 @@ def create_shipment(
 
 	shipment_doc.save()
 	shipment_doc.submit()
-	frappe.db.commit()
+	documents.add(
+		"Shipment", shipment_doc.name, shipment.order_id, shipment.shipment_id
+	)
 
 	return shipment_doc
+
+
+def get_stock_uoms(
+	shipment_items: List["ShipStationOrderItem"],
+	store: Optional["ShipstationStore"] = None,
+) -> List[Optional[str]]:
+	"""
+	Get the stock UOM of each item in a Shipstation shipment.
+
+	Items are matched, in order of preference, by:
+		- their Shipstation order item ID, using the Sales Order Item;
+		- their SKU, using the cached item code, the Item Alias or the item code;
+		- their item name.
+
+	Each match is made with a single query for all the unmatched items.
+
+	Args:
+		shipment_items (list of ShipStationOrderItem): The shipment's items.
+		store (ShipstationStore, optional): The Shipstation store of the shipment.
+
+	Returns:
+		list of str: The stock UOM of each item, or None if the item isn't found.
+	"""
+
+	stock_uoms: List[Optional[str]] = [None] * len(shipment_items)
+
+	# match the Sales Order items created from the Shipstation order
+	order_item_ids = {
+		str(item.order_item_id)
+		for item in shipment_items
+		if getattr(item, "order_item_id", None)
+	}
+	if order_item_ids:
+		order_item_uoms = {
+			str(row.shipstation_order_item_id): row.stock_uom
+			for row in frappe.get_all(
+				"Sales Order Item",
+				filters={
+					"shipstation_order_item_id": ("in", list(order_item_ids)),
+					"docstatus": 1,
+				},
+				fields=["shipstation_order_item_id", "stock_uom"],
+			)
+		}
+		for index, item in enumerate(shipment_items):
+			if getattr(item, "order_item_id", None):
+				stock_uoms[index] = order_item_uoms.get(str(item.order_item_id))
+
+	# match items by SKU, the same way they're matched when importing orders
+	unmatched = [index for index, uom in enumerate(stock_uoms) if not uom]
+	store_name = store.name if store else None
+	item_aliases = ItemAliasResolver()
+	item_aliases.load(shipment_items[index] for index in unmatched)
+
+	item_codes = {}
+	for index in unmatched:
+		item = shipment_items[index]
+		sku = item.sku.strip() if item.sku and item.sku.strip() else None
+		if sku:
+			item_codes[index] = [
+				code
+				for code in (
+					get_cached_item_code(sku, store_name),
+					item_aliases.get(item),
+					sku,
+				)
+				if code
+			]
+
+	candidates = {code for codes in item_codes.values() for code in codes}
+	if candidates:
+		item_uoms = {
+			item.name.casefold(): item.stock_uom
+			for item in frappe.get_all(
+				"Item",
+				filters={"name": ("in", list(candidates))},
+				fields=["name", "stock_uom"],
+			)
+		}
+		for index, codes in item_codes.items():
+			matches = [code.casefold() for code in codes if code.casefold() in item_uoms]
+			stock_uoms[index] = item_uoms[matches[0]] if matches else None
+
+	# fall back to the item name for items without a SKU or a match
+	unmatched = [
+		index
+		for index, uom in enumerate(stock_uoms)
+		if not uom and shipment_items[index].name
+	]
+	if unmatched:
+		item_names = {shipment_items[index].name for index in unmatched}
+		name_uoms = {}
+		for item in frappe.get_all(
+			"Item",
+			filters={"item_name": ("in", list(item_names))},
+			fields=["item_name", "stock_uom"],
+		):
+			name_uoms.setdefault(item.item_name.casefold(), item.stock_uom)
+		for index in unmatched:
+			stock_uoms[index] = name_uoms.get(shipment_items[index].name.casefold())
+
+	return stock_uoms
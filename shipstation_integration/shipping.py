@@ -12,6 +12,7 @@ from frappe.contacts.doctype.address.address import Address
 from frappe.utils import get_datetime, get_link_to_form, today
 from frappe.utils.file_manager import save_file
 
+from shipstation_integration.carriers import get_carrier_index
 from shipstation_integration.shipments import (
 	cancel_voided_shipments,
 	create_erpnext_shipment,
@@ -31,11 +32,12 @@ if TYPE_CHECKING:
 def update_carriers_and_stores():  # scheduled daily
 	settings_list: List["ShipstationSettings"] = frappe.get_list("Shipstation Settings")
 	for settings in settings_list:
-		settings_doc: "ShipstationSettings" = frappe.get_cached_doc(
+		settings_doc: "ShipstationSettings" = frappe.get_doc(
 			"Shipstation Settings", settings.name
 		)
-		settings_doc.update_carriers_and_stores().save()
-		settings_doc.update_stores().save()
+		# this also updates the stores, and only saves the settings if
+		# anything has changed
+		settings_doc.update_carriers_and_stores()
 
 
 @frappe.whitelist()
@@ -80,7 +82,6 @@ def _create_shipping_label(doc: str, values: str, user: str = str()):
 		doc.ship_method_type = values.ship_method_type
 
 	client = settings.client()
-	client.timeout = 30
 
 	# build the shipstation label payload
 	if doc.shipstation_order_id:
@@ -211,10 +212,8 @@ def make_shipstation_order(doc: frappe._dict):
 @frappe.whitelist()
 def get_carrier_services(settings: str):
 	if settings:
-		shipstation_settings: "ShipstationSettings" = frappe.get_doc(
-			"Shipstation Settings", settings
-		)
-		return shipstation_settings._carrier_data()
+		# only the carrier, service and package names used by the label dialog
+		return get_carrier_index(settings)["carriers"]
 
 
 @frappe.whitelist()
@@ -254,7 +253,6 @@ def fetch_shipment(delivery_note: str):
 	for setting in settings:
 		sss_doc = frappe.get_doc("Shipstation Settings", setting)
 		client = sss_doc.client()
-		client.timeout = 60
 
 		parameters = {
 			"order_id": delivery_note.shipstation_order_id,
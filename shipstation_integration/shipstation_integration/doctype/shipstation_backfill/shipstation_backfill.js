@@ -0,0 +1,29 @@
+// Copyright (c) 2026 Parsimony, LLC and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on("Shipstation Backfill", {
+	refresh: frm => {
+		if (frm.is_new()) return;
+
+		if (["Queued", "Running"].includes(frm.doc.status)) {
+			frm.add_custom_button(__("Pause"), () => {
+				frm.call({
+					doc: frm.doc,
+					method: "pause"
+				}).done(() => { frm.reload_doc() })
+			});
+		}
+
+		if (frm.doc.status !== "Completed") {
+			const label = frm.doc.checkpoint ? __("Resume") : __("Start");
+			frm.add_custom_button(label, () => {
+				frappe.show_alert(__("Starting Backfill"));
+				frm.call({
+					doc: frm.doc,
+					method: "start",
+					freeze: true
+				}).done(() => { frm.reload_doc() })
+			});
+		}
+	}
+});
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, Parsimony LLC and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe import _
+from frappe.model.document import Document
+from frappe.utils import getdate
+
+from shipstation_integration.backfill import BACKFILL_JOBS, start_backfill
+
+
+class ShipstationBackfill(Document):
+	def validate(self):
+		if self.backfill_type not in BACKFILL_JOBS:
+			frappe.throw(_("Unsupported backfill type: {0}").format(self.backfill_type))
+
+		if self.from_date and self.to_date and getdate(self.from_date) > getdate(self.to_date):
+			frappe.throw(_("From Date cannot be after To Date"))
+
+	@frappe.whitelist()
+	def start(self):
+		start_backfill(self)
+
+	@frappe.whitelist()
+	def pause(self):
+		if self.status in ("Queued", "Running"):
+			self.db_set("status", "Paused")
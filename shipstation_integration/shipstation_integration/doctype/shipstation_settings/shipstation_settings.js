@@ -71,6 +71,24 @@ frappe.ui.form.on("Shipstation Settings", {
 		})
 	},
 
+	register_webhooks: frm => {
+		frappe.show_alert("Registering Webhooks");
+		frm.call({
+			doc: frm.doc,
+			method: "register_webhooks",
+			freeze: true
+		}).done(() => { frm.reload_doc() })
+	},
+
+	unregister_webhooks: frm => {
+		frappe.show_alert("Unregistering Webhooks");
+		frm.call({
+			doc: frm.doc,
+			method: "unregister_webhooks",
+			freeze: true
+		}).done(() => { frm.reload_doc() })
+	},
+
 	fetch_warehouses: frm => {
 		frm.call({
 			doc: frm.doc,
@@ -2,17 +2,30 @@
 # Copyright (c) 2020, Parsimony LLC and contributors
 # For license information, please see license.txt
 
+import hashlib
 import json
-from typing import List
+from typing import FrozenSet, List
 
 from httpx import HTTPError
-from shipstation import ShipStation
-
 import frappe
 from frappe import _
 from frappe.model.document import Document
+from frappe.utils import cint
 from frappe.utils.nestedset import get_root_of
 
+from shipstation_integration import webhooks
+from shipstation_integration.api import fetch_carriers, get_client
+from shipstation_integration.cache import (
+	clear_warehouse_id_cache,
+	get_cached_warehouse_ids,
+)
+from shipstation_integration.carriers import (
+	clear_carrier_index,
+	get_carrier_codes,
+	get_carrier_index,
+	set_carrier_index,
+)
+from shipstation_integration.context import ImportContext
 from shipstation_integration.items import create_item
 from shipstation_integration.orders import list_orders
 from shipstation_integration.shipments import list_shipments
@@ -21,20 +34,31 @@ from shipstation_integration.utils import get_marketplace
 
 class ShipstationSettings(Document):
 	@property
-	def store_ids(self):
+	def store_ids(self) -> List:
+		# parsed once per store data, since the store data is JSON-encoded twice
+		cached = getattr(self, "_store_ids", None)
+		if cached and cached[0] == self.store_data:
+			return cached[1]
+
 		stores = json.loads(self.store_data)
 		stores = [json.loads(s) for s in stores]
-		return [s.get('storeId') for s in stores]
+		store_ids = [s.get('storeId') for s in stores]
+		self._store_ids = (self.store_data, store_ids)
+		return store_ids
 
 	@property
-	def active_warehouse_ids(self) -> List[str]:
-		warehouse_ids = []
+	def active_warehouse_ids(self) -> FrozenSet:
+		warehouses = tuple(
+			warehouse.get("warehouse") for warehouse in self.shipstation_warehouses
+		)
 
-		for warehouse in self.shipstation_warehouses:
-			warehouse_id = frappe.db.get_value("Warehouse",
-				warehouse.get("warehouse"), "shipstation_warehouse_id")
-			warehouse_ids.append(warehouse_id)
+		# looked up once for each set of warehouses, instead of on every access
+		cached = getattr(self, "_active_warehouse_ids", None)
+		if cached and cached[0] == warehouses:
+			return cached[1]
 
+		warehouse_ids = get_cached_warehouse_ids(self.name, warehouses)
+		self._active_warehouse_ids = (warehouses, warehouse_ids)
 		return warehouse_ids
 
 	def onload(self):
@@ -45,6 +69,14 @@ class ShipstationSettings(Document):
 		self.validate_label_generation()
 		self.validate_enabled_stores()
 
+	def on_update(self):
+		set_carrier_index(self.name, self.carrier_data)
+		clear_warehouse_id_cache(self.name)
+
+	def on_trash(self):
+		clear_carrier_index(self.name)
+		clear_warehouse_id_cache(self.name)
+
 	def before_insert(self):
 		self.validate_api_connection()
 
@@ -60,13 +92,16 @@ class ShipstationSettings(Document):
 	def get_shipments(self):
 		list_shipments(self)
 
+	@frappe.whitelist()
+	def register_webhooks(self):
+		webhooks.register_webhooks(self)
+
+	@frappe.whitelist()
+	def unregister_webhooks(self):
+		webhooks.unregister_webhooks(self)
+
 	def client(self):
-		return ShipStation(
-			key=self.get_password('api_key'),
-			secret=self.get_password('api_secret'),
-			debug=False,
-			timeout=30
-		)
+		return get_client(self)
 
 	def validate_label_generation(self):
 		if not self.enabled and self.enable_label_generation:
@@ -92,23 +127,36 @@ class ShipstationSettings(Document):
 
 	@frappe.whitelist()
 	def update_carriers_and_stores(self):
-		client = self.client()
-
-		unstructured_carriers = []
-		carriers = client.list_carriers()
-		for carrier in carriers:
-			carrier_dict = carrier._unstructure()
-			services = client.list_services(carrier.code)
-			carrier_dict['services'] = [s._unstructure() for s in services]
-			packages = client.list_packages(carrier.code)
-			carrier_dict['packages'] = [p._unstructure() for p in packages]
-			unstructured_carriers.append(carrier_dict)
-
-		self.carrier_data = json.dumps(unstructured_carriers)
+		previous_hash = self.get_carriers_and_stores_hash()
+		# the form sends its unsaved edits along, which are saved either way
+		has_unsaved_changes = self.has_unsaved_changes()
+
+		carriers = fetch_carriers(self.client(), cint(self.max_concurrent_requests) or 1)
+		self.carrier_data = json.dumps(carriers)
 		self.update_stores()
-		self.save()
+
+		# otherwise, only save the settings if anything has changed in Shipstation
+		if has_unsaved_changes or self.get_carriers_and_stores_hash() != previous_hash:
+			self.save()
 		return self
 
+	def has_unsaved_changes(self) -> bool:
+		if self.is_new():
+			return True
+
+		saved = frappe.get_doc(self.doctype, self.name)
+		return get_document_hash(self) != get_document_hash(saved)
+
+	def get_carriers_and_stores_hash(self) -> str:
+		data = {
+			"carriers": json.loads(self.carrier_data) if self.carrier_data else [],
+			"stores": [
+				[store.store_id, store.store_name, store.marketplace_name]
+				for store in self.shipstation_stores
+			],
+		}
+		return get_data_hash(data)
+
 	@frappe.whitelist()
 	def update_warehouses(self):
 		self.shipstation_warehouses = []
@@ -192,31 +240,29 @@ class ShipstationSettings(Document):
 		if not products.results:
 			return "No products found to import"
 
+		products = list(products)
+		context = ImportContext.build([self])
+		context.item_aliases.load(products)
 		for product in products:
-			create_item(product, settings=self)
+			create_item(product, settings=self, context=context)
 
-		return f"{len(products.results)} product(s) imported succesfully"
+		return f"{len(products)} product(s) imported succesfully"
 
 	def _carrier_data(self):
 		return json.loads(self.carrier_data)
 
 	def get_carrier_services(self, carrier):
-		for ss_carrier in self._carrier_data():
-			if carrier in [ss_carrier['name'], ss_carrier['nickname']]:
-				return '\n'.join([s['name'] for s in ss_carrier['services']])
+		carrier_codes = get_carrier_index(self.name)["codes"].get(carrier)
+		if carrier_codes:
+			return '\n'.join(carrier_codes["services"])
 
 	def get_codes(self, carrier, service, package):
-		_carrier, _service, _package = None, None, 'Package'
-		for ss_carrier in self._carrier_data():
-			if carrier in [ss_carrier.get('name'), ss_carrier.get('nickname')]:
-				_carrier = ss_carrier['code']
+		return get_carrier_codes(self.name, carrier, service, package)
+
 
-				for serv in ss_carrier['services']:
-					if serv['name'] == service:
-						_service = serv['code']
+def get_document_hash(doc: Document) -> str:
+	return get_data_hash(doc.as_dict(no_default_fields=True))
 
-				for pack in ss_carrier['packages']:
-					if pack['name'] == package:
-						_package = pack['code']
 
-		return _carrier, _service, _package
+def get_data_hash(data) -> str:
+	return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
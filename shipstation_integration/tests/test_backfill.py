@@ -0,0 +1,177 @@
+import unittest
+from typing import Any, List, Optional
+from unittest.mock import patch
+
+import frappe
+from frappe.utils import add_to_date, cint, now_datetime
+
+from shipstation_integration.backfill import (
+	BACKFILL_JOBS,
+	STALE_BACKFILL_MINUTES,
+	BackfillBatch,
+	BackfillChanges,
+	BackfillJob,
+	resume_backfills,
+	run_backfill,
+	start_backfill,
+)
+from shipstation_integration.shipstation_integration.doctype.shipstation_settings.shipstation_settings import (
+	ShipstationSettings,
+)
+
+
+class NumberBackfill(BackfillJob):
+	"""A backfill of the numbers 1 to 7, which fetches each number times ten."""
+
+	numbers = list(range(1, 8))
+	# the units given to `apply`, the units that fail to fetch, and a unit that fails
+	# the batch it's in
+	applied: List[int] = []
+	failed_fetches: List[int] = []
+	failed_batch: Optional[int] = None
+
+	def get_batch(self, checkpoint: Optional[str], size: int) -> BackfillBatch:
+		units = [number for number in self.numbers if number > cint(checkpoint)][:size]
+		if not units:
+			return BackfillBatch([], None)
+		return BackfillBatch(units, str(units[-1]))
+
+	def fetch(self, client, unit: int) -> int:
+		if unit in self.failed_fetches:
+			raise ValueError(f"Failed to fetch {unit}")
+		return unit * 10
+
+	def apply(self, units: List[int], results: List[Any]) -> BackfillChanges:
+		if NumberBackfill.failed_batch in units:
+			NumberBackfill.failed_batch = None
+			raise ValueError("Failed to apply the batch")
+
+		NumberBackfill.applied.extend(units)
+		return BackfillChanges(
+			len([result for result in results if not isinstance(result, Exception)])
+		)
+
+
+class TestBackfill(unittest.TestCase):
+	def setUp(self):
+		# the backfill engine commits after every batch, and rolls back a failed
+		# batch, so both are held off to keep the test's records until the end
+		self.addCleanup(frappe.db.rollback)
+
+		NumberBackfill.applied = []
+		NumberBackfill.failed_fetches = []
+		NumberBackfill.failed_batch = None
+
+		patchers = [
+			patch.dict(BACKFILL_JOBS, {"Order Item IDs": NumberBackfill}),
+			patch.object(ShipstationSettings, "client"),
+			patch("frappe.db.commit"),
+			patch("frappe.db.rollback"),
+			patch("frappe.log_error"),
+		]
+		for patcher in patchers:
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+		with patch.object(ShipstationSettings, "before_insert"), patch.object(
+			ShipstationSettings, "after_insert"
+		):
+			self.settings = frappe.get_doc(
+				{
+					"doctype": "Shipstation Settings",
+					"name": f"_Test Backfill {frappe.generate_hash(length=6)}",
+					"api_key": "key",
+					"api_secret": "secret",
+					"default_item_group": "All Item Groups",
+				}
+			).insert()
+
+		self.backfill = frappe.get_doc(
+			{
+				"doctype": "Shipstation Backfill",
+				"backfill_type": "Order Item IDs",
+				"shipstation_settings": self.settings.name,
+				"batch_size": 3,
+				"max_workers": 2,
+			}
+		).insert()
+
+	def start(self):
+		with patch("frappe.enqueue") as enqueue:
+			start_backfill(self.backfill)
+		enqueue.assert_called_once()
+
+	def run_backfill(self):
+		run_backfill(self.backfill.name)
+		self.backfill.reload()
+
+	def test_new_backfill_is_not_started(self):
+		self.assertEqual(self.backfill.status, "Not Started")
+		self.assertFalse(self.backfill.last_checkpoint_at)
+
+		# a backfill only runs once it's started
+		self.run_backfill()
+		self.assertEqual(self.backfill.status, "Not Started")
+		self.assertEqual(NumberBackfill.applied, [])
+
+	def test_backfill_runs_to_completion(self):
+		NumberBackfill.failed_fetches = [5]
+		self.start()
+		self.run_backfill()
+
+		self.assertEqual(self.backfill.status, "Completed")
+		self.assertEqual(self.backfill.checkpoint, "7")
+		self.assertEqual(NumberBackfill.applied, NumberBackfill.numbers)
+		self.assertEqual(
+			(self.backfill.processed, self.backfill.updated, self.backfill.failed),
+			(7, 6, 1),
+		)
+
+	def test_failed_backfill_resumes_from_checkpoint(self):
+		NumberBackfill.failed_batch = 4
+		self.start()
+		with self.assertRaises(ValueError):
+			self.run_backfill()
+
+		self.backfill.reload()
+		self.assertEqual(self.backfill.status, "Failed")
+		self.assertEqual(self.backfill.checkpoint, "3")
+		self.assertIn("Failed to apply the batch", self.backfill.error)
+
+		# the batches before the failure aren't applied again
+		self.start()
+		self.run_backfill()
+		self.assertEqual(self.backfill.status, "Completed")
+		self.assertEqual(NumberBackfill.applied, NumberBackfill.numbers)
+		self.assertEqual(self.backfill.processed, 7)
+
+	def test_paused_backfill_stops(self):
+		self.start()
+		self.backfill.pause()
+		self.run_backfill()
+
+		self.assertEqual(self.backfill.status, "Paused")
+		self.assertEqual(NumberBackfill.applied, [])
+
+	def test_completed_backfill_cannot_start(self):
+		self.start()
+		self.run_backfill()
+		with self.assertRaises(frappe.ValidationError):
+			self.start()
+
+	def test_only_interrupted_backfills_are_resumed(self):
+		def get_resumed() -> List[str]:
+			with patch("frappe.enqueue") as enqueue:
+				resume_backfills()
+			return [call.kwargs["backfill"] for call in enqueue.call_args_list]
+
+		# a backfill that was never started isn't resumed
+		self.assertNotIn(self.backfill.name, get_resumed())
+
+		# neither is a running backfill that saved a checkpoint recently
+		self.backfill.db_set({"status": "Running", "last_checkpoint_at": now_datetime()})
+		self.assertNotIn(self.backfill.name, get_resumed())
+
+		stale_at = add_to_date(now_datetime(), minutes=-(STALE_BACKFILL_MINUTES + 1))
+		self.backfill.db_set("last_checkpoint_at", stale_at)
+		self.assertIn(self.backfill.name, get_resumed())
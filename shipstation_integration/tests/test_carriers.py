@@ -0,0 +1,92 @@
+import json
+import unittest
+
+import frappe
+
+from shipstation_integration.carriers import (
+	DEFAULT_PACKAGE_CODE,
+	build_carrier_index,
+	clear_carrier_index,
+	get_carrier_codes,
+	get_carrier_index,
+	set_carrier_index,
+)
+
+CARRIER_DATA = json.dumps(
+	[
+		{
+			"name": "UPS",
+			"nickname": "UPS Main",
+			"code": "ups",
+			"services": [{"name": "UPS Ground", "code": "ups_ground"}],
+			"packages": [{"name": "UPS Letter", "code": "ups_letter"}],
+		},
+		{
+			"name": "FedEx",
+			"nickname": None,
+			"code": "fedex",
+			"services": [{"name": "FedEx Ground", "code": "fedex_ground"}],
+			"packages": [],
+		},
+		{
+			# a second account for the same carrier
+			"name": "UPS",
+			"nickname": "UPS Backup",
+			"code": "ups_walleted",
+			"services": [{"name": "UPS 2nd Day Air", "code": "ups_2nd_day_air"}],
+			"packages": None,
+		},
+	]
+)
+
+
+class TestCarrierIndex(unittest.TestCase):
+	def setUp(self):
+		self.settings = f"_Test Carriers {frappe.generate_hash(length=6)}"
+		self.addCleanup(clear_carrier_index, self.settings)
+		set_carrier_index(self.settings, CARRIER_DATA)
+
+	def test_empty_carrier_data(self):
+		self.assertEqual(build_carrier_index(None), {"carriers": [], "codes": {}})
+		self.assertEqual(build_carrier_index("[]"), {"carriers": [], "codes": {}})
+
+	def test_carriers_keep_shipstation_order(self):
+		carriers = build_carrier_index(CARRIER_DATA)["carriers"]
+		self.assertEqual(
+			[(carrier["name"], carrier["nickname"]) for carrier in carriers],
+			[("UPS", "UPS Main"), ("FedEx", None), ("UPS", "UPS Backup")],
+		)
+		self.assertEqual(carriers[0]["services"], [{"name": "UPS Ground"}])
+		self.assertEqual(carriers[2]["packages"], [])
+
+	def test_codes_by_name_and_nickname(self):
+		self.assertEqual(
+			get_carrier_codes(self.settings, "UPS Main", "UPS Ground", "UPS Letter"),
+			("ups", "ups_ground", "ups_letter"),
+		)
+		self.assertEqual(
+			get_carrier_codes(self.settings, "FedEx", "FedEx Ground", "Box"),
+			("fedex", "fedex_ground", DEFAULT_PACKAGE_CODE),
+		)
+
+	def test_later_carrier_takes_precedence(self):
+		# the services and packages of both accounts are kept for the shared name
+		self.assertEqual(
+			get_carrier_codes(self.settings, "UPS", "UPS Ground", "UPS Letter"),
+			("ups_walleted", "ups_ground", "ups_letter"),
+		)
+		self.assertEqual(
+			get_carrier_codes(self.settings, "UPS", "UPS 2nd Day Air", "UPS Letter")[1],
+			"ups_2nd_day_air",
+		)
+
+	def test_unknown_carrier(self):
+		self.assertEqual(
+			get_carrier_codes(self.settings, "DHL", "DHL Express", "Box"),
+			(None, None, DEFAULT_PACKAGE_CODE),
+		)
+
+	def test_index_is_rebuilt_once_cleared(self):
+		clear_carrier_index(self.settings)
+		# the settings don't exist, so the index is rebuilt without any carriers
+		self.assertEqual(get_carrier_index(self.settings), {"carriers": [], "codes": {}})
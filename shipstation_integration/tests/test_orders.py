@@ -0,0 +1,155 @@
+import datetime
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from shipstation_integration.orders import (
+	add_order_run_jobs,
+	add_order_run_window,
+	finish_order_run_job,
+	get_order_run_status,
+	get_order_sync_end,
+	start_order_run,
+	update_order_sync_cursor,
+)
+
+WINDOW_START = datetime.datetime(2026, 10, 1, 9, 0)
+WINDOW_END = datetime.datetime(2026, 10, 1, 10, 0)
+
+
+class TestOrderSyncCursor(unittest.TestCase):
+	def setUp(self):
+		patcher = patch("frappe.db.set_value")
+		self.set_value = patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def get_store(self, last_order_sync=WINDOW_START):
+		return frappe._dict(name="_Test Store", last_order_sync=last_order_sync)
+
+	def get_order(self, modify_date):
+		return frappe._dict(order_id=frappe.generate_hash(length=6), modify_date=modify_date)
+
+	def test_cursor_moves_to_window_end(self):
+		store = self.get_store()
+		update_order_sync_cursor(store, WINDOW_START, WINDOW_END)
+
+		self.assertEqual(store.last_order_sync, WINDOW_END)
+		self.set_value.assert_called_once_with(
+			"Shipstation Store",
+			store.name,
+			"last_order_sync",
+			WINDOW_END,
+			update_modified=False,
+		)
+
+	def test_first_sync_moves_cursor(self):
+		store = self.get_store(last_order_sync=None)
+		update_order_sync_cursor(store, WINDOW_START, WINDOW_END)
+		self.assertEqual(store.last_order_sync, WINDOW_END)
+
+	def test_window_after_cursor_leaves_cursor(self):
+		# the orders between the cursor and the window's start were never fetched
+		store = self.get_store()
+		update_order_sync_cursor(
+			store, WINDOW_START + datetime.timedelta(minutes=5), WINDOW_END
+		)
+
+		self.assertEqual(store.last_order_sync, WINDOW_START)
+		self.set_value.assert_not_called()
+
+	def test_cursor_never_moves_back(self):
+		store = self.get_store(last_order_sync=WINDOW_END)
+		update_order_sync_cursor(store, WINDOW_START, WINDOW_START)
+
+		self.assertEqual(store.last_order_sync, WINDOW_END)
+		self.set_value.assert_not_called()
+
+	def test_failed_orders_hold_cursor(self):
+		earliest = WINDOW_START + datetime.timedelta(minutes=10)
+		failed_orders = [
+			self.get_order(earliest + datetime.timedelta(minutes=20)),
+			self.get_order(earliest),
+		]
+
+		store = self.get_store()
+		update_order_sync_cursor(store, WINDOW_START, WINDOW_END, failed_orders)
+		self.assertEqual(store.last_order_sync, earliest)
+
+	def test_failed_order_without_modify_date_leaves_cursor(self):
+		store = self.get_store()
+		update_order_sync_cursor(
+			store, WINDOW_START, WINDOW_END, [self.get_order(None)]
+		)
+
+		self.assertEqual(store.last_order_sync, WINDOW_START)
+		self.set_value.assert_not_called()
+
+	def test_sync_end_without_failures(self):
+		self.assertEqual(get_order_sync_end(WINDOW_END), WINDOW_END)
+		self.assertEqual(get_order_sync_end(WINDOW_END, []), WINDOW_END)
+
+
+class TestOrderRun(unittest.TestCase):
+	def setUp(self):
+		self.stores = {
+			name: frappe._dict(name=name, last_order_sync=WINDOW_START)
+			for name in ("_Test Store 1", "_Test Store 2")
+		}
+
+		patchers = [
+			patch(
+				"frappe.db.get_value",
+				side_effect=lambda _doctype, name, *args, **kwargs: self.stores.get(name),
+			),
+			patch("frappe.db.set_value"),
+		]
+		for patcher in patchers:
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+	def start_run(self, jobs: int) -> str:
+		run_id = start_order_run()
+		add_order_run_jobs(run_id, jobs)
+		for store in self.stores.values():
+			add_order_run_window(run_id, store, WINDOW_START, WINDOW_END)
+		return run_id
+
+	def test_cursors_move_once_every_job_finishes(self):
+		run_id = self.start_run(jobs=2)
+		finish_order_run_job(run_id, 0, 0)
+		finish_order_run_job(run_id, 5, 0)
+		for store in self.stores.values():
+			self.assertEqual(store.last_order_sync, WINDOW_START)
+
+		finish_order_run_job(run_id, 3, 0)
+		self.assertEqual(
+			get_order_run_status(run_id), {"pending_jobs": 0, "succeeded": 8, "failed": 0}
+		)
+		for store in self.stores.values():
+			self.assertEqual(store.last_order_sync, WINDOW_END)
+
+	def test_failed_orders_only_hold_their_store(self):
+		failed_store, other_store = self.stores.values()
+		failed_at = WINDOW_START + datetime.timedelta(minutes=10)
+
+		run_id = self.start_run(jobs=2)
+		finish_order_run_job(run_id, 0, 0)
+		finish_order_run_job(
+			run_id, 1, 1, failed_store, [frappe._dict(order_id=1, modify_date=failed_at)]
+		)
+		finish_order_run_job(run_id, 2, 0, other_store, [])
+
+		self.assertEqual(get_order_run_status(run_id)["failed"], 1)
+		self.assertEqual(failed_store.last_order_sync, failed_at)
+		self.assertEqual(other_store.last_order_sync, WINDOW_END)
+
+	def test_interrupted_store_keeps_cursor(self):
+		# the run is released without a window for a store that wasn't dispatched
+		run_id = start_order_run()
+		store = self.stores["_Test Store 1"]
+		add_order_run_window(run_id, store, WINDOW_START, WINDOW_END)
+		finish_order_run_job(run_id, 0, 0)
+
+		self.assertEqual(store.last_order_sync, WINDOW_END)
+		self.assertEqual(self.stores["_Test Store 2"].last_order_sync, WINDOW_START)
@@ -0,0 +1,79 @@
+import unittest
+from unittest.mock import patch
+
+from shipstation_integration.pipeline import HookPipeline
+
+
+class TestHookPipeline(unittest.TestCase):
+	def setUp(self):
+		with patch("frappe.get_hooks", return_value=[]):
+			self.pipeline = HookPipeline()
+
+	def test_unregistered_hook(self):
+		self.assertFalse(self.pipeline.has("process_shipstation_order"))
+		self.assertEqual(self.pipeline.apply("update_shipstation_amazon_order", 1, "so"), "so")
+		self.assertTrue(self.pipeline.check("process_shipstation_order", "order"))
+		self.assertFalse(self.pipeline.run("process_shipstation_amazon_order", "order"))
+
+	def test_apply_chains_values(self):
+		self.pipeline.hooks["update_shipstation_amazon_order"] = [
+			lambda store, order, so: so + [f"{store}:{order}:first"],
+			lambda store, order, so: so + ["second"],
+		]
+
+		self.assertTrue(self.pipeline.has("update_shipstation_amazon_order"))
+		self.assertEqual(
+			self.pipeline.apply("update_shipstation_amazon_order", "store", "order", []),
+			["store:order:first", "second"],
+		)
+
+	def test_check_stops_at_first_rejection(self):
+		calls = []
+
+		def reject(order):
+			calls.append("reject")
+			return False
+
+		def allow(order):
+			calls.append("allow")
+			return True
+
+		self.pipeline.hooks["process_shipstation_order"] = [allow, reject, allow]
+		self.assertFalse(self.pipeline.check("process_shipstation_order", "order"))
+		self.assertEqual(calls, ["allow", "reject"])
+
+	def test_run_only_passes_accepted_keyword_arguments(self):
+		calls = []
+
+		def legacy_hook(store, order, update):
+			calls.append(("legacy", store, order, update))
+
+		def new_hook(store, order, update, existing_sales_order=None):
+			calls.append(("new", existing_sales_order))
+
+		def catch_all_hook(*args, **kwargs):
+			calls.append(("catch_all", kwargs))
+
+		self.pipeline.hooks["process_shipstation_amazon_order"] = [
+			legacy_hook,
+			new_hook,
+			catch_all_hook,
+		]
+
+		self.assertTrue(
+			self.pipeline.run(
+				"process_shipstation_amazon_order",
+				"store",
+				"order",
+				"update",
+				existing_sales_order="SO-0001",
+			)
+		)
+		self.assertEqual(
+			calls,
+			[
+				("legacy", "store", "order", "update"),
+				("new", "SO-0001"),
+				("catch_all", {"existing_sales_order": "SO-0001"}),
+			],
+		)
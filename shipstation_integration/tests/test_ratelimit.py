@@ -0,0 +1,85 @@
+import unittest
+from unittest.mock import patch
+
+import frappe
+import httpx
+
+from shipstation_integration.ratelimit import MAX_RATE_LIMIT_RETRIES, RateLimiter
+
+
+class Waited(Exception):
+	"""Raised instead of sleeping, to stop the limiter at its first wait."""
+
+
+def get_response(status: int = 200, **headers) -> httpx.Response:
+	return httpx.Response(
+		status,
+		headers=headers,
+		request=httpx.Request("GET", "https://ssapi.shipstation.com/orders"),
+	)
+
+
+class TestRateLimiter(unittest.TestCase):
+	def setUp(self):
+		self.limiter = RateLimiter(frappe.generate_hash(), limit=2, period=60)
+		self.addCleanup(frappe.cache().delete, self.limiter.key)
+
+		patcher = patch(
+			"shipstation_integration.ratelimit.time.sleep", side_effect=Waited
+		)
+		self.sleep = patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def get_wait(self) -> float:
+		with self.assertRaises(Waited):
+			self.limiter.acquire()
+		return self.sleep.call_args.args[0]
+
+	def test_bucket_starts_full(self):
+		self.limiter.acquire()
+		self.limiter.acquire()
+		self.sleep.assert_not_called()
+
+		# the bucket refills at 2 tokens a minute, so a token takes up to 30 seconds
+		self.assertTrue(0 < self.get_wait() <= 30)
+
+	def test_bucket_is_shared_by_api_key(self):
+		other_limiter = RateLimiter("other", limit=2, period=60)
+		self.addCleanup(frappe.cache().delete, other_limiter.key)
+		other_limiter.acquire()
+		other_limiter.acquire()
+
+		same_limiter = RateLimiter("other", limit=2, period=60)
+		with self.assertRaises(Waited):
+			same_limiter.acquire()
+
+		# a different API key has a bucket of its own
+		self.limiter.acquire()
+
+	def test_remaining_header_corrects_bucket(self):
+		self.limiter.update(get_response(**{"X-Rate-Limit-Remaining": "1"}))
+		self.limiter.acquire()
+		self.assertTrue(self.get_wait() > 0)
+
+	def test_throttled_response_blocks_until_reset(self):
+		self.limiter.update(get_response(429, **{"X-Rate-Limit-Reset": "45"}))
+		self.assertTrue(30 < self.get_wait() <= 45)
+
+	def test_throttled_requests_are_retried(self):
+		responses = [get_response(429), get_response(429), get_response(200)]
+		with patch.object(self.limiter, "acquire"), patch.object(self.limiter, "update"):
+			result = self.limiter.call(lambda: responses.pop(0))
+		self.assertEqual(result.status_code, 200)
+
+	def test_retries_give_up(self):
+		def throttled():
+			response = get_response(429)
+			raise httpx.HTTPStatusError(
+				"Too Many Requests", request=response.request, response=response
+			)
+
+		with patch.object(self.limiter, "acquire") as acquire, patch.object(
+			self.limiter, "update"
+		), self.assertRaises(httpx.HTTPStatusError):
+			self.limiter.call(throttled)
+		self.assertEqual(acquire.call_count, MAX_RATE_LIMIT_RETRIES + 1)
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+
+import httpx
+
+from shipstation_integration.recording import (
+	RecordingNotFound,
+	TrafficRecorder,
+	TrafficReplayer,
+)
+
+API_URL = "https://ssapi.shipstation.com"
+
+
+def get_response(path: str, body: str, status: int = 200, **params) -> httpx.Response:
+	request = httpx.Request("GET", f"{API_URL}{path}", params=params)
+	return httpx.Response(
+		status,
+		headers={"Content-Type": "application/json", "X-Rate-Limit-Remaining": "39"},
+		text=body,
+		request=request,
+	)
+
+
+class TestTrafficRecording(unittest.TestCase):
+	def setUp(self):
+		handle, self.path = tempfile.mkstemp(suffix=".jsonl.gz")
+		os.close(handle)
+		os.remove(self.path)
+		self.addCleanup(lambda: os.path.exists(self.path) and os.remove(self.path))
+
+		recorder = TrafficRecorder(self.path)
+		recorder.record(get_response("/orders", '{"page": 1}', page=1, storeId=101))
+		recorder.record(get_response("/orders", '{"page": 2}', page=2, storeId=101))
+		recorder.record(get_response("/orders", "throttled", status=429, page=3))
+		recorder.record(get_response("/orders", '{"page": 3}', page=3, storeId=101))
+
+	def replay(self, replayer: TrafficReplayer, path: str, **params) -> httpx.Response:
+		return replayer.replay(httpx.Request("GET", f"{API_URL}{path}", params=params))
+
+	def test_replays_matching_request(self):
+		replayer = TrafficReplayer(self.path)
+
+		# the query parameters are matched in any order
+		response = self.replay(replayer, "/orders", storeId=101, page=2)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.text, '{"page": 2}')
+		self.assertEqual(response.headers["x-rate-limit-remaining"], "39")
+
+	def test_responses_are_only_replayed_once(self):
+		replayer = TrafficReplayer(self.path)
+		self.assertEqual(
+			self.replay(replayer, "/orders", page=1, storeId=101).text, '{"page": 1}'
+		)
+
+		# with no unused response for the same parameters, the next one for the
+		# same path is replayed
+		self.assertEqual(
+			self.replay(replayer, "/orders", page=1, storeId=101).text, '{"page": 2}'
+		)
+
+	def test_throttled_responses_are_skipped(self):
+		replayer = TrafficReplayer(self.path)
+		self.assertEqual(len(replayer.entries), 3)
+		self.assertEqual(self.replay(replayer, "/orders", page=3).text, '{"page": 1}')
+
+	def test_missing_request(self):
+		replayer = TrafficReplayer(self.path)
+		with self.assertRaises(RecordingNotFound):
+			self.replay(replayer, "/shipments", page=1)
+
+		for page in range(3):
+			self.replay(replayer, "/orders", page=page + 1, storeId=101)
+		with self.assertRaises(RecordingNotFound):
+			self.replay(replayer, "/orders", page=1, storeId=101)
@@ -0,0 +1,84 @@
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from shipstation_integration.shipments import get_stock_uoms
+
+SALES_ORDER_ITEMS = [frappe._dict(shipstation_order_item_id="1001", stock_uom="Box")]
+ITEMS = [
+	frappe._dict(name="CACHED-ITEM", item_name="Cached Item", stock_uom="Pair"),
+	frappe._dict(name="ALIASED-ITEM", item_name="Aliased Item", stock_uom="Set"),
+	frappe._dict(name="SKU-1", item_name="SKU Item", stock_uom="Nos"),
+	frappe._dict(name="NAMED-ITEM", item_name="Named Item", stock_uom="Kg"),
+]
+
+
+def get_all(doctype, filters=None, fields=None, **kwargs):
+	if doctype == "Sales Order Item":
+		ids = filters["shipstation_order_item_id"][1]
+		return [row for row in SALES_ORDER_ITEMS if row.shipstation_order_item_id in ids]
+
+	if "item_name" in filters:
+		names = {name.casefold() for name in filters["item_name"][1]}
+		return [item for item in ITEMS if item.item_name.casefold() in names]
+
+	codes = {code.casefold() for code in filters["name"][1]}
+	return [item for item in ITEMS if item.name.casefold() in codes]
+
+
+class FakeItemAliasResolver:
+	aliases = {"ALIAS-SKU": "ALIASED-ITEM", "SKU-1": "ALIASED-ITEM"}
+
+	def load(self, products):
+		list(products)
+
+	def get(self, product):
+		return self.aliases.get(product.sku)
+
+
+class TestGetStockUOMs(unittest.TestCase):
+	def setUp(self):
+		patchers = [
+			patch("frappe.get_all", side_effect=get_all),
+			patch(
+				"shipstation_integration.shipments.ItemAliasResolver", FakeItemAliasResolver
+			),
+			patch(
+				"shipstation_integration.shipments.get_cached_item_code",
+				side_effect=lambda sku, store=None: {
+					"CACHED-SKU": "CACHED-ITEM",
+					"SKU-1": "CACHED-ITEM",
+				}.get(sku),
+			),
+		]
+		for patcher in patchers:
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+	def get_item(self, sku=None, name=None, order_item_id=None):
+		return frappe._dict(sku=sku, name=name, order_item_id=order_item_id)
+
+	def test_order_item_id_is_matched_first(self):
+		items = [self.get_item(sku="SKU-1", order_item_id=1001)]
+		self.assertEqual(get_stock_uoms(items), ["Box"])
+
+	def test_sku_matches_in_order_of_preference(self):
+		items = [
+			# the cached item code wins over the alias and the SKU
+			self.get_item(sku="SKU-1"),
+			# the alias wins over the SKU
+			self.get_item(sku="ALIAS-SKU"),
+			# the SKU is matched to the item code, case-insensitively
+			self.get_item(sku=" sku-1 ", order_item_id=9999),
+		]
+		self.assertEqual(get_stock_uoms(items), ["Pair", "Set", "Nos"])
+
+	def test_item_name_is_matched_last(self):
+		items = [
+			self.get_item(sku="MISSING-SKU", name="named item"),
+			self.get_item(name="Named Item"),
+			self.get_item(sku="MISSING-SKU", name="Missing Item"),
+			self.get_item(),
+		]
+		self.assertEqual(get_stock_uoms(items), ["Kg", "Kg", None, None])
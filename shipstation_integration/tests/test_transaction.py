@@ -0,0 +1,49 @@
+import sys
+import unittest
+
+import frappe
+
+from shipstation_integration.context import ImportContext
+from shipstation_integration.customer import create_customer
+from shipstation_integration.transaction import TransactionBatch
+
+
+class TestTransactionBatch(unittest.TestCase):
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def get_order(self, order_id: int):
+		return frappe._dict(
+			order_id=order_id,
+			customer_email=f"{frappe.generate_hash(length=10)}@example.com",
+			customer_id=None,
+			customer_username=None,
+			ship_to=None,
+			bill_to=frappe._dict(name="Test Customer"),
+		)
+
+	def test_rolled_back_customer_is_created_again(self):
+		context = ImportContext.build([])
+		batch = TransactionBatch(batch_size=sys.maxsize)
+		order = self.get_order(1)
+
+		# the first order from the customer fails after its customer is created
+		with self.assertRaises(frappe.ValidationError):
+			with batch.savepoint(on_rollback=context.customers.checkpoint()):
+				failed_customer = create_customer(order, context)
+				frappe.throw("Order failed")
+
+		self.assertFalse(frappe.db.exists("Customer", failed_customer.name))
+		self.assertIsNone(context.customers.get_customer(order.customer_email))
+
+		# the next order from the same customer creates the customer again
+		next_order = self.get_order(2)
+		next_order.customer_email = order.customer_email
+		with batch.savepoint(on_rollback=context.customers.checkpoint()):
+			customer = create_customer(next_order, context)
+
+		self.assertTrue(frappe.db.exists("Customer", customer.name))
+		self.assertTrue(frappe.db.exists("Contact Email", {"email_id": order.customer_email}))
+		self.assertEqual(
+			context.customers.get_customer(order.customer_email).name, customer.name
+		)
@@ -0,0 +1,155 @@
+import unittest
+from unittest.mock import patch
+from urllib.parse import parse_qsl, urlsplit
+
+import frappe
+
+from shipstation_integration.benchmarks.generator import PayloadGenerator
+from shipstation_integration.fake_shipstation import FakeShipStation
+from shipstation_integration.shipstation_integration.doctype.shipstation_settings.shipstation_settings import (
+	ShipstationSettings,
+)
+from shipstation_integration.webhooks import process_webhook, receive
+
+
+class TestWebhooks(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls.server = FakeShipStation(key="key", secret="secret").start()
+		cls.api_url = frappe.conf.get("shipstation_api_url")
+		frappe.conf.shipstation_api_url = cls.server.url
+
+	@classmethod
+	def tearDownClass(cls):
+		frappe.conf.shipstation_api_url = cls.api_url
+		cls.server.stop()
+
+	def setUp(self):
+		# the fake server has no carriers or warehouses to load for new settings
+		with patch.object(ShipstationSettings, "before_insert"), patch.object(
+			ShipstationSettings, "after_insert"
+		):
+			self.settings: ShipstationSettings = frappe.get_doc(
+				{
+					"doctype": "Shipstation Settings",
+					"name": f"_Test Webhooks {frappe.generate_hash(length=6)}",
+					"enabled": 1,
+					"api_key": "key",
+					"api_secret": "secret",
+					"default_item_group": "All Item Groups",
+					"shipstation_stores": [
+						{
+							"store_id": 101,
+							"store_name": "_Test Webhook Store",
+							"enable_orders": 1,
+							"enable_shipments": 1,
+							"create_delivery_note": 1,
+						}
+					],
+				}
+			).insert()
+		self.settings.register_webhooks()
+		self.store = self.settings.shipstation_stores[0]
+		self.generator = PayloadGenerator(self.settings)
+
+	def tearDown(self):
+		frappe.set_user("Administrator")
+		frappe.db.rollback()
+		self.server.webhooks.clear()
+
+	def send_webhook(self, resource_type: str, resource_url: str):
+		"""Send a webhook as Shipstation would, and run the job it enqueues."""
+
+		webhook = next(
+			webhook
+			for webhook in self.server.webhooks.values()
+			if webhook["event"] == resource_type
+			and webhook["store_id"] == self.store.store_id
+		)
+		query = dict(parse_qsl(urlsplit(webhook["target_url"]).query))
+
+		frappe.set_user("Guest")
+		with patch("frappe.enqueue") as enqueue:
+			receive(resource_type=resource_type, resource_url=resource_url, **query)
+
+		# background jobs run as the user that enqueued them
+		job = enqueue.call_args.kwargs
+		self.assertEqual(
+			enqueue.call_args.args[0], "shipstation_integration.webhooks.process_webhook"
+		)
+		process_webhook(
+			settings=job["settings"],
+			store=job["store"],
+			resource_type=job["resource_type"],
+			resource_url=job["resource_url"],
+		)
+
+	def test_webhooks_are_registered(self):
+		events = {
+			webhook["event"]
+			for webhook in self.server.webhooks.values()
+			if webhook["store_id"] == self.store.store_id
+		}
+		self.assertEqual(events, {"ORDER_NOTIFY", "SHIP_NOTIFY"})
+
+		self.settings.reload()
+		self.assertTrue(self.settings.shipstation_stores[0].order_webhook_id)
+		self.assertTrue(self.settings.shipstation_stores[0].shipment_webhook_id)
+
+	def test_order_notify(self):
+		orders = self.generator.orders(3)
+		resource_url = self.server.add_batch("ORDER_NOTIFY", self.store.store_id, orders)
+
+		processed = []
+		with patch(
+			"shipstation_integration.webhooks.process_order",
+			side_effect=lambda _settings, order, *args: processed.append(
+				(order.order_id, frappe.session.user)
+			),
+		):
+			self.send_webhook("ORDER_NOTIFY", resource_url)
+
+		self.assertEqual(
+			processed, [(order["orderId"], "Administrator") for order in orders]
+		)
+
+	def test_ship_notify(self):
+		shipments = self.generator.shipments(self.generator.orders(3))
+		resource_url = self.server.add_batch("SHIP_NOTIFY", self.store.store_id, shipments)
+
+		processed = []
+		with patch(
+			"shipstation_integration.webhooks.process_shipments",
+			side_effect=lambda _settings, _store, records, _batch: processed.extend(
+				(record.shipment_id, frappe.session.user) for record in records
+			),
+		):
+			self.send_webhook("SHIP_NOTIFY", resource_url)
+
+		self.assertEqual(
+			processed,
+			[(shipment["shipmentId"], "Administrator") for shipment in shipments],
+		)
+
+		# the shipment items are always requested, since they aren't in the resource URL
+		fetches = [
+			query for _method, path, query in self.server.requests if path == "/shipments"
+		]
+		self.assertTrue(fetches)
+		self.assertTrue(all(query.get("includeShipmentItems") == "true" for query in fetches))
+
+	def test_invalid_token_is_rejected(self):
+		resource_url = self.server.add_batch("ORDER_NOTIFY", self.store.store_id, [])
+
+		frappe.set_user("Guest")
+		with patch("frappe.enqueue") as enqueue, self.assertRaises(
+			frappe.AuthenticationError
+		):
+			receive(
+				settings=self.settings.name,
+				store=self.store.name,
+				token="invalid",
+				resource_type="ORDER_NOTIFY",
+				resource_url=resource_url,
+			)
+		enqueue.assert_not_called()
@@ -0,0 +1,92 @@
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Optional
+
+import frappe
+from frappe.utils import cint
+
+if TYPE_CHECKING:
+	from shipstation_integration.shipstation_integration.doctype.shipstation_settings.shipstation_settings import (
+		ShipstationSettings,
+	)
+
+# the savepoint each record is created in; setting it again replaces the
+# previous record's savepoint, so only one is ever held
+RECORD_SAVEPOINT = "shipstation_record"
+
+
+class TransactionBatch:
+	"""
+	Commit the records created by a sync run in batches, instead of after every record.
+
+	Each record is created in its own savepoint, so a record that fails is rolled
+	back on its own, without losing the rest of the batch. The batch is committed
+	once it holds `batch_size` records, or once `interval` seconds have passed
+	since the last commit, whichever comes first.
+
+	Use the batch as a context manager to commit the last, partial batch:
+
+		with TransactionBatch.for_settings(settings) as batch:
+			for order in orders:
+				with batch.savepoint():
+					create_erpnext_order(order, store)
+	"""
+
+	def __init__(self, batch_size: int = 1, interval: int = 0):
+		self.batch_size = max(cint(batch_size), 1)
+		self.interval = max(cint(interval), 0)
+		self.pending = 0
+		self.last_commit = time.monotonic()
+		# the last error that was rolled back to its record's savepoint
+		self.rolled_back: Optional[BaseException] = None
+
+	@classmethod
+	def for_settings(cls, settings: "ShipstationSettings") -> "TransactionBatch":
+		return cls(settings.commit_batch_size, settings.commit_interval)
+
+	def __enter__(self) -> "TransactionBatch":
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		# a record that failed has already been rolled back on its own, so the
+		# records created before it are still safe to commit
+		if exc_value is None or exc_value is self.rolled_back:
+			self.commit()
+
+	@contextmanager
+	def savepoint(self, on_rollback: Optional[Callable[[], None]] = None):
+		"""
+		Create a record in its own savepoint, and commit the batch if it's due.
+
+		If the record fails, only the changes made since the savepoint are rolled
+		back, and the error is raised again.
+
+		Args:
+			on_rollback (Callable, optional): Called after the record is rolled back,
+				to forget anything cached in memory about the records it created.
+				For e.g. `context.customers.checkpoint()`.
+		"""
+
+		frappe.db.savepoint(RECORD_SAVEPOINT)
+		try:
+			yield
+		except Exception as e:
+			frappe.db.rollback(save_point=RECORD_SAVEPOINT)
+			if on_rollback:
+				on_rollback()
+			self.rolled_back = e
+			raise
+
+		self.pending += 1
+		if self.is_due():
+			self.commit()
+
+	def is_due(self) -> bool:
+		if self.pending >= self.batch_size:
+			return True
+		return bool(self.interval and time.monotonic() - self.last_commit >= self.interval)
+
+	def commit(self):
+		frappe.db.commit()
+		self.pending = 0
+		self.last_commit = time.monotonic()
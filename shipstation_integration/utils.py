@@ -1,4 +1,41 @@
+import datetime
+from itertools import islice
+from typing import Iterable, Iterator, List
+
 import frappe
+import pytz
+
+# the Shipstation API stores and filters dates in Pacific time
+SHIPSTATION_TIMEZONE = "America/Los_Angeles"
+
+# the number of records returned in each page of a Shipstation list response
+SHIPSTATION_PAGE_SIZE = 100
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    """Yield successive lists of up to `size` items from an iterable."""
+
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def get_shipstation_datetime() -> datetime.datetime:
+    """
+    Get the current time in Shipstation's timezone.
+
+    The Shipstation API stores and filters all dates in Pacific time, without any
+    timezone information.
+
+    Returns:
+        datetime.datetime: A naive datetime in Shipstation's timezone.
+    """
+
+    now = datetime.datetime.now(pytz.timezone(SHIPSTATION_TIMEZONE))
+    return now.replace(tzinfo=None)
 
 
 def get_marketplace(id=None, name=None, region=None, domain=None):
@@ -0,0 +1,279 @@
+import hmac
+from typing import TYPE_CHECKING, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import httpx
+from shipstation.models import ShipStationOrder, ShipStationShipment
+
+import frappe
+from frappe import _
+from frappe.utils import get_url
+
+from shipstation_integration.api import get_api_url
+from shipstation_integration.context import ImportContext
+from shipstation_integration.orders import (
+	get_existing_order_ids,
+	preload_orders,
+	process_order,
+)
+from shipstation_integration.shipments import process_shipments
+from shipstation_integration.transaction import TransactionBatch
+from shipstation_integration.utils import SHIPSTATION_PAGE_SIZE
+
+if TYPE_CHECKING:
+	from shipstation_integration.api import RateLimitedShipStation
+	from shipstation_integration.shipstation_integration.doctype.shipstation_store.shipstation_store import (
+		ShipstationStore,
+	)
+	from shipstation_integration.shipstation_integration.doctype.shipstation_settings.shipstation_settings import (
+		ShipstationSettings,
+	)
+
+# the webhook events that are handled, with the resource path and the key of
+# the records in each event's resource
+WEBHOOK_EVENTS = {
+	"ORDER_NOTIFY": ("/orders", "orders"),
+	"SHIP_NOTIFY": ("/shipments", "shipments"),
+}
+
+# the Shipstation Store field that holds the webhook ID of each event
+WEBHOOK_ID_FIELDS = {
+	"ORDER_NOTIFY": "order_webhook_id",
+	"SHIP_NOTIFY": "shipment_webhook_id",
+}
+
+WEBHOOK_METHOD = "shipstation_integration.webhooks.receive"
+
+
+@frappe.whitelist(allow_guest=True)
+def receive(settings: str = None, store: str = None, token: str = None, **kwargs):
+	"""
+	Receive an `ORDER_NOTIFY` or `SHIP_NOTIFY` webhook from Shipstation.
+
+	Shipstation doesn't sign its webhooks, so each webhook is registered with a
+	secret token in its URL, and requests without the right token are rejected.
+	The resource URL in the request is only ever fetched from the Shipstation API.
+
+	The request is answered straight away; the referenced batch of orders or
+	shipments is fetched and created in a background job.
+	"""
+
+	if frappe.request and frappe.request.method != "POST":
+		raise frappe.PermissionError
+
+	payload = kwargs
+	if frappe.request:
+		payload = frappe.request.get_json(silent=True) or kwargs
+
+	resource_type = payload.get("resource_type")
+	resource_url = payload.get("resource_url")
+
+	sss_doc = get_webhook_settings(settings, token)
+	store_doc = get_webhook_store(sss_doc, store)
+	validate_resource(resource_type, resource_url)
+
+	frappe.enqueue(
+		"shipstation_integration.webhooks.process_webhook",
+		queue=sss_doc.order_queue or "long",
+		job_name=f"Shipstation {resource_type} {store_doc.store_name}",
+		settings=sss_doc.name,
+		store=store_doc.name,
+		resource_type=resource_type,
+		resource_url=resource_url,
+	)
+
+
+def get_webhook_settings(
+	settings: Optional[str], token: Optional[str]
+) -> "ShipstationSettings":
+	if not (settings and frappe.db.exists("Shipstation Settings", settings)):
+		raise frappe.AuthenticationError
+
+	sss_doc: "ShipstationSettings" = frappe.get_doc("Shipstation Settings", settings)
+
+	webhook_token = sss_doc.get_password("webhook_token", raise_exception=False)
+	if not (sss_doc.enabled and webhook_token and token):
+		raise frappe.AuthenticationError
+	if not hmac.compare_digest(webhook_token.encode(), token.encode()):
+		raise frappe.AuthenticationError
+
+	return sss_doc
+
+
+def get_webhook_store(
+	settings: "ShipstationSettings", store: Optional[str]
+) -> "ShipstationStore":
+	stores = settings.get("shipstation_stores", {"name": store})
+	if not store or not stores:
+		frappe.throw(_("Shipstation store {0} not found").format(store))
+	return stores[0]
+
+
+def validate_resource(resource_type: Optional[str], resource_url: Optional[str]):
+	if resource_type not in WEBHOOK_EVENTS:
+		frappe.throw(
+			_("Unsupported Shipstation webhook event: {0}").format(resource_type)
+		)
+
+	# the resource is fetched with the account's credentials, so it can only be
+	# fetched from the Shipstation API
+	api_url = urlsplit(get_api_url())
+	url = urlsplit(resource_url or "")
+	path, _key = WEBHOOK_EVENTS[resource_type]
+	if (url.scheme, url.netloc) != (api_url.scheme, api_url.netloc) or (
+		url.path.rstrip("/") != api_url.path.rstrip("/") + path
+	):
+		frappe.throw(_("Invalid Shipstation resource URL: {0}").format(resource_url))
+
+
+def process_webhook(settings: str, store: str, resource_type: str, resource_url: str):
+	"""
+	Fetch the batch of orders or shipments referenced by a Shipstation webhook, and
+	create them the same way as a scheduled sync would.
+
+	Args:
+		settings (str): The name of the Shipstation Settings the webhook belongs to.
+		store (str): The row name of the Shipstation store the webhook belongs to.
+		resource_type (str): The webhook event, either `ORDER_NOTIFY` or `SHIP_NOTIFY`.
+		resource_url (str): The Shipstation API URL of the batch of records.
+	"""
+
+	# the job is enqueued from the webhook's Guest session, and background jobs run
+	# as the user that enqueued them; run it as the scheduled sync does instead, so
+	# that the documents can be created
+	frappe.set_user("Administrator")
+
+	sss_doc: "ShipstationSettings" = frappe.get_doc("Shipstation Settings", settings)
+	store_doc = get_webhook_store(sss_doc, store)
+	if not sss_doc.enabled:
+		return
+
+	if resource_type == "ORDER_NOTIFY" and store_doc.enable_orders:
+		orders = [
+			ShipStationOrder._structure(record)
+			for record in fetch_resource(sss_doc, resource_type, resource_url)
+		]
+
+		context = ImportContext.build([sss_doc])
+		existing_order_ids = get_existing_order_ids(order.order_id for order in orders)
+		preload_orders(orders, existing_order_ids, context)
+
+		with TransactionBatch.for_settings(sss_doc) as batch:
+			for order in orders:
+				process_order(
+					sss_doc, order, store_doc, existing_order_ids, context, batch
+				)
+
+	elif resource_type == "SHIP_NOTIFY" and store_doc.enable_shipments:
+		shipments = [
+			ShipStationShipment._structure(record)
+			for record in fetch_resource(sss_doc, resource_type, resource_url)
+		]
+
+		with TransactionBatch.for_settings(sss_doc) as batch:
+			process_shipments(sss_doc, store_doc, shipments, batch)
+
+
+def fetch_resource(
+	settings: "ShipstationSettings", resource_type: str, resource_url: str
+) -> List[Dict]:
+	"""Fetch every page of the records in a webhook's resource URL."""
+
+	validate_resource(resource_type, resource_url)
+	_path, key = WEBHOOK_EVENTS[resource_type]
+
+	url = urlsplit(resource_url)
+	parameters = dict(parse_qsl(url.query))
+	resource_url = url._replace(query="").geturl()
+
+	# shipments are created from their items, which aren't in the resource URL
+	if resource_type == "SHIP_NOTIFY":
+		parameters["includeShipmentItems"] = "true"
+
+	records = []
+	page_number = 1
+	client = settings.client()
+	while True:
+		response = client.send_request(
+			"GET",
+			resource_url,
+			params={
+				**parameters,
+				"page": page_number,
+				"pageSize": SHIPSTATION_PAGE_SIZE,
+			},
+		)
+		data = response.json()
+
+		records.extend(record for record in data.get(key) or [] if record)
+		if page_number >= (data.get("pages") or 1):
+			return records
+
+		page_number += 1
+
+
+def register_webhooks(settings: "ShipstationSettings"):
+	"""
+	Subscribe to the `ORDER_NOTIFY` and `SHIP_NOTIFY` webhooks of every store that
+	syncs orders or shipments, and unsubscribe from the ones that no longer do.
+	"""
+
+	token = settings.get_password("webhook_token", raise_exception=False)
+	if not token:
+		token = frappe.generate_hash(length=32)
+		settings.webhook_token = token
+
+	client = settings.client()
+	for store in settings.shipstation_stores:
+		for event, fieldname in WEBHOOK_ID_FIELDS.items():
+			if event == "ORDER_NOTIFY":
+				enabled = store.enable_orders
+			else:
+				enabled = store.enable_shipments
+
+			if enabled and not store.get(fieldname):
+				response = client.send_request(
+					"POST",
+					"/webhooks/subscribe",
+					json={
+						"target_url": get_target_url(settings, store, token),
+						"event": event,
+						"store_id": store.store_id,
+						"friendly_name": f"{frappe.local.site}: {store.store_name} ({event})",
+					},
+				)
+				store.set(fieldname, str(response.json().get("id")))
+			elif not enabled and store.get(fieldname):
+				unsubscribe(client, store.get(fieldname))
+				store.set(fieldname, None)
+
+	settings.save()
+
+
+def unregister_webhooks(settings: "ShipstationSettings"):
+	"""Unsubscribe from all the webhooks registered for the account's stores."""
+
+	client = settings.client()
+	for store in settings.shipstation_stores:
+		for fieldname in WEBHOOK_ID_FIELDS.values():
+			if store.get(fieldname):
+				unsubscribe(client, store.get(fieldname))
+				store.set(fieldname, None)
+
+	settings.save()
+
+
+def unsubscribe(client: "RateLimitedShipStation", webhook_id: str):
+	try:
+		client.send_request("DELETE", f"/webhooks/{webhook_id}")
+	except httpx.HTTPStatusError as e:
+		# the webhook may have already been removed from Shipstation
+		if e.response.status_code != 404:
+			raise
+
+
+def get_target_url(
+	settings: "ShipstationSettings", store: "ShipstationStore", token: str
+) -> str:
+	query = urlencode({"settings": settings.name, "store": store.name, "token": token})
+	return get_url(f"/api/method/{WEBHOOK_METHOD}?{query}")